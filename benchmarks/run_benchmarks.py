@@ -0,0 +1,396 @@
+"""End-to-end upload benchmarks against a local stand-in for the Airtrain API.
+
+Every case uploads synthetic data through one of the `upload_from_*` functions,
+over real HTTP, to an `airtrain.testing.LocalAirtrainApi` running in this
+process. Each case runs in a fresh subprocess so that its peak memory can be
+measured in isolation. Results are written as JSON lines.
+
+Example:
+
+    python benchmarks/run_benchmarks.py --sizes small medium --output results.jsonl
+    python benchmarks/run_benchmarks.py --baseline results.jsonl
+"""
+
+import argparse
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+import numpy as np
+import pyarrow as pa
+
+import airtrain as at
+from airtrain.client import AirtrainClient
+from airtrain.testing import LocalAirtrainApi
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+SIZES: Dict[str, int] = {
+    "small": 1_000,
+    "medium": 100_000,
+    "large": 1_000_000,
+}
+SOURCES: List[str] = ["dicts", "arrow_tables", "pandas", "polars", "llama_nodes"]
+EMBEDDING_DIM: int = 256
+GENERATED_BATCH_ROWS: int = 10_000
+# Regressions in throughput larger than this fraction are reported.
+REGRESSION_THRESHOLD: float = 0.1
+
+_WORDS = (
+    "the quick brown fox jumps over a lazy dog while curating high quality "
+    "training and evaluation datasets for models rag pipelines and apps"
+).split()
+_LABELS = ["news", "forum", "docs", "code", "chat", "paper", "review", "email"]
+
+
+@dataclass
+class BenchmarkCase:
+    source: str
+    size: str
+    embeddings: bool
+
+    @property
+    def rows(self) -> int:
+        return SIZES[self.size]
+
+
+@dataclass
+class BenchmarkResult:
+    source: str
+    size: str
+    embeddings: bool
+    rows: int
+    seconds: float
+    # Time spent in the SDK, excluding time spent generating the source data
+    # (ex: the dicts or DataFrames), but including converting it to Arrow.
+    sdk_seconds: float
+    rows_per_second: float
+    sdk_rows_per_second: float
+    encoded_mb: float
+    encoded_mb_per_second: float
+    peak_rss_mb: float
+    arrow_peak_mb: float
+    arrow_allocated_mb: float
+    timings: Dict[str, Any]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sources", nargs="+", choices=SOURCES, default=SOURCES)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"])
+    parser.add_argument(
+        "--embeddings",
+        choices=["with", "without", "both"],
+        default="both",
+        help="Whether to benchmark data with an embedding column.",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds of latency the local API adds to every request.",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        default=None,
+        help="Megabytes per second each connection may upload at. Unlimited if unset.",
+    )
+    parser.add_argument("--output", help="A file to append JSON lines results to.")
+    parser.add_argument(
+        "--baseline",
+        help="A file of earlier JSON lines results to compare throughput against.",
+    )
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    parser.add_argument("--api-key", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # Running a single case in a subprocess, see _run_in_subprocess.
+        case = BenchmarkCase(**json.loads(args.case))
+        result = run_case(
+            case, AirtrainClient(api_key=args.api_key, base_url=args.api_url)
+        )
+        print(json.dumps(asdict(result)))
+        return
+
+    embedding_options = {
+        "with": [True],
+        "without": [False],
+        "both": [False, True],
+    }[args.embeddings]
+    cases = [
+        BenchmarkCase(source=source, size=size, embeddings=embeddings)
+        for size in args.sizes
+        for source in args.sources
+        for embeddings in embedding_options
+    ]
+    bandwidth = None if args.bandwidth is None else args.bandwidth * 1e6
+    environment = _environment(latency=args.latency, bandwidth=bandwidth)
+    baseline = _load_baseline(args.baseline) if args.baseline else {}
+
+    results = []
+    with LocalAirtrainApi(
+        row_limit=max(SIZES.values()),
+        latency_seconds=args.latency,
+        bandwidth_bytes_per_second=bandwidth,
+    ) as api:
+        for case in cases:
+            logger.info("Running %s", case)
+            try:
+                result = _run_in_subprocess(case, api)
+            except Exception as e:
+                logger.error("Case %s failed: %s", case, e)
+                continue
+            record = {**asdict(result), **environment}
+            results.append(record)
+            print(json.dumps(record), flush=True)
+            # The local API keeps every uploaded part; don't let that pile up.
+            api.datasets.clear()
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for record in results:
+                f.write(json.dumps(record) + "\n")
+
+    regressions = _find_regressions(results, baseline)
+    for message in regressions:
+        logger.warning(message)
+    if len(regressions) > 0:
+        sys.exit(1)
+
+
+def run_case(case: BenchmarkCase, client: AirtrainClient) -> BenchmarkResult:
+    """Upload the synthetic data for a case, and measure how it went."""
+    upload = _UPLOADERS[case.source]
+    embedding_column = "embedding" if case.embeddings else None
+    pool = pa.default_memory_pool()
+
+    stopwatch = _Stopwatch()
+    started = time.perf_counter()
+    metadata = upload(
+        _generate_tables(case.rows, case.embeddings),
+        stopwatch,
+        name=f"Benchmark {case.source} {case.size}",
+        embedding_column=embedding_column,
+        client=client,
+    )
+    seconds = time.perf_counter() - started
+
+    assert metadata.size == case.rows, f"Uploaded {metadata.size} of {case.rows} rows"
+    timings = metadata.timings
+    assert timings is not None
+    sdk_seconds = seconds - stopwatch.seconds
+    encoded_mb = timings.encoded_bytes / 1e6
+    return BenchmarkResult(
+        source=case.source,
+        size=case.size,
+        embeddings=case.embeddings,
+        rows=metadata.size,
+        seconds=seconds,
+        sdk_seconds=sdk_seconds,
+        rows_per_second=metadata.size / seconds,
+        sdk_rows_per_second=metadata.size / sdk_seconds,
+        encoded_mb=encoded_mb,
+        encoded_mb_per_second=encoded_mb / seconds,
+        peak_rss_mb=_peak_rss_mb(),
+        arrow_peak_mb=pool.max_memory() / 1e6,
+        arrow_allocated_mb=pa.total_allocated_bytes() / 1e6,
+        timings=asdict(timings),
+    )
+
+
+def _generate_tables(rows: int, embeddings: bool) -> Iterator[pa.Table]:
+    rng = np.random.default_rng(seed=42)
+    words = pa.array(_WORDS)
+    labels = pa.array(_LABELS)
+    for start in range(0, rows, GENERATED_BATCH_ROWS):
+        n_rows = min(GENERATED_BATCH_ROWS, rows - start)
+        text_words = rng.integers(0, len(_WORDS), size=(n_rows, 24))
+        texts = [" ".join(row) for row in np.array(_WORDS, dtype=object)[text_words]]
+        columns = {
+            "id": pa.array(np.arange(start, start + n_rows)),
+            "text": pa.array(texts),
+            "label": labels.take(pa.array(rng.integers(0, len(_LABELS), n_rows))),
+            "score": pa.array(rng.random(n_rows)),
+            "keyword": words.take(pa.array(rng.integers(0, len(_WORDS), n_rows))),
+        }
+        if embeddings:
+            values = rng.random(n_rows * EMBEDDING_DIM, dtype=np.float32)
+            columns["embedding"] = pa.FixedSizeListArray.from_arrays(
+                pa.array(values), EMBEDDING_DIM
+            )
+        yield pa.table(columns)
+
+
+class _Stopwatch:
+    """Accumulates the time spent producing the items of iterables.
+
+    Source data is generated lazily, as the SDK reads it, so generating it
+    can't be timed separately from the upload otherwise.
+    """
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    def timed(self, items: Iterable[T]) -> Iterator[T]:
+        iterator = iter(items)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.seconds += time.perf_counter() - started
+            yield item
+
+
+def _upload_arrow_tables(
+    tables: Iterable[pa.Table], stopwatch: _Stopwatch, **kwargs: Any
+) -> at.DatasetMetadata:
+    return at.upload_from_arrow_tables(stopwatch.timed(tables), **kwargs)
+
+
+def _upload_dicts(
+    tables: Iterable[pa.Table], stopwatch: _Stopwatch, **kwargs: Any
+) -> at.DatasetMetadata:
+    # Rows are generated a table at a time, to not time every single row.
+    rows = stopwatch.timed(table.to_pylist() for table in tables)
+    return at.upload_from_dicts(chain.from_iterable(rows), **kwargs)
+
+
+def _upload_pandas(
+    tables: Iterable[pa.Table], stopwatch: _Stopwatch, **kwargs: Any
+) -> at.DatasetMetadata:
+    frames = stopwatch.timed(table.to_pandas() for table in tables)
+    return at.upload_from_pandas(frames, **kwargs)
+
+
+def _upload_polars(
+    tables: Iterable[pa.Table], stopwatch: _Stopwatch, **kwargs: Any
+) -> at.DatasetMetadata:
+    import polars as pl
+
+    frames = stopwatch.timed(pl.from_arrow(table) for table in tables)
+    return at.upload_from_polars(frames, **kwargs)
+
+
+def _upload_llama_nodes(
+    tables: Iterable[pa.Table], stopwatch: _Stopwatch, **kwargs: Any
+) -> at.DatasetMetadata:
+    from llama_index.core.schema import TextNode
+
+    def table_nodes(table: pa.Table) -> List[TextNode]:
+        return [
+            TextNode(
+                text=row.pop("text"),
+                embedding=row.pop("embedding", None),
+                metadata=row,
+            )
+            for row in table.to_pylist()
+        ]
+
+    nodes = stopwatch.timed(table_nodes(table) for table in tables)
+    return at.upload_from_llama_nodes(chain.from_iterable(nodes), **kwargs)
+
+
+_UPLOADERS: Dict[str, Callable[..., at.DatasetMetadata]] = {
+    "dicts": _upload_dicts,
+    "arrow_tables": _upload_arrow_tables,
+    "pandas": _upload_pandas,
+    "polars": _upload_polars,
+    "llama_nodes": _upload_llama_nodes,
+}
+
+
+def _run_in_subprocess(case: BenchmarkCase, api: LocalAirtrainApi) -> BenchmarkResult:
+    completed = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--case",
+            json.dumps(asdict(case)),
+            "--api-url",
+            api.url,
+            "--api-key",
+            api.api_key,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().split("\n")[-1])
+    return BenchmarkResult(**json.loads(completed.stdout.strip().split("\n")[-1]))
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def _environment(latency: float, bandwidth: Optional[float]) -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "latency_seconds": latency,
+        "bandwidth_bytes_per_second": bandwidth,
+    }
+
+
+def _case_key(record: Dict[str, Any]) -> str:
+    return f"{record['source']}/{record['size']}/embeddings={record['embeddings']}"
+
+
+def _load_baseline(path: str) -> Dict[str, Dict[str, Any]]:
+    baseline: Dict[str, Dict[str, Any]] = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                # Later results for the same case replace earlier ones.
+                baseline[_case_key(record)] = record
+    return baseline
+
+
+def _find_regressions(
+    results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]
+) -> List[str]:
+    regressions = []
+    for record in results:
+        previous = baseline.get(_case_key(record))
+        if previous is None:
+            continue
+        for metric in ("sdk_rows_per_second", "encoded_mb_per_second"):
+            if record[metric] < previous[metric] * (1 - REGRESSION_THRESHOLD):
+                regressions.append(
+                    f"{_case_key(record)}: {metric} dropped from "
+                    f"{previous[metric]:.1f} to {record[metric]:.1f}"
+                )
+        if record["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + REGRESSION_THRESHOLD):
+            regressions.append(
+                f"{_case_key(record)}: peak_rss_mb grew from "
+                f"{previous['peak_rss_mb']:.1f} to {record['peak_rss_mb']:.1f}"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    main()
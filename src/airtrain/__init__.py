@@ -1,9 +1,41 @@
+from typing import TYPE_CHECKING, Any
+
 from airtrain.client import set_api_key  # noqa: F401
+from airtrain.clustering import Clustering  # noqa: F401
+from airtrain.collector import Collector, CollectorSink  # noqa: F401
 from airtrain.core import (  # noqa: F401
     DatasetMetadata,
+    DatasetSpec,
+    push_staged,
+    upload_from_arrow_stream,
     upload_from_arrow_tables,
+    upload_from_columns,
     upload_from_dicts,
+    upload_many,
 )
+from airtrain.flattening import Flattening  # noqa: F401
+from airtrain.ingest import wait_for_ingest, wait_for_ingest_async  # noqa: F401
+from airtrain.integrations.duckdb import upload_from_duckdb  # noqa: F401
 from airtrain.integrations.llamaindex import upload_from_llama_nodes  # noqa: F401
 from airtrain.integrations.pandas import upload_from_pandas  # noqa: F401
 from airtrain.integrations.polars import upload_from_polars  # noqa: F401
+from airtrain.optimization import TypeOptimization  # noqa: F401
+from airtrain.projection import EmbeddingProjection  # noqa: F401
+from airtrain.sampling import Sampling  # noqa: F401
+from airtrain.sharding import ShardedUpload, ShardResult, ShardUploadError  # noqa: F401
+from airtrain.sidecar import EmbeddingSidecar  # noqa: F401
+from airtrain.sparse import SparseKeys  # noqa: F401
+from airtrain.stats import ColumnStats  # noqa: F401
+
+
+if TYPE_CHECKING:
+    from airtrain.integrations.huggingface import upload_from_hf_dataset  # noqa: F401
+
+
+def __getattr__(name: str) -> Any:
+    # Importing `datasets` takes long, so only do it once it is used.
+    if name == "upload_from_hf_dataset":
+        from airtrain.integrations.huggingface import upload_from_hf_dataset
+
+        return upload_from_hf_dataset
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
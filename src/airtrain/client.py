@@ -1,24 +1,55 @@
 import io
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
 from functools import lru_cache
-from typing import Any, Dict, Iterable, Optional
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 import httpx
 
+from airtrain.retry import retry_call
+
 
 logger = logging.getLogger(__name__)
 
 
 RequestJson = Dict[str, Any]
 ResponseJson = Dict[str, Any]
+# Produces the bytes of a request body, from the start, every time it is called.
+ByteStreamFactory = Callable[[], Iterable[bytes]]
 
 
 API_KEY_ENV_VAR: str = "AIRTRAIN_API_KEY"
 _DEFAULT_API_KEY: Optional[str] = None
 _DEFAULT_BASE_URL: str = "https://api.airtrain.ai"
 _BUFFER_CHUNK_SIZE = 8192
+_DEFAULT_MAX_CONNECTIONS: int = 20
+_DEFAULT_MAX_REGISTERED_CLIENTS: int = 32
+_DEFAULT_UPLOAD_TARGET_PREFETCH: int = 4
+# Upload targets are pre-signed URLs, which expire. Don't use any that have
+# been waiting around for long.
+_UPLOAD_TARGET_MAX_AGE_SECONDS: float = 300.0
 
 
 class BadRequestError(Exception):
@@ -39,12 +70,120 @@ class NotFoundError(BadRequestError):
     pass
 
 
+class RateLimitError(BadRequestError):
+    """The caller has sent too many requests, and should retry later."""
+
+    status_code: int = 429
+
+    def __init__(self, message: str, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 class ServerError(Exception):
     """There was some problem with the server."""
 
     pass
 
 
+class TransientServerError(ServerError):
+    """The server could not handle the request right now, but may if retried."""
+
+    def __init__(
+        self,
+        message: str,
+        retry_after: Optional[float] = None,
+        status_code: Optional[int] = None,
+    ) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class ServiceUnavailableError(TransientServerError):
+    """The server refused the request without processing it."""
+
+    pass
+
+
+# Errors after which a request of any kind is known not to have been processed,
+# so it is safe to send it again.
+_UNPROCESSED_ERRORS: Tuple[Type[Exception], ...] = (
+    RateLimitError,
+    ServiceUnavailableError,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+)
+
+# Errors after which an idempotent request may be sent again, even though the
+# server may have partially or fully processed it.
+_IDEMPOTENT_RETRY_ERRORS: Tuple[Type[Exception], ...] = _UNPROCESSED_ERRORS + (
+    TransientServerError,
+    httpx.TransportError,
+)
+
+
+@dataclass
+class AttemptMetrics:
+    """Measurements from a single attempt at an API or storage request."""
+
+    operation: str
+    attempt: int
+    duration_seconds: float
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class RetryPolicy:
+    """Controls how failed requests are retried.
+
+    Requests that are not idempotent are only retried when the failure guarantees
+    the server did not process them (ex: 429 responses, or failures to connect).
+    Idempotent requests are also retried after timeouts, dropped connections, and
+    5xx responses. A server's Retry-After is honored in place of the computed
+    delay.
+
+    Parameters
+    ----------
+    tries:
+        The maximum number of attempts per request, including the first.
+    delay:
+        The delay before the first retry, in seconds.
+    backoff:
+        The multiplier applied to the delay after each retry.
+    max_delay:
+        The maximum delay between two attempts, in seconds.
+    jitter:
+        A range of random extra seconds added to the delay after each retry.
+    max_total_delay:
+        The maximum total time to spend waiting between attempts of one request,
+        in seconds.
+    on_attempt:
+        Optionally, a callback receiving the metrics of every attempt.
+    """
+
+    tries: int = 5
+    delay: float = 0.5
+    backoff: float = 2.0
+    max_delay: float = 30.0
+    jitter: Tuple[float, float] = (0.0, 0.5)
+    max_total_delay: float = 120.0
+    on_attempt: Optional[Callable[[AttemptMetrics], None]] = None
+
+
+NO_RETRIES = RetryPolicy(tries=1)
+
+_attempt_log: ContextVar[Optional[List[AttemptMetrics]]] = ContextVar(
+    "_attempt_log", default=None
+)
+T = TypeVar("T")
+
+
 @dataclass
 class CreateDatasetResponse:
     dataset_id: str
@@ -56,6 +195,33 @@ class TriggerIngestResponse:
     ingest_job_id: str
 
 
+class IngestJobState:
+    """The states an ingestion job may be in."""
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELED = "CANCELED"
+
+    TERMINAL = (SUCCEEDED, FAILED, CANCELED)
+
+
+@dataclass
+class IngestJobStatus:
+    ingest_job_id: str
+    state: str
+    error_message: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in IngestJobState.TERMINAL
+
+    @property
+    def succeeded(self) -> bool:
+        return self.state == IngestJobState.SUCCEEDED
+
+
 class AirtrainClient:
     """A direct wrapper around Airtrain's  HTTP API. Intended for internal package use.
 
@@ -67,15 +233,28 @@ class AirtrainClient:
     """
 
     def __init__(
-        self, api_key: Optional[str] = None, base_url: Optional[str] = None
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = _DEFAULT_MAX_CONNECTIONS,
+        retry_policy: Optional[RetryPolicy] = None,
+        upload_target_prefetch: int = _DEFAULT_UPLOAD_TARGET_PREFETCH,
     ) -> None:
         self._api_key: str = api_key or _find_api_key()  # type: ignore
-        self._base_url: str = base_url or os.environ.get(  # type: ignore
-            "AIRTRAIN_API_URL", _DEFAULT_BASE_URL
+        self._base_url: str = _resolve_base_url(base_url)
+        self.retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        self._upload_target_prefetch = upload_target_prefetch
+        self._upload_target_pools: Dict[str, _UploadTargetPool] = {}
+        self._upload_target_lock = threading.Lock()
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        # Each client owns its own connection pool, so clients for different
+        # tenants never contend for (or share) connections.
+        self._http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            )
         )
-        if self._base_url.endswith("/"):
-            self._base_url = self._base_url[:-1]
-        self._http_client = httpx.Client()
 
         if self._api_key is None:
             raise AuthenticationError(
@@ -92,20 +271,37 @@ class AirtrainClient:
         )
         return f"{app_url}/dataset/{dataset_id}"
 
-    def trigger_dataset_ingest(self, dataset_id: str) -> TriggerIngestResponse:
+    def trigger_dataset_ingest(
+        self, dataset_id: str, column_stats: Optional[List[Dict[str, Any]]] = None
+    ) -> TriggerIngestResponse:
         """Wraps: POST /dataset/[id]/ingest"""
-        response = self._post_json(url_path=f"dataset/{dataset_id}/ingest", content={})
+        self.release_upload_targets(dataset_id)
+        content: Dict[str, Any] = {}
+        if column_stats is not None:
+            content["columnStats"] = column_stats
+        response = self._post_json(
+            url_path=f"dataset/{dataset_id}/ingest", content=content, idempotent=False
+        )
         job_id = response.get("ingestionJobId")
         if not isinstance(job_id, str):
             raise ServerError(f"Malformed response: {response}")
         return TriggerIngestResponse(ingest_job_id=job_id)
 
+    def release_upload_targets(self, dataset_id: str) -> None:
+        """Stop prefetching upload targets for a dataset no more data is uploaded to.
+
+        Called when triggering ingestion, and otherwise once done uploading.
+        """
+        self._release_upload_targets(f"dataset/{dataset_id}/source")
+
     def create_dataset(
         self, name: str, embedding_column_name: Optional[str]
     ) -> CreateDatasetResponse:
         """Wraps: POST /dataset"""
         response = self._post_json(
-            "dataset", dict(name=name, embeddingColumn=embedding_column_name)
+            "dataset",
+            dict(name=name, embeddingColumn=embedding_column_name),
+            idempotent=False,
         )
         dataset_id = response.get("datasetId")
         row_limit = response.get("rowLimit")
@@ -114,58 +310,270 @@ class AirtrainClient:
             raise ServerError(f"Malformed response: {response}")
         return CreateDatasetResponse(dataset_id=dataset_id, row_limit=row_limit)
 
-    def upload_dataset_data(self, dataset_id: str, data: io.BufferedIOBase) -> None:
-        """Wraps: PUT /dataset/[id]/source"""
+    def upload_dataset_data(
+        self, dataset_id: str, data: Union[io.BufferedIOBase, ByteStreamFactory]
+    ) -> str:
+        """Wraps: PUT /dataset/[id]/source
+
+        The data is either a file-like object, or a function producing the data
+        as chunks of bytes. A function is called again for every retry, and its
+        chunks are sent as they are produced, without buffering the whole body.
+        Returns the storage location the data was uploaded to, which can be
+        passed to `replace_dataset_data`.
+        """
+        target = self._get_upload_target(
+            f"dataset/{dataset_id}/source", {"format": "parquet"}
+        )
+        self._put_to_target(target.url, target.headers, data)
+        return str(target.url)
+
+    def replace_dataset_data(
+        self, location: str, data: Union[io.BufferedIOBase, ByteStreamFactory]
+    ) -> None:
+        """Upload data over a part, at the location `upload_dataset_data` returned.
+
+        The part's former content is replaced, rather than adding another part.
+        See `upload_dataset_data` for the form of the data.
+        """
+        headers = {"Content-Type": "application/octet-stream"}
+        self._put_to_target(location, headers, data)
+
+    def upload_dataset_embeddings(
+        self, dataset_id: str, data: io.BufferedIOBase, dtype: str, dimensions: int
+    ) -> None:
+        """Wraps: PUT /dataset/[id]/source, for an embeddings sidecar
+
+        See `airtrain.sidecar` for the format of the data.
+        """
         self._put_bytes(
             url_path=f"dataset/{dataset_id}/source",
             content=data,
-            params={"format": "parquet"},
+            params={
+                "format": "embeddings",
+                "dtype": dtype,
+                "dimensions": str(dimensions),
+            },
         )
 
+    def get_ingest_job(self, ingest_job_id: str) -> IngestJobStatus:
+        """Wraps: GET /ingestion-job/[id]"""
+        response = self._get_json(f"ingestion-job/{ingest_job_id}")
+        return _parse_ingest_job_status(response)
+
+    def get_ingest_jobs(self, ingest_job_ids: List[str]) -> List[IngestJobStatus]:
+        """Wraps: POST /ingestion-job/status
+
+        Gets the status of several jobs with a single request. Statuses are
+        returned in the order of the given ids.
+        """
+        response = self._post_json(
+            "ingestion-job/status",
+            dict(ingestionJobIds=ingest_job_ids),
+            # Only reads the statuses.
+            idempotent=True,
+        )
+        jobs = response.get("ingestionJobs")
+        if not isinstance(jobs, list):
+            raise ServerError(f"Malformed response: {response}")
+        statuses = {
+            status.ingest_job_id: status
+            for status in (_parse_ingest_job_status(job) for job in jobs)
+        }
+        missing = [job_id for job_id in ingest_job_ids if job_id not in statuses]
+        if len(missing) > 0:
+            raise NotFoundError(f"No ingestion jobs with ids: {missing}")
+        return [statuses[job_id] for job_id in ingest_job_ids]
+
+    def _get_json(
+        self, url_path: str, params: Optional[Dict[str, str]] = None
+    ) -> ResponseJson:
+        headers = {
+            "Authorization": f"Bearer {self._api_key}",
+        }
+        url = self._full_url(url_path)
+
+        def get() -> ResponseJson:
+            response = self._http_client.get(url, headers=headers, params=params)
+            response_json = self._handle_response(response, expect_json=True)
+            assert response_json is not None  # please mypy
+            return response_json
+
+        return self._with_retries(f"GET {url_path}", get, idempotent=True)
+
     def _post_json(
-        self, url_path: str, content: RequestJson, params: Optional[Dict[str, str]] = None
+        self,
+        url_path: str,
+        content: RequestJson,
+        params: Optional[Dict[str, str]] = None,
+        idempotent: bool = False,
     ) -> ResponseJson:
         headers = {
             "Authorization": f"Bearer {self._api_key}",
         }
         url = self._full_url(url_path)
-        response = self._http_client.post(
-            url, headers=headers, json=content, params=params
-        )
-        response_json = self._handle_response(response, expect_json=True)
-        assert response_json is not None  # please mypy
-        return response_json
+
+        def post() -> ResponseJson:
+            response = self._http_client.post(
+                url, headers=headers, json=content, params=params
+            )
+            response_json = self._handle_response(response, expect_json=True)
+            assert response_json is not None  # please mypy
+            return response_json
+
+        return self._with_retries(f"POST {url_path}", post, idempotent=idempotent)
 
     def _put_bytes(
         self,
         url_path: str,
-        content: io.BufferedIOBase,
+        content: Union[io.BufferedIOBase, ByteStreamFactory],
         params: Optional[Dict[str, str]] = None,
     ) -> None:
+        target = self._get_upload_target(url_path, params)
+        self._put_to_target(target.url, target.headers, content)
+
+    def _put_to_target(
+        self,
+        url: Union[httpx.URL, str],
+        headers: Mapping[str, str],
+        content: Union[io.BufferedIOBase, ByteStreamFactory],
+    ) -> None:
+        if callable(content):
+            chunks = content
+        else:
+            chunks = _rewindable_byte_stream(content)
+
+        def put_content() -> None:
+            response = self._http_client.put(
+                url,
+                headers=headers,
+                content=chunks(),
+                follow_redirects=False,
+            )
+            self._handle_response(response, expect_json=False)
+
+        # Uploading to the target replaces whatever was there, so it is idempotent.
+        self._with_retries("PUT storage", put_content, idempotent=True)
+
+    def _get_upload_target(
+        self, url_path: str, params: Optional[Dict[str, str]]
+    ) -> httpx.Request:
+        """Get a request to upload content to, via a redirect from url_path.
+
+        Once more than one target has been requested for the same url_path, a few
+        more are fetched ahead of time in the background, so that later uploads
+        don't have to wait for the redirect round trip.
+        """
+        if self._upload_target_prefetch < 1:
+            return self._fetch_upload_target(url_path, params)
+
+        # Targets from one pool are interchangeable, so the pool is keyed by the
+        # full request rather than only by the path.
+        pool_key = f"{url_path}?{sorted((params or {}).items())}"
+        with self._upload_target_lock:
+            pool = self._upload_target_pools.get(pool_key)
+            if pool is None:
+                pool = _UploadTargetPool(
+                    fetch=lambda: self._fetch_upload_target(url_path, params),
+                    submit=self._submit_prefetch,
+                    size=self._upload_target_prefetch,
+                    url_path=url_path,
+                )
+                self._upload_target_pools[pool_key] = pool
+        return pool.take()
+
+    def _fetch_upload_target(
+        self, url_path: str, params: Optional[Dict[str, str]]
+    ) -> httpx.Request:
         headers = {
             "Authorization": f"Bearer {self._api_key}",
             "Content-Type": "application/octet-stream",
         }
         url = self._full_url(url_path)
 
-        response = self._http_client.put(
-            url,
-            headers=headers,
-            content=iter([b""]),  # send some dummy data to not consume the stream
-            params=params,
-            follow_redirects=False,
-        )
-        if response.next_request is None:
-            logger.error("Response text:\n%s", response.text)
-            raise ServerError(f"Expected redirect but got: {response.status_code}")
-
-        response = self._http_client.put(
-            response.next_request.url,
-            headers=response.next_request.headers,
-            content=_buffer_to_byte_iterable(content),
-            follow_redirects=False,
+        def get_upload_target() -> httpx.Request:
+            response = self._http_client.put(
+                url,
+                headers=headers,
+                content=iter([b""]),  # send some dummy data to not consume the stream
+                params=params,
+                follow_redirects=False,
+            )
+            if response.next_request is None:
+                if response.status_code // 100 not in (2, 3):
+                    self._handle_response(response, expect_json=False)
+                logger.error("Response text:\n%s", response.text)
+                raise ServerError(f"Expected redirect but got: {response.status_code}")
+            return response.next_request
+
+        # The redirect PUT does not consume the content, so it is safe to retry.
+        return self._with_retries(f"PUT {url_path}", get_upload_target, idempotent=True)
+
+    def _submit_prefetch(self, fn: Callable[[], T]) -> "Future[T]":
+        with self._upload_target_lock:
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(
+                    max_workers=max(1, self._upload_target_prefetch),
+                    thread_name_prefix="airtrain-prefetch",
+                )
+            return self._prefetch_executor.submit(fn)
+
+    def _release_upload_targets(self, url_path: str) -> None:
+        with self._upload_target_lock:
+            released = [
+                key
+                for key, pool in self._upload_target_pools.items()
+                if pool.url_path == url_path
+            ]
+            for key in released:
+                self._upload_target_pools.pop(key).close()
+            # Its threads are started again if more targets are prefetched.
+            if len(self._upload_target_pools) == 0 and self._prefetch_executor:
+                self._prefetch_executor.shutdown(wait=False)
+                self._prefetch_executor = None
+
+    def _with_retries(
+        self, operation: str, attempt: Callable[[], T], idempotent: bool
+    ) -> T:
+        policy = self.retry_policy
+        attempt_number = 0
+
+        def measured_attempt() -> T:
+            nonlocal attempt_number
+            attempt_number += 1
+            started = time.perf_counter()
+            status_code: Optional[int] = None
+            error: Optional[str] = None
+            try:
+                return attempt()
+            except Exception as e:
+                status_code = getattr(e, "status_code", None)
+                error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _record_attempt(
+                    policy,
+                    AttemptMetrics(
+                        operation=operation,
+                        attempt=attempt_number,
+                        duration_seconds=time.perf_counter() - started,
+                        status_code=status_code,
+                        error=error,
+                    ),
+                )
+
+        setattr(measured_attempt, "__name__", operation)
+        return retry_call(
+            measured_attempt,
+            exceptions=_IDEMPOTENT_RETRY_ERRORS if idempotent else _UNPROCESSED_ERRORS,
+            tries=policy.tries,
+            delay=policy.delay,
+            max_delay=policy.max_delay,
+            backoff=policy.backoff,
+            jitter=policy.jitter,
+            logger=logger,
+            max_total_delay=policy.max_total_delay,
+            delay_hint=lambda e: getattr(e, "retry_after", None),
         )
-        self._handle_response(response, expect_json=False)
 
     def _handle_response(
         self, response: httpx.Response, expect_json: bool
@@ -191,13 +599,25 @@ class AirtrainClient:
             or f"Got '{response.status_code}' from {request_kind} to {url_path}"
         )
         status_code = response.status_code
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
         if status_code in (401, 403):
             logger.error("Authentication error response text:\n%s", response.text)
             raise AuthenticationError(f"You may not have access. {base_message}")
         if status_code == 404:
             raise NotFoundError(f"The resource may not exist. {base_message}")
+        if status_code == 429:
+            raise RateLimitError(f"Too many requests. {base_message}", retry_after)
         if 400 <= status_code < 500:
             raise BadRequestError(f"Bad Request. {base_message}")
+        if status_code == 503:
+            raise ServiceUnavailableError(
+                f"Service unavailable. {base_message}", retry_after, status_code
+            )
+        if status_code in (500, 502, 504):
+            logger.error("Server error response text:\n%s", response.text)
+            raise TransientServerError(
+                f"Server error. {base_message}", retry_after, status_code
+            )
         if status_code // 100 != 2:
             logger.error("Server error response text:\n%s", response.text)
             # Consider 100s, 300s, 500s to all be server errors because they are not
@@ -219,6 +639,106 @@ class AirtrainClient:
         return f"{self._base_url}/{url_path}"
 
 
+class _UploadTargetPool:
+    """Upload targets for a single source, fetched ahead of time in the background."""
+
+    def __init__(
+        self,
+        fetch: Callable[[], httpx.Request],
+        submit: Callable[[Callable[[], Any]], "Future[Any]"],
+        size: int,
+        url_path: str,
+    ) -> None:
+        self.url_path = url_path
+        self._fetch = fetch
+        self._submit = submit
+        self._size = size
+        self._lock = threading.Lock()
+        self._pending: Deque["Future[Tuple[httpx.Request, float]]"] = deque()
+        self._taken = 0
+
+    def take(self) -> httpx.Request:
+        with self._lock:
+            self._taken += 1
+            if self._taken == 1:
+                # Only one target may ever be needed; don't prefetch any others
+                # until a second one is actually requested.
+                future = None
+            else:
+                if len(self._pending) == 0:
+                    self._pending.append(self._submit(self._fetch_timestamped))
+                future = self._pending.popleft()
+                while len(self._pending) < self._size:
+                    self._pending.append(self._submit(self._fetch_timestamped))
+
+        if future is not None:
+            try:
+                target, fetched_at = future.result()
+                if time.monotonic() - fetched_at < _UPLOAD_TARGET_MAX_AGE_SECONDS:
+                    return target
+            except Exception as e:
+                # Fall back on fetching one now, which raises if the problem persists.
+                logger.debug("Prefetching an upload target failed: %s", e)
+        return self._fetch()
+
+    def close(self) -> None:
+        with self._lock:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+
+    def _fetch_timestamped(self) -> Tuple[httpx.Request, float]:
+        return self._fetch(), time.monotonic()
+
+
+class ClientRegistry:
+    """A thread-safe registry of clients, keyed by (api_key, base_url).
+
+    Intended for processes that upload on behalf of several API keys or API
+    deployments at once. Each registered client has its own connection pool.
+    When more than `max_clients` are registered, the least recently used one
+    is evicted. Evicted clients are not closed, so uploads already using them
+    can complete; their connections are released once they are no longer
+    referenced.
+    """
+
+    def __init__(self, max_clients: int = _DEFAULT_MAX_REGISTERED_CLIENTS) -> None:
+        if max_clients < 1:
+            raise ValueError("max_clients must be at least one")
+        self._max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[Tuple[str, str], AirtrainClient]" = OrderedDict()
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> AirtrainClient:
+        """Get the client for the given credentials, creating it if needed."""
+        if api_key is None:
+            raise AuthenticationError("Invalid API key; must not be None")
+        key = (api_key, _resolve_base_url(base_url))
+        with self._lock:
+            existing = self._clients.get(key)
+            if existing is not None:
+                self._clients.move_to_end(key)
+                return existing
+
+            created = AirtrainClient(api_key=key[0], base_url=key[1])
+            self._clients[key] = created
+            while len(self._clients) > self._max_clients:
+                self._clients.popitem(last=False)
+            return created
+
+    def clear(self) -> None:
+        """Remove all registered clients."""
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+_registry = ClientRegistry()
+
+
 @lru_cache(maxsize=1)
 def client() -> AirtrainClient:
     """Get the default Airtrain client. This is an internal API for advanced usage."""
@@ -226,6 +746,105 @@ def client() -> AirtrainClient:
     return AirtrainClient()
 
 
+def client_for(api_key: str, base_url: Optional[str] = None) -> AirtrainClient:
+    """Get a client for explicit credentials from the shared, thread-safe registry."""
+    return _registry.get(api_key, base_url)
+
+
+def resolve_client(
+    airtrain_client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+) -> AirtrainClient:
+    """Get the client an upload should use.
+
+    An explicit client takes precedence. Otherwise, if credentials or a base url
+    are given, a client for them is taken from the registry. Otherwise, the
+    default client is used.
+    """
+    if airtrain_client is not None:
+        if api_key is not None or base_url is not None:
+            raise ValueError(
+                "Provide either an explicit client or credentials, but not both."
+            )
+        return airtrain_client
+    if api_key is None and base_url is None:
+        return client()
+    api_key = api_key or _find_api_key()
+    if api_key is None:
+        raise AuthenticationError(
+            "No Api key found. "
+            "Set one with the environment variable 'AIRTRAIN_API_KEY' or the "
+            "function airtrain.set_api_key"
+        )
+    return client_for(api_key, base_url)
+
+
+def _resolve_base_url(base_url: Optional[str]) -> str:
+    resolved = base_url or os.environ.get("AIRTRAIN_API_URL") or _DEFAULT_BASE_URL
+    if resolved.endswith("/"):
+        resolved = resolved[:-1]
+    return resolved
+
+
+@contextmanager
+def record_attempts() -> Iterator[List[AttemptMetrics]]:
+    """Collect metrics for every request attempt made in this context.
+
+    Only attempts made from the current thread (or asyncio task) are collected.
+    Contexts may be nested, in which case the attempts of the inner context are
+    also collected by the outer one when the inner one exits.
+
+    Yields
+    ------
+    A list that is appended to as attempts complete.
+    """
+    attempts: List[AttemptMetrics] = []
+    outer_attempts = _attempt_log.get()
+    token = _attempt_log.set(attempts)
+    try:
+        yield attempts
+    finally:
+        _attempt_log.reset(token)
+        if outer_attempts is not None:
+            outer_attempts.extend(attempts)
+
+
+def _record_attempt(policy: RetryPolicy, metrics: AttemptMetrics) -> None:
+    attempts = _attempt_log.get()
+    if attempts is not None:
+        attempts.append(metrics)
+    if policy.on_attempt is not None:
+        policy.on_attempt(metrics)
+
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _parse_ingest_job_status(response: ResponseJson) -> IngestJobStatus:
+    job_id = response.get("ingestionJobId")
+    state = response.get("status")
+    error_message = response.get("errorMessage")
+    if not (
+        isinstance(job_id, str)
+        and isinstance(state, str)
+        and (error_message is None or isinstance(error_message, str))
+    ):
+        raise ServerError(f"Malformed response: {response}")
+    return IngestJobStatus(ingest_job_id=job_id, state=state, error_message=error_message)
+
+
 def _find_api_key() -> Optional[str]:
     global _DEFAULT_API_KEY
     if _DEFAULT_API_KEY is not None:
@@ -244,6 +863,20 @@ def set_api_key(api_key: str) -> None:
     client()._api_key = api_key
 
 
+def _rewindable_byte_stream(content: io.BufferedIOBase) -> ByteStreamFactory:
+    # Keep the already-encoded content around so that a retry re-sends the
+    # same bytes instead of re-reading them from wherever they came from.
+    if not content.seekable():
+        content = io.BytesIO(content.read())
+    start = content.tell()
+
+    def chunks() -> Iterable[bytes]:
+        content.seek(start)
+        return _buffer_to_byte_iterable(content)
+
+    return chunks
+
+
 def _buffer_to_byte_iterable(buffer: io.BufferedIOBase) -> Iterable[bytes]:
     while True:
         chunk = buffer.read(_BUFFER_CHUNK_SIZE)
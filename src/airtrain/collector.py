@@ -0,0 +1,355 @@
+"""Collect data from many processes into a single upload.
+
+Worker processes write Arrow data to a `CollectorSink`. Each write is encoded
+once, in Arrow IPC format, directly into a new shared memory segment, and only
+the name of the segment is sent to the uploading process, which reads the data
+from shared memory without copying it. Rows are never pickled.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+from multiprocessing.process import BaseProcess
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pyarrow as pa
+
+from airtrain.core import (
+    _DEFAULT_MAX_INFLIGHT_BYTES,
+    _MAX_PART_BYTES,
+    CreationArgs,
+    DatasetMetadata,
+    Unpack,
+    upload_from_arrow_tables,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# How long to wait for writes already under way, once the upload has stopped
+_DRAIN_TIMEOUT_SECONDS: float = 5.0
+# How often to check on the workers while waiting for data from them
+_POLL_SECONDS: float = 1.0
+
+
+class CollectorSink:
+    """Where one worker process writes its data to. See `Collector`.
+
+    Sinks are created with `Collector.sink`, and passed to the worker processes
+    when starting them (ex: as an argument of `multiprocessing.Process`). Close
+    the sink (or use it as a context manager) once the worker has written all
+    of its data: the upload finishes once every sink has been closed.
+    """
+
+    def __init__(
+        self,
+        messages: Any,
+        condition: Any,
+        buffered_bytes: Any,
+        stopped: Any,
+        max_buffered_bytes: int,
+    ) -> None:
+        self._messages = messages
+        self._condition = condition
+        self._buffered_bytes = buffered_bytes
+        self._stopped = stopped
+        self._max_buffered_bytes = max_buffered_bytes
+        self._closed = False
+
+    @property
+    def stopped(self) -> bool:
+        """Whether the upload has stopped, ex: at the dataset's row limit.
+
+        Data written once the upload has stopped is discarded, so workers may
+        check this to stop producing data early.
+        """
+        return self._stopped.is_set()
+
+    def write(self, data: Union[pa.Table, pa.RecordBatch]) -> None:
+        """Write a table or record batch of data.
+
+        All data written to the sinks of a collector must have the same schema.
+        Blocks while the collector's buffer is full.
+        """
+        if self._closed:
+            raise ValueError("Cannot write to a closed sink.")
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+        if data.num_rows == 0:
+            return
+        n_bytes = _encoded_size(data)
+        if not self._acquire(n_bytes):
+            return
+        try:
+            name = _write_segment(data, n_bytes)
+        except BaseException:
+            self._release(n_bytes)
+            raise
+        self._messages.put((name, n_bytes))
+
+    def close(self) -> None:
+        """Signal that this sink will not be written to anymore."""
+        if not self._closed:
+            self._closed = True
+            self._messages.put((None, 0))
+
+    def __enter__(self) -> "CollectorSink":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _acquire(self, n_bytes: int) -> bool:
+        """Wait for room in the buffer. Returns False if the upload has stopped."""
+        with self._condition:
+            while (
+                not self._stopped.is_set()
+                and self._buffered_bytes.value > 0
+                and self._buffered_bytes.value + n_bytes > self._max_buffered_bytes
+            ):
+                self._condition.wait()
+            if self._stopped.is_set():
+                return False
+            self._buffered_bytes.value += n_bytes
+            return True
+
+    def _release(self, n_bytes: int) -> None:
+        with self._condition:
+            self._buffered_bytes.value -= n_bytes
+            self._condition.notify_all()
+
+
+class Collector:
+    """Uploads the data written by many worker processes as a single dataset.
+
+    Create a sink for every worker with `sink`, start the workers, and then
+    call `upload`, which uploads the data as the workers write it, until every
+    sink is closed:
+
+        collector = Collector()
+        workers = [Process(target=work, args=(collector.sink(),)) for _ in range(8)]
+        for worker in workers:
+            worker.start()
+        result = collector.upload(workers, name="Scraped pages")
+
+    Parameters
+    ----------
+    max_buffered_bytes:
+        The most bytes of written data that may be waiting in shared memory for
+        the upload to read them. Writes block while this is used up, except
+        that a single write is always allowed when nothing else is buffered.
+        Defaults to 256 MiB. Data being uploaded is bounded separately, by the
+        `max_inflight_bytes` of the upload.
+    context:
+        Optionally, the multiprocessing context the worker processes are started
+        from. Defaults to the default context.
+    timeout:
+        Optionally, the most seconds to wait for the workers to write data or
+        close their sinks. If a worker is killed before closing its sink, the
+        upload would otherwise wait for it forever, unless the workers are passed
+        to `upload`.
+    """
+
+    def __init__(
+        self,
+        max_buffered_bytes: int = _DEFAULT_MAX_INFLIGHT_BYTES,
+        context: Optional[Any] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        if max_buffered_bytes < 1:
+            raise ValueError("max_buffered_bytes must be at least one")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        self.timeout = timeout
+        context = context or multiprocessing.get_context()
+        if os.name == "posix":
+            # Workers register the segments they create with the resource tracker
+            # of this process, which must be running before they start. Otherwise,
+            # each worker would start its own, and unlink the worker's segments
+            # when it exits, even if they haven't been read yet.
+            from multiprocessing import resource_tracker
+
+            resource_tracker.ensure_running()
+        self.max_buffered_bytes = max_buffered_bytes
+        self._messages = context.Queue()
+        self._condition = context.Condition()
+        self._buffered_bytes = context.Value("q", 0, lock=False)
+        self._stopped = context.Event()
+        self._n_sinks = 0
+        self._started = False
+
+    def sink(self) -> CollectorSink:
+        """Create a sink for one worker process to write to.
+
+        Every sink must be created before `upload` is called.
+        """
+        if self._started:
+            raise ValueError("Cannot create sinks once the upload has started.")
+        self._n_sinks += 1
+        return CollectorSink(
+            self._messages,
+            self._condition,
+            self._buffered_bytes,
+            self._stopped,
+            self.max_buffered_bytes,
+        )
+
+    def upload(
+        self,
+        workers: Optional[Sequence[BaseProcess]] = None,
+        **kwargs: Unpack[CreationArgs],
+    ) -> DatasetMetadata:
+        """Upload the data written to the sinks, until they are all closed.
+
+        Raises a RuntimeError if every worker has exited with sinks still open
+        (ex: a worker was killed), and a TimeoutError if no data arrives within
+        the collector's `timeout`, rather than waiting forever.
+
+        Parameters
+        ----------
+        workers:
+            Optionally, the processes writing to the sinks, to stop waiting for
+            data once they have all exited.
+        kwargs:
+            See `upload_from_arrow_tables` for arguments.
+
+        Returns
+        -------
+        A DatasetMetadata object summarizing the created dataset.
+        """
+        if self._started:
+            raise ValueError("A collector can only be uploaded once.")
+        if self._n_sinks == 0:
+            raise ValueError("Create sinks for the workers before uploading.")
+        self._started = True
+        try:
+            return upload_from_arrow_tables(data=self._tables(workers or []), **kwargs)
+        finally:
+            self._stop()
+
+    def _tables(self, workers: Sequence[BaseProcess]) -> Iterator[pa.Table]:
+        """Read the written data, grouped into tables of up to about a part."""
+        n_open_sinks = self._n_sinks
+        tables: List[pa.Table] = []
+        n_bytes = 0
+        while n_open_sinks > 0:
+            name, size = self._next_message(workers, n_open_sinks)
+            if name is None:
+                n_open_sinks -= 1
+            else:
+                table = _read_segment(name, size)
+                self._release(size)
+                if len(tables) > 0 and n_bytes + table.nbytes > _MAX_PART_BYTES:
+                    yield pa.concat_tables(tables)
+                    tables, n_bytes = [], 0
+                tables.append(table)
+                n_bytes += table.nbytes
+            # Rather than wait for more data, upload what there is when idle.
+            if len(tables) > 0 and (n_open_sinks == 0 or self._messages.empty()):
+                yield pa.concat_tables(tables)
+                tables, n_bytes = [], 0
+
+    def _next_message(
+        self, workers: Sequence[BaseProcess], n_open_sinks: int
+    ) -> Tuple[Optional[str], int]:
+        poll_seconds = min(_POLL_SECONDS, self.timeout or _POLL_SECONDS)
+        waited = 0.0
+        workers_exited = False
+        while True:
+            try:
+                return self._messages.get(timeout=poll_seconds)
+            except queue.Empty:
+                waited += poll_seconds
+            # Workers flush their messages before exiting, so once they had all
+            # exited before the last poll, no more messages are coming.
+            if workers_exited:
+                raise RuntimeError(
+                    f"All workers exited, but {n_open_sinks} of their sinks were "
+                    "never closed. A worker may have been killed."
+                )
+            if self.timeout is not None and waited >= self.timeout:
+                raise TimeoutError(
+                    f"No data was written to the sinks for {self.timeout} seconds, "
+                    f"and {n_open_sinks} of them are still open."
+                )
+            workers_exited = len(workers) > 0 and not any(
+                worker.is_alive() for worker in workers
+            )
+
+    def _stop(self) -> None:
+        """Discard data written after the upload stopped, and unblock writers."""
+        with self._condition:
+            self._stopped.set()
+            self._condition.notify_all()
+        while True:
+            with self._condition:
+                if self._buffered_bytes.value <= 0:
+                    return
+            try:
+                name, size = self._messages.get(timeout=_DRAIN_TIMEOUT_SECONDS)
+            except queue.Empty:
+                logger.warning("Gave up waiting for writes to sinks to finish.")
+                return
+            if name is not None:
+                _unlink_segment(name)
+                self._release(size)
+
+    def _release(self, n_bytes: int) -> None:
+        with self._condition:
+            self._buffered_bytes.value -= n_bytes
+            self._condition.notify_all()
+
+
+def _encoded_size(table: pa.Table) -> int:
+    stream = pa.MockOutputStream()
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    return stream.size()
+
+
+def _write_segment(table: pa.Table, n_bytes: int) -> str:
+    """Encode a table into a new shared memory segment. Returns its name."""
+    segment = SharedMemory(create=True, size=n_bytes)
+    try:
+        _encode_into(segment.buf, table)
+    except BaseException:
+        segment.unlink()
+        raise
+    # Only possible once no buffer refers to the segment's memory anymore
+    segment.close()
+    return segment.name
+
+
+def _encode_into(memory: memoryview, table: pa.Table) -> None:
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(memory))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_segment(name: str, n_bytes: int) -> pa.Table:
+    """Read the table in a shared memory segment, without copying it.
+
+    The segment is unlinked right away, and its memory is freed once the table
+    (and any table sliced from it) is no longer used.
+    """
+    segment, address = _attach_segment(name)
+    segment.unlink()
+    buffer = pa.foreign_buffer(address, n_bytes, base=segment)
+    return pa.ipc.open_stream(buffer).read_all()
+
+
+def _unlink_segment(name: str) -> None:
+    segment, _ = _attach_segment(name)
+    segment.unlink()
+    segment.close()
+
+
+def _attach_segment(name: str) -> Tuple[SharedMemory, int]:
+    segment = SharedMemory(name=name)
+    view = pa.py_buffer(segment.buf)
+    address = view.address
+    # Don't keep the segment's memory exported, so that it can be closed.
+    del view
+    return segment, address
@@ -1,17 +1,60 @@
 import io
 import logging
+import os
 import sys
-from collections import defaultdict
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_for_futures
 from dataclasses import dataclass, fields
 from datetime import datetime
 from itertools import islice
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+import numpy as np
 import pyarrow as pa
 import pyarrow.parquet as pq
 from pyarrow.compute import count as count_arrow
 
-from airtrain.client import client
+from airtrain.client import (
+    AirtrainClient,
+    ByteStreamFactory,
+    record_attempts,
+    resolve_client,
+)
+from airtrain.clustering import Clustering, _Clusterer
+from airtrain.flattening import Flattening, flatten_table
+from airtrain.instrumentation import (
+    PartMetrics,
+    UploadObserver,
+    UploadTimings,
+    notify,
+    notify_errors,
+)
+from airtrain.memory import MemoryBudget, SpilledPart
+from airtrain.optimization import TypeOptimization, _TypeOptimizer
+from airtrain.projection import EmbeddingProjection, _project_tables
+from airtrain.sampling import Sampling, sample_tables
+from airtrain.sidecar import EmbeddingSidecar, _SidecarPart, split_embeddings
+from airtrain.sparse import SparseKeys, _SparseDictConverter
+from airtrain.staging import StagedManifest, StagingClient
+from airtrain.stats import ColumnStats, _StatsCollector
 
 
 if sys.version_info > (3, 11):
@@ -20,6 +63,22 @@ if sys.version_info > (3, 11):
     class CreationArgs(TypedDict):
         name: Optional[str]
         embedding_column: Optional[str]
+        client: Optional[AirtrainClient]
+        api_key: Optional[str]
+        base_url: Optional[str]
+        observer: Optional[UploadObserver]
+        upload_concurrency: Optional[int]
+        max_inflight_bytes: Optional[int]
+        spill_dir: Optional[str]
+        stream_encoding: Optional[bool]
+        stage_to: Optional[str]
+        sampling: Optional[Sampling]
+        flatten_nested: Optional[Union[bool, Flattening]]
+        optimize_types: Optional[Union[bool, TypeOptimization]]
+        cluster_rows: Optional[Clustering]
+        project_embeddings: Optional[EmbeddingProjection]
+        embedding_sidecar: Optional[Union[bool, EmbeddingSidecar]]
+        column_stats: Optional[bool]
 else:
     # Unpack is only >3.11 . We'll just rely on type
     # checking in those versions to catch mistakes.
@@ -34,6 +93,16 @@ logger = logging.getLogger(__name__)
 
 
 _MAX_BATCH_SIZE: int = 2000
+# Larger tables are split into several parts, to bound the memory each part needs.
+_MAX_PART_BYTES: int = 64 * 1024 * 1024
+# Parts are not split smaller than this to fit a memory budget.
+_MIN_PART_BYTES: int = 1024 * 1024
+_DEFAULT_MAX_INFLIGHT_BYTES: int = 256 * 1024 * 1024
+# With streaming encoding, parts are encoded and sent a row group of about this
+# many Arrow bytes at a time.
+_STREAM_ROW_GROUP_BYTES: int = 4 * 1024 * 1024
+_DEFAULT_PUSH_CONCURRENCY: int = 16
+_DEFAULT_UPLOAD_MANY_WORKERS: int = 8
 
 
 @dataclass
@@ -42,10 +111,18 @@ class DatasetMetadata:
     id: str
     url: str
     size: int
+    timings: Optional[UploadTimings] = None
+    # Pass the metadata to `airtrain.wait_for_ingest` to wait for ingestion.
+    ingest_job_id: Optional[str] = None
+    # Stats of each column, by name, if collected with `column_stats=True`
+    column_stats: Optional[Dict[str, ColumnStats]] = None
 
     def __post_init__(self) -> None:
         for field in fields(self):
             value = getattr(self, field.name)
+            if not isinstance(field.type, type):
+                # Only simple types can be checked with isinstance.
+                continue
             if not isinstance(value, field.type):
                 raise ValueError(
                     f"Field '{field.name}' must be {field.type}. Got: '{value}'"
@@ -55,6 +132,7 @@ class DatasetMetadata:
 def upload_from_dicts(
     data: Iterable[Dict[str, Any]],
     schema: Optional[pa.Schema] = None,
+    sparse_keys: Optional[Union[bool, SparseKeys]] = None,
     **kwargs: Unpack[CreationArgs],
 ) -> DatasetMetadata:
     """Upload an Airtrain dataset from the provided dictionaries.
@@ -69,6 +147,12 @@ def upload_from_dicts(
     schema:
         Optionally, the Arrow schema the data conforms to. If not provided, the
         schema will be inferred from a sample of the data.
+    sparse_keys:
+        If True, or given as a `SparseKeys`, only keys present in many rows
+        become columns, and the other keys of each row are put in a single map
+        column. Intended for rows with many distinct keys, each in few rows
+        (ex: events with optional attributes). If `schema` is given, its fields
+        are the columns. See `airtrain.sparse.SparseKeys`.
     kwargs:
         See `upload_from_arrow_tables` for other arguments.
 
@@ -78,12 +162,146 @@ def upload_from_dicts(
     """
     data = iter(data)  # to ensure itertools works even if it was a list, etc.
     batches = _batched(data, _MAX_BATCH_SIZE)
+    if sparse_keys:
+        converter = _SparseDictConverter(
+            SparseKeys() if sparse_keys is True else sparse_keys, schema
+        )
+        tables: Iterable[pa.Table] = map(converter.to_table, batches)
+    else:
+        tables = _dict_batches_to_tables(batches, schema)
+    return upload_from_arrow_tables(data=tables, **kwargs)
+
+
+def upload_from_columns(
+    data: Mapping[str, Any],
+    **kwargs: Unpack[CreationArgs],
+) -> DatasetMetadata:
+    """Upload an Airtrain dataset from columns of data.
+
+    Parameters
+    ----------
+    data:
+        A mapping from column names to the values of the column. Values may be
+        1-dimensional numpy arrays, 2-dimensional numpy arrays (ex: a matrix of
+        embeddings, one row per row of data), Arrow arrays, or lists of values.
+        All columns must have the same length. Numeric numpy arrays are used by
+        Arrow without copying them, and no python objects are created per row.
+    kwargs:
+        See `upload_from_arrow_tables` for other arguments.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing the created dataset.
+    """
+    arrays = {name: _column_to_arrow(name, column) for name, column in data.items()}
+    lengths = {name: len(array) for name, array in arrays.items()}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"All columns must have the same length. Got: {lengths}")
+    table = pa.table(arrays)
     return upload_from_arrow_tables(
-        data=_dict_batches_to_tables(batches, schema),
+        data=_split_into_parts(table, _MAX_PART_BYTES),
         **kwargs,
     )
 
 
+def _column_to_arrow(name: str, column: Any) -> Union[pa.Array, pa.ChunkedArray]:
+    if isinstance(column, (pa.Array, pa.ChunkedArray)):
+        return column
+    if not isinstance(column, np.ndarray):
+        return pa.array(column)
+    if column.ndim == 1:
+        return pa.array(column)
+    if column.ndim == 2:
+        # The rows of a C-contiguous matrix are already laid out as Arrow expects
+        # the values of a fixed size list to be.
+        values = pa.array(np.ascontiguousarray(column).reshape(-1))
+        return pa.FixedSizeListArray.from_arrays(values, column.shape[1])
+    raise ValueError(f"Column '{name}' must have 1 or 2 dimensions. Got: {column.ndim}")
+
+
+def upload_from_arrow_stream(
+    data: Any,
+    **kwargs: Unpack[CreationArgs],
+) -> DatasetMetadata:
+    """Upload an Airtrain dataset from a stream of Arrow record batches.
+
+    Parameters
+    ----------
+    data:
+        A `pyarrow.RecordBatchReader`, or any object implementing the Arrow
+        PyCapsule stream interface (`__arrow_c_stream__`), such as results from
+        DuckDB, Polars, or ADBC drivers. Record batches are consumed as they are
+        produced, without copying them, and grouped into parts for upload.
+    kwargs:
+        See `upload_from_arrow_tables` for other arguments.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing the created dataset.
+    """
+    reader = _to_record_batch_reader(data)
+    return upload_from_arrow_tables(
+        data=_batches_to_tables(reader, _MAX_PART_BYTES),
+        **kwargs,
+    )
+
+
+def _to_record_batch_reader(data: Any) -> pa.RecordBatchReader:
+    if isinstance(data, pa.RecordBatchReader):
+        return data
+    if not hasattr(data, "__arrow_c_stream__"):
+        raise TypeError(
+            "Data must be a RecordBatchReader or implement __arrow_c_stream__. "
+            f"Got: {type(data)}"
+        )
+    from_stream = getattr(pa.RecordBatchReader, "from_stream", None)
+    if from_stream is not None:
+        return from_stream(data)
+    # pyarrow<15 can only import the stream's capsule directly.
+    import_capsule = getattr(pa.RecordBatchReader, "_import_from_c_capsule", None)
+    if import_capsule is None:
+        raise TypeError("Reading __arrow_c_stream__ objects requires pyarrow>=14.")
+    return import_capsule(data.__arrow_c_stream__())
+
+
+def _batches_to_tables(
+    reader: pa.RecordBatchReader, max_part_bytes: int
+) -> Iterator[pa.Table]:
+    """Group record batches into tables of up to about max_part_bytes.
+
+    The tables reference the batches' memory, rather than copying it.
+    """
+    batches: List[pa.RecordBatch] = []
+    n_bytes = 0
+    for batch in reader:
+        if batch.num_rows == 0:
+            continue
+        if len(batches) > 0 and n_bytes + batch.nbytes > max_part_bytes:
+            yield pa.Table.from_batches(batches, schema=reader.schema)
+            batches = []
+            n_bytes = 0
+        batches.append(batch)
+        n_bytes += batch.nbytes
+    if len(batches) > 0:
+        yield pa.Table.from_batches(batches, schema=reader.schema)
+
+
+class _RowLimitedSource(ABC):
+    """A source of tables which can avoid reading rows beyond the row limit.
+
+    The row limit is only known once the dataset has been created. Sources which
+    can use it to do less work (ex: by limiting a query) implement `tables`,
+    which is given the limit when the upload starts reading.
+    """
+
+    @abstractmethod
+    def tables(self, row_limit: int) -> Iterable[pa.Table]:
+        pass
+
+    def __iter__(self) -> Iterator[pa.Table]:
+        return iter(self.tables(sys.maxsize))
+
+
 def _is_arrow_number(type_: pa.DataType) -> bool:
     checks = [
         pa.types.is_floating,
@@ -142,6 +360,22 @@ def upload_from_arrow_tables(
     data: Iterable[pa.Table],
     name: Optional[str] = None,
     embedding_column: Optional[str] = None,
+    client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    observer: Optional[UploadObserver] = None,
+    upload_concurrency: Optional[int] = None,
+    max_inflight_bytes: Optional[int] = None,
+    spill_dir: Optional[str] = None,
+    stream_encoding: Optional[bool] = None,
+    stage_to: Optional[str] = None,
+    sampling: Optional[Sampling] = None,
+    flatten_nested: Optional[Union[bool, Flattening]] = None,
+    optimize_types: Optional[Union[bool, TypeOptimization]] = None,
+    cluster_rows: Optional[Clustering] = None,
+    project_embeddings: Optional[EmbeddingProjection] = None,
+    embedding_sidecar: Optional[Union[bool, EmbeddingSidecar]] = None,
+    column_stats: Optional[bool] = None,
 ) -> DatasetMetadata:
     """Upload an Airtrain dataset from the provided dictionaries.
 
@@ -159,55 +393,810 @@ def upload_from_arrow_tables(
         The column must have non-null values for every row. Every row must be
         a list of numewric values, representing the embedding vector. All
         vectors must have the same dimensionality (length).
+    client:
+        Optionally, the client to upload with. If not provided, a client for
+        `api_key` and `base_url` is used if either is given, and the default
+        client otherwise. Uploads using different clients may run concurrently
+        from different threads.
+    api_key:
+        Optionally, the API key to upload with, instead of the default one.
+        Cannot be combined with `client`.
+    base_url:
+        Optionally, the URL of the Airtrain API to upload to, instead of the
+        default one. Cannot be combined with `client`.
+    observer:
+        Optionally, an observer to receive progress events and metrics for
+        every uploaded part. See `airtrain.instrumentation`.
+    upload_concurrency:
+        The number of parts that may be uploaded at once. Defaults to one. With
+        more than one, the next parts are read and encoded while earlier ones
+        upload, and parts may be stored in a different order than they were read.
+    max_inflight_bytes:
+        The memory budget for parts that have been read but not yet uploaded,
+        measured as the Arrow memory of parts being encoded plus the size of
+        encoded parts. Defaults to 256 MiB. Reading from `data` pauses while the
+        budget is used up. Large tables are split into several parts to fit the
+        budget: each part is at most the budget divided by one more than
+        `upload_concurrency`, but no less than 1 MiB.
+    spill_dir:
+        Optionally, a directory to write encoded parts to, as temporary files,
+        when the memory budget is used up. Spilled parts are memory-mapped for
+        upload, so reading from `data` can continue instead of pausing.
+    stream_encoding:
+        If True, encode each part while it is being uploaded, one row group at
+        a time, rather than encoding the whole part before uploading it. Only
+        about a row group of encoded data is held at once, and encoding overlaps
+        with sending. A part is encoded again from its Arrow data if its upload
+        needs to be retried.
+    stage_to:
+        Optionally, a local directory to write the dataset to instead of
+        uploading it, to be uploaded later with `push_staged`. The data goes
+        through the same validation and conversion, and the exact Parquet parts
+        that would have been uploaded are written, along with a manifest. No
+        requests are made to Airtrain, so the returned metadata has a local id,
+        and the URL of the directory. Cannot be combined with `client`,
+        `api_key`, or `base_url`.
+    sampling:
+        Optionally, how to sample rows when `data` has more rows than the
+        dataset's row limit, instead of uploading the first rows. All of `data`
+        is read before uploading starts, holding about as many rows as the row
+        limit in memory. See `airtrain.sampling.Sampling`.
+    flatten_nested:
+        If True, or given as a `Flattening`, flatten struct columns into
+        top-level columns with dotted names (ex: `meta.author.name`), optionally
+        packing the values of deep or numerous struct fields into a single map
+        column. This is done with Arrow, without converting the data to python.
+        The embedding column may be a flattened column. See
+        `airtrain.flattening.Flattening`.
+    optimize_types:
+        If True, or given as a `TypeOptimization`, convert columns to more
+        compact types where no values are lost: 32 bit integers and floats, and
+        dictionary encoded strings. Types are chosen from the first
+        table of data, and the memory saved is reported in the upload's timings
+        as `optimized_bytes_saved`. See `airtrain.optimization.TypeOptimization`.
+    cluster_rows:
+        Optionally, how to reorder the rows of each table of data so that similar
+        rows are next to each other, which makes encoded parts smaller. The
+        first rows are encoded both ways to measure the effect, reported in the
+        upload's timings as `clustered_size_ratio`. See
+        `airtrain.clustering.Clustering`.
+    project_embeddings:
+        Optionally, a projection of the embeddings of `embedding_column` to fewer
+        dimensions, making them smaller to encode and upload. The projection is
+        fitted to the first embeddings if it was not already, and can then be
+        saved and reused for other uploads. See
+        `airtrain.projection.EmbeddingProjection`.
+    embedding_sidecar:
+        If True, or given as an `EmbeddingSidecar`, upload the embeddings of
+        `embedding_column` as a dense binary matrix next to each Parquet part,
+        instead of as a column of it. This is faster to encode and smaller than
+        a Parquet list column. Cannot be combined with `stage_to`. See
+        `airtrain.sidecar`.
+    column_stats:
+        If True, compute stats of every column while uploading: null counts,
+        min and max values, estimated distinct counts, and estimated quantiles
+        of numbers, of text lengths, and of embedding norms. Each table is
+        summarized in one vectorized pass into small sketches, which are merged
+        over the whole upload. The stats are sent to Airtrain with the dataset,
+        and returned as the `column_stats` of the metadata. See
+        `airtrain.stats.ColumnStats`.
 
     Returns
     -------
     A DatasetMetadata object summarizing the created dataset.
     """
+    started = time.perf_counter()
     name = name or f"My Dataset {datetime.now()}"
-    c = client()
+    if project_embeddings is not None and embedding_column is None:
+        raise ValueError("Projecting embeddings requires an embedding_column.")
+    sidecar = (
+        EmbeddingSidecar() if embedding_sidecar is True else embedding_sidecar or None
+    )
+    if sidecar is not None and embedding_column is None:
+        raise ValueError("An embedding sidecar requires an embedding_column.")
+    if sidecar is not None and stage_to is not None:
+        raise ValueError("Staged datasets cannot have an embedding sidecar.")
+    c: Union[AirtrainClient, StagingClient]
+    if stage_to is not None:
+        if client is not None or api_key is not None or base_url is not None:
+            raise ValueError("Staged datasets cannot be uploaded with a client.")
+        c = StagingClient(stage_to)
+    else:
+        c = resolve_client(client, api_key=api_key, base_url=base_url)
     creation_call_result = c.create_dataset(
         name=name, embedding_column_name=embedding_column
     )
+    dataset_id = creation_call_result.dataset_id
+    if observer is not None:
+        notify(observer.on_start, dataset_id, name)
+    with notify_errors(observer, dataset_id):
+        stats = _StatsCollector() if column_stats else None
+        uploader = _PartUploader(
+            client=c,
+            dataset_id=dataset_id,
+            started=started,
+            observer=observer,
+            concurrency=upload_concurrency or 1,
+            budget=MemoryBudget(max_inflight_bytes or _DEFAULT_MAX_INFLIGHT_BYTES),
+            spill_dir=spill_dir,
+            stream_encoding=bool(stream_encoding),
+            embedding_sidecar=(
+                None
+                if sidecar is None or embedding_column is None
+                else (embedding_column, sidecar)
+            ),
+        )
+        size = _upload_tables(
+            data,
+            embedding_column,
+            creation_call_result.row_limit,
+            uploader,
+            sampling,
+            Flattening() if flatten_nested is True else flatten_nested or None,
+            TypeOptimization() if optimize_types is True else optimize_types or None,
+            cluster_rows,
+            project_embeddings,
+            stats,
+        )
+        return _finish_upload(
+            c, name, size, uploader, observer, None if stats is None else stats.result()
+        )
+
+
+def push_staged(
+    path: str,
+    client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    observer: Optional[UploadObserver] = None,
+    upload_concurrency: int = _DEFAULT_PUSH_CONCURRENCY,
+) -> DatasetMetadata:
+    """Upload an Airtrain dataset staged to a local directory.
+
+    The staged Parquet parts are uploaded as they are, without decoding or
+    re-encoding them, except for the one part (if any) that crosses the row
+    limit of the account, of which only the rows within the limit are uploaded.
+
+    Parameters
+    ----------
+    path:
+        The directory the dataset was staged to, with the `stage_to` argument of
+        an `upload_from_x(...)` function.
+    client:
+        Optionally, the client to upload with. See `upload_from_arrow_tables`.
+    api_key:
+        Optionally, the API key to upload with. See `upload_from_arrow_tables`.
+    base_url:
+        Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+    observer:
+        Optionally, an observer to receive progress events and metrics for
+        every uploaded part. See `airtrain.instrumentation`.
+    upload_concurrency:
+        The number of parts that may be uploaded at once.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing the created dataset.
+    """
+    started = time.perf_counter()
+    manifest = StagedManifest.read(path)
+    c = resolve_client(client, api_key=api_key, base_url=base_url)
+    creation_call_result = c.create_dataset(
+        name=manifest.name, embedding_column_name=manifest.embedding_column
+    )
     limit = creation_call_result.row_limit
     dataset_id = creation_call_result.dataset_id
     size = 0
+    if observer is not None:
+        notify(observer.on_start, dataset_id, manifest.name)
+    with notify_errors(observer, dataset_id):
+        uploader = _PartUploader(
+            client=c,
+            dataset_id=dataset_id,
+            started=started,
+            observer=observer,
+            concurrency=upload_concurrency,
+            budget=MemoryBudget(_DEFAULT_MAX_INFLIGHT_BYTES),
+            spill_dir=None,
+        )
+
+        with uploader:
+            for part in manifest.parts:
+                if size >= limit:
+                    break
+                uploader.raise_if_failed()
+                part_path = os.path.join(path, part.file)
+                if size + part.rows <= limit:
+                    uploader.upload_file(part_path, part.rows)
+                    size += part.rows
+                else:
+                    table = pq.read_table(part_path)[: limit - size]
+                    uploader.upload(table, _StageSeconds())
+                    size += table.shape[0]
+
+        # The stats describe all staged rows, even when fewer are within the limit.
+        column_stats = None
+        if manifest.column_stats is not None:
+            column_stats = {
+                column["name"]: ColumnStats.from_json(column)
+                for column in manifest.column_stats
+            }
+        return _finish_upload(c, manifest.name, size, uploader, observer, column_stats)
+
+
+@dataclass
+class DatasetSpec:
+    """Describes one of the datasets to upload with `upload_many`.
+
+    Parameters
+    ----------
+    data:
+        An iterable of arrow tables to construct the dataset out of. See
+        `upload_from_arrow_tables`.
+    name:
+        The name of the dataset. See `upload_from_arrow_tables`.
+    embedding_column:
+        The name of a column containing embeddings. See `upload_from_arrow_tables`.
+    """
+
+    data: Iterable[pa.Table]
+    name: Optional[str] = None
+    embedding_column: Optional[str] = None
+
+
+def upload_many(
+    specs: List[DatasetSpec],
+    client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    observer: Optional[UploadObserver] = None,
+    max_workers: int = _DEFAULT_UPLOAD_MANY_WORKERS,
+    max_inflight_bytes: Optional[int] = None,
+) -> List[DatasetMetadata]:
+    """Upload several Airtrain datasets at once.
+
+    Every dataset is read and converted on a thread of its own (up to
+    `max_workers` datasets at a time), and the parts of all datasets are
+    uploaded from one shared pool of `max_workers` threads, over the connections
+    of a single client. Each dataset may only have its fair share of the pool's
+    threads uploading its parts at once, so that large datasets don't hold up
+    small ones.
+
+    Parameters
+    ----------
+    specs:
+        The datasets to upload.
+    client:
+        Optionally, the client to upload with. See `upload_from_arrow_tables`.
+    api_key:
+        Optionally, the API key to upload with. See `upload_from_arrow_tables`.
+    base_url:
+        Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+    observer:
+        Optionally, an observer to receive progress events and metrics for
+        every uploaded part of every dataset. See `airtrain.instrumentation`.
+    max_workers:
+        The number of parts that may be uploaded at once, over all datasets.
+    max_inflight_bytes:
+        The memory budget for parts that have been read but not yet uploaded,
+        over all datasets. Defaults to 256 MiB. See `upload_from_arrow_tables`.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing each created dataset, in the order of
+    `specs`. If any dataset fails to upload, the first error (in that order)
+    is raised once all others have finished.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least one")
+    if len(specs) == 0:
+        return []
+    c = resolve_client(client, api_key=api_key, base_url=base_url)
+    n_readers = min(len(specs), max_workers)
+    per_dataset_concurrency = max(1, max_workers // n_readers)
+    budget = MemoryBudget(max_inflight_bytes or _DEFAULT_MAX_INFLIGHT_BYTES)
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="airtrain-upload"
+    ) as upload_executor:
+
+        def upload(spec: DatasetSpec) -> DatasetMetadata:
+            started = time.perf_counter()
+            name = spec.name or f"My Dataset {datetime.now()}"
+            creation_call_result = c.create_dataset(
+                name=name, embedding_column_name=spec.embedding_column
+            )
+            dataset_id = creation_call_result.dataset_id
+            if observer is not None:
+                notify(observer.on_start, dataset_id, name)
+            with notify_errors(observer, dataset_id):
+                uploader = _PartUploader(
+                    client=c,
+                    dataset_id=dataset_id,
+                    started=started,
+                    observer=observer,
+                    concurrency=per_dataset_concurrency,
+                    budget=budget,
+                    spill_dir=None,
+                    executor=upload_executor,
+                )
+                size = _upload_tables(
+                    spec.data,
+                    spec.embedding_column,
+                    creation_call_result.row_limit,
+                    uploader,
+                )
+                return _finish_upload(c, name, size, uploader, observer)
+
+        with ThreadPoolExecutor(
+            max_workers=n_readers, thread_name_prefix="airtrain-read"
+        ) as read_executor:
+            futures = [read_executor.submit(upload, spec) for spec in specs]
+        return [future.result() for future in futures]
+
+
+def _upload_tables(
+    data: Iterable[pa.Table],
+    embedding_column: Optional[str],
+    limit: int,
+    uploader: "_PartUploader",
+    sampling: Optional[Sampling] = None,
+    flattening: Optional[Flattening] = None,
+    optimization: Optional[TypeOptimization] = None,
+    clustering: Optional[Clustering] = None,
+    projection: Optional[EmbeddingProjection] = None,
+    stats: Optional[_StatsCollector] = None,
+) -> int:
+    """Validate, convert, and upload tables, up to limit rows. Returns the rows."""
+    size = 0
     embedding_dim: Optional[int] = None
     schema: Optional[pa.Schema] = None
+    tables: Iterator[pa.Table]
+    if isinstance(data, _RowLimitedSource):
+        # Sampling needs to see all of the rows.
+        tables = iter(data.tables(limit if sampling is None else sys.maxsize))
+    else:
+        tables = iter(data)
+    if sampling is not None:
+        tables = sample_tables(tables, limit, sampling)
+    if flattening is not None:
+        tables = (flatten_table(table, flattening) for table in tables)
+    if projection is not None and embedding_column is not None:
+        tables = _project_tables(tables, embedding_column, projection)
+    optimizer = None if optimization is None else _TypeOptimizer(optimization)
+    clusterer = None if clustering is None else _Clusterer(clustering)
+    with uploader:
+        while size < limit:
+            uploader.wait_for_room()
+            stage_started = time.perf_counter()
+            table = next(tables, None)
+            if table is None:
+                break
+            source_done = time.perf_counter()
 
-    for table in data:
-        if schema is None:
-            schema = table.schema
-        if schema != table.schema:
-            logger.error("Mismatched schemas:\n%s\n\n%s", schema, table.schema)
-            raise ValueError("All uploaded tables must have the same schema.")
-        if embedding_column is not None:
-            embedding_dim = _validate_embedding_field(
-                table, embedding_column, embedding_dim
-            )
-        table = table[: limit - size]
-        table = _remove_illegal_parquet_types(table)
+            if schema is None:
+                schema = table.schema
+            if schema != table.schema:
+                logger.error("Mismatched schemas:\n%s\n\n%s", schema, table.schema)
+                raise ValueError("All uploaded tables must have the same schema.")
+            if optimizer is not None:
+                table = optimizer.optimize(table)
+            if embedding_column is not None:
+                embedding_dim = _validate_embedding_field(
+                    table, embedding_column, embedding_dim
+                )
+            validation_done = time.perf_counter()
 
-        upload_buffer = io.BytesIO()
-        pq.write_table(table, upload_buffer)
-        upload_buffer.seek(0)
-        c.upload_dataset_data(dataset_id, upload_buffer)
-        size += table.shape[0]
+            table = table[: limit - size]
+            table = _remove_illegal_parquet_types(table)
+            if clusterer is not None:
+                table = clusterer.cluster(table)
+            if stats is not None:
+                stats.add(table)
+            conversion_done = time.perf_counter()
+            size += table.shape[0]
+
+            stage_seconds = _StageSeconds(
+                source=source_done - stage_started,
+                validation=validation_done - source_done,
+                conversion=conversion_done - validation_done,
+            )
+            for part in _split_into_parts(table, uploader.max_part_bytes):
+                uploader.upload(part, stage_seconds)
+                # Only attribute the time to read the table to its first part.
+                stage_seconds = _StageSeconds()
+    if optimizer is not None:
+        uploader.timings.optimized_bytes_saved = optimizer.bytes_saved
+        logger.info("Optimizing column types saved %s bytes", optimizer.bytes_saved)
+    if clusterer is not None:
+        uploader.timings.clustered_size_ratio = clusterer.size_ratio
+    return size
 
-        if size >= limit:
-            break
 
+def _finish_upload(
+    c: Union[AirtrainClient, StagingClient],
+    name: str,
+    size: int,
+    uploader: "_PartUploader",
+    observer: Optional[UploadObserver],
+    column_stats: Optional[Dict[str, ColumnStats]] = None,
+) -> DatasetMetadata:
+    dataset_id = uploader.dataset_id
+    timings = uploader.timings
     if size == 0:
         raise ValueError("Cannot ingest empty dataset.")
-    c.trigger_dataset_ingest(dataset_id)
+    ingest_started = time.perf_counter()
+    if column_stats is None:
+        ingest_response = c.trigger_dataset_ingest(dataset_id)
+    else:
+        ingest_response = c.trigger_dataset_ingest(
+            dataset_id, [column.to_json() for column in column_stats.values()]
+        )
+    timings.ingest_seconds = time.perf_counter() - ingest_started
+    timings.total_seconds = time.perf_counter() - uploader.started
+    if observer is not None:
+        notify(observer.on_finish, dataset_id, timings)
     return DatasetMetadata(
         name=name,
         id=dataset_id,
         url=c.dataset_dashboard_url(dataset_id),
         size=size,
+        timings=timings,
+        # Staged datasets are not ingested until they are pushed.
+        ingest_job_id=(
+            None if isinstance(c, StagingClient) else ingest_response.ingest_job_id
+        ),
+        column_stats=column_stats,
     )
 
 
+def _encode_part(table: pa.Table) -> io.BytesIO:
+    upload_buffer = io.BytesIO()
+    pq.write_table(table, upload_buffer)
+    upload_buffer.seek(0)
+    return upload_buffer
+
+
+def _remaining_size(stream: io.BufferedIOBase) -> int:
+    position = stream.tell()
+    end = stream.seek(0, io.SEEK_END)
+    stream.seek(position)
+    return end - position
+
+
+def _split_into_parts(table: pa.Table, max_part_bytes: int) -> Iterator[pa.Table]:
+    n_rows = table.shape[0]
+    n_bytes = table.nbytes
+    if n_bytes <= max_part_bytes or n_rows <= 1:
+        yield table
+        return
+    rows_per_part = max(1, (n_rows * max_part_bytes) // n_bytes)
+    for offset in range(0, n_rows, rows_per_part):
+        # slicing is zero-copy
+        yield table.slice(offset, rows_per_part)
+
+
+class _ChunkSink:
+    """A writable stream collecting what is written to it, until taken."""
+
+    def __init__(self) -> None:
+        self.closed = False
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        taken = b"".join(self._chunks)
+        self._chunks = []
+        return taken
+
+
+class _StreamedPart:
+    """A part encoded to Parquet while it is being uploaded.
+
+    Every call to `chunks` encodes the part from the start, one row group at a
+    time, yielding the encoded bytes of each row group once it is written.
+    """
+
+    def __init__(self, table: pa.Table, row_group_bytes: int) -> None:
+        self.table = table
+        n_rows = table.shape[0]
+        self.row_group_rows = max(1, (n_rows * row_group_bytes) // max(1, table.nbytes))
+        # Of the latest encoding
+        self.n_bytes = 0
+        # Of all encodings, including those of retried uploads
+        self.encode_seconds = 0.0
+
+    def chunks(self) -> Iterator[bytes]:
+        self.n_bytes = 0
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, self.table.schema)
+        try:
+            n_rows = self.table.shape[0]
+            for offset in range(0, max(1, n_rows), self.row_group_rows):
+                started = time.perf_counter()
+                writer.write_table(
+                    self.table.slice(offset, self.row_group_rows),
+                    row_group_size=self.row_group_rows,
+                )
+                self.encode_seconds += time.perf_counter() - started
+                yield self._take(sink)
+        finally:
+            writer.close()
+        yield self._take(sink)
+
+    def _take(self, sink: _ChunkSink) -> bytes:
+        chunk = sink.take()
+        self.n_bytes += len(chunk)
+        return chunk
+
+
+@dataclass
+class _StageSeconds:
+    source: float = 0.0
+    validation: float = 0.0
+    conversion: float = 0.0
+
+
+class _PartUploader:
+    """Encodes and uploads the parts of a dataset, optionally concurrently.
+
+    Parts are encoded on the calling thread. With a concurrency above one, they
+    are then uploaded from a pool of threads, while the caller moves on to
+    reading and encoding the next part. The pool is either the uploader's own,
+    or one shared with the uploaders of other datasets. The encoded parts
+    waiting for or being uploaded are bounded by the memory budget.
+    """
+
+    def __init__(
+        self,
+        client: Union[AirtrainClient, StagingClient],
+        dataset_id: str,
+        started: float,
+        observer: Optional[UploadObserver],
+        concurrency: int,
+        budget: MemoryBudget,
+        spill_dir: Optional[str],
+        stream_encoding: bool = False,
+        executor: Optional[Executor] = None,
+        embedding_sidecar: Optional[Tuple[str, EmbeddingSidecar]] = None,
+        replaced_parts: Optional[List[str]] = None,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("upload_concurrency must be at least one")
+        self.client = client
+        self.dataset_id = dataset_id
+        self.budget = budget
+        # Parts are at most a share of the budget, so that one being encoded fits
+        # within it along with those uploading, unless that makes them tiny.
+        self.max_part_bytes = min(
+            _MAX_PART_BYTES, max(_MIN_PART_BYTES, budget.max_bytes // (concurrency + 1))
+        )
+        self.timings = UploadTimings()
+        self.started = started
+        self._observer = observer
+        self._spill_dir = spill_dir
+        self._stream_encoding = stream_encoding
+        # The embedding column to upload as a sidecar, and how
+        self._embedding_sidecar = embedding_sidecar
+        self._lock = threading.Lock()
+        # Where parts were uploaded to, in the order their uploads completed, and
+        # the parts uploaded before (ex: by a failed attempt) which are still to
+        # be uploaded over rather than adding more parts.
+        self.parts: List[str] = []
+        self.replaced_parts: Deque[str] = deque(replaced_parts or [])
+        self._futures: List["Future[None]"] = []
+        # Limits the parts of this dataset uploading at once, including those
+        # waiting for a thread of a shared pool.
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = executor
+        self._owns_executor = False
+        if executor is None and concurrency > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=concurrency, thread_name_prefix="airtrain-upload"
+            )
+            self._owns_executor = True
+
+    def __enter__(self) -> "_PartUploader":
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        if exc_type is not None:
+            for future in self._futures:
+                future.cancel()
+        if self._owns_executor:
+            assert self._executor is not None  # please mypy
+            self._executor.shutdown(wait=True)
+        else:
+            wait_for_futures(self._futures)
+        if exc_type is None:
+            self.raise_if_failed(wait=True)
+
+    def wait_for_room(self) -> None:
+        """Raise upload errors, and wait while the memory budget is used up."""
+        # Parts can be spilled to disk rather than waiting.
+        if self._spill_dir is None:
+            self.budget.wait_for_room()
+        self.raise_if_failed()
+
+    def upload(self, table: pa.Table, stage_seconds: _StageSeconds) -> None:
+        arrow_bytes = table.nbytes
+        rows = table.shape[0]
+        encode_started = time.perf_counter()
+        sidecar: Optional[_SidecarPart] = None
+        if self._embedding_sidecar is not None:
+            table, sidecar = split_embeddings(table, *self._embedding_sidecar)
+        # The sidecar is held along with the part, so both are acquired at once:
+        # acquiring them separately could wait forever for room that the part
+        # itself is using.
+        sidecar_bytes = 0 if sidecar is None else len(sidecar.content)
+        content: Union[io.BytesIO, SpilledPart, _StreamedPart]
+        if self._spill_dir is not None and self.budget.is_full:
+            content = SpilledPart(table, self._spill_dir)
+            held_bytes = 0
+        elif self._stream_encoding:
+            # The Arrow data is held until the part is uploaded, to be encoded
+            # while uploading, and again for any retries.
+            content = _StreamedPart(table, _STREAM_ROW_GROUP_BYTES)
+            held_bytes = arrow_bytes + sidecar_bytes
+            self.budget.acquire(held_bytes)
+        else:
+            # Account for the Arrow memory of the part while it is encoded.
+            self.budget.acquire(arrow_bytes + sidecar_bytes)
+            try:
+                content = _encode_part(table)
+            finally:
+                self.budget.release(arrow_bytes + sidecar_bytes)
+            held_bytes = content.getbuffer().nbytes + sidecar_bytes
+            self.budget.acquire(held_bytes)
+        del table
+        encode_seconds = time.perf_counter() - encode_started
+
+        def upload_encoded() -> None:
+            self._upload_encoded(
+                content,
+                held_bytes,
+                rows,
+                arrow_bytes,
+                stage_seconds,
+                encode_seconds,
+                sidecar,
+            )
+
+        self._run(upload_encoded)
+
+    def upload_file(self, path: str, rows: int) -> None:
+        """Upload a part which has already been encoded to a Parquet file."""
+
+        def upload_encoded() -> None:
+            with open(path, "rb") as f:
+                self._upload_encoded(f, 0, rows, 0, _StageSeconds(), 0.0)
+
+        self._run(upload_encoded)
+
+    def raise_if_failed(self, wait: bool = False) -> None:
+        """Raise the error of the first part upload that failed, if any."""
+        for future in self._futures:
+            if wait or future.done():
+                future.result()
+        self._futures = [future for future in self._futures if not future.done()]
+
+    def _run(self, upload: Callable[[], None]) -> None:
+        if self._executor is None:
+            upload()
+            return
+
+        def upload_in_slot() -> None:
+            try:
+                upload()
+            finally:
+                self._slots.release()
+
+        self._slots.acquire()
+        try:
+            self._futures.append(self._executor.submit(upload_in_slot))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _upload_encoded(
+        self,
+        content: Union[io.BufferedIOBase, SpilledPart, _StreamedPart],
+        held_bytes: int,
+        rows: int,
+        arrow_bytes: int,
+        stage_seconds: _StageSeconds,
+        encode_seconds: float,
+        sidecar: Optional[_SidecarPart] = None,
+    ) -> None:
+        encoded_bytes = 0
+        if isinstance(content, io.BufferedIOBase):
+            encoded_bytes = _remaining_size(content)
+        upload_started = time.perf_counter()
+        try:
+            with record_attempts() as attempts:
+                if sidecar is not None and self._embedding_sidecar is not None:
+                    self.client.upload_dataset_embeddings(
+                        self.dataset_id,
+                        io.BytesIO(sidecar.content),
+                        self._embedding_sidecar[1].dtype,
+                        sidecar.dimensions,
+                    )
+                data: Union[io.BufferedIOBase, ByteStreamFactory]
+                if isinstance(content, SpilledPart):
+                    data = content.open()
+                elif isinstance(content, _StreamedPart):
+                    data = content.chunks
+                else:
+                    data = content
+                self._upload_data(data)
+        finally:
+            if isinstance(content, SpilledPart):
+                content.delete()
+            self.budget.release(held_bytes)
+        upload_done = time.perf_counter()
+        upload_seconds = upload_done - upload_started
+        if not isinstance(content, io.BufferedIOBase):
+            encoded_bytes = content.n_bytes
+        if sidecar is not None:
+            encoded_bytes += len(sidecar.content)
+        if isinstance(content, _StreamedPart):
+            # Encoding happened as part of the upload.
+            encode_seconds += content.encode_seconds
+            upload_seconds -= content.encode_seconds
+
+        with self._lock:
+            part = PartMetrics(
+                dataset_id=self.dataset_id,
+                part_index=self.timings.parts,
+                rows=rows,
+                arrow_bytes=arrow_bytes,
+                encoded_bytes=encoded_bytes,
+                source_seconds=stage_seconds.source,
+                conversion_seconds=stage_seconds.conversion,
+                validation_seconds=stage_seconds.validation,
+                encode_seconds=encode_seconds,
+                upload_seconds=upload_seconds,
+                retries=sum(1 for attempt in attempts if not attempt.succeeded),
+                cumulative_rows=self.timings.rows + rows,
+                cumulative_encoded_bytes=self.timings.encoded_bytes + encoded_bytes,
+                elapsed_seconds=upload_done - self.started,
+            )
+            self.timings.add_part(part)
+        if self._observer is not None:
+            notify(self._observer.on_part, part)
+
+    def _upload_data(self, data: Union[io.BufferedIOBase, ByteStreamFactory]) -> None:
+        with self._lock:
+            replaced = self.replaced_parts.popleft() if self.replaced_parts else None
+        if replaced is None:
+            location = self.client.upload_dataset_data(self.dataset_id, data)
+        else:
+            try:
+                self.client.replace_dataset_data(replaced, data)
+            except BaseException:
+                # The part may still hold what was there before.
+                with self._lock:
+                    self.replaced_parts.append(replaced)
+                raise
+            location = replaced
+        with self._lock:
+            self.parts.append(location)
+
+
 T = TypeVar("T")
 
 
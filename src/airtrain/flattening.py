@@ -0,0 +1,149 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger(__name__)
+
+_SEPARATOR: str = "."
+
+
+@dataclass
+class Flattening:
+    """How to flatten struct columns into top-level columns.
+
+    A struct column `a` with fields `b` and `c` becomes the columns `a.b` and
+    `a.c`, recursively for structs within structs. Values are null where any
+    struct containing them is null. Structs within lists are left as they are,
+    since flattening them would change the number of rows. Structs with no
+    fields have no values to keep, and are removed.
+
+    Values which would exceed `max_depth` or `max_columns` are packed into a
+    single `map<string, string>` column instead, from the dotted name of each
+    value to the value as a string. Nulls are left out of the map. Values which
+    cannot be converted to strings (ex: lists or binary data) stay in columns
+    of their own.
+
+    Parameters
+    ----------
+    max_depth:
+        Optionally, the number of levels of structs to flatten into columns.
+        Values in deeper structs are packed into the overflow column.
+    max_columns:
+        Optionally, the number of columns the flattened table may have at most,
+        including the overflow column. Columns which are not structs are always
+        kept as they are, and the values of the last structs to exceed the
+        limit are packed into the overflow column.
+    overflow_column:
+        The name of the column holding packed values.
+    """
+
+    max_depth: Optional[int] = None
+    max_columns: Optional[int] = None
+    overflow_column: str = "overflow"
+
+
+def flatten_table(table: pa.Table, flattening: Flattening) -> pa.Table:
+    """Flatten the struct columns of a table. See `Flattening`.
+
+    Only the column arrays are rearranged: no values are copied, except for
+    those packed into the overflow column, which is built one column at a time.
+    """
+    flat = table
+    depth = 0
+    while _has_structs(flat) and (
+        flattening.max_depth is None or depth < flattening.max_depth
+    ):
+        flat = _flatten_once(flat)
+        depth += 1
+    # Whatever remains of deeper structs is flattened to be packed.
+    too_deep = {name for name in flat.column_names if _is_struct(flat, name)}
+    while _has_structs(flat):
+        flat = _flatten_once(flat)
+
+    top_level = {name for name in table.column_names if not _is_struct(table, name)}
+    packed = [
+        name
+        for name in flat.column_names
+        if name not in top_level
+        and any(name == deep or name.startswith(deep + _SEPARATOR) for deep in too_deep)
+    ]
+    if flattening.max_columns is not None:
+        unpacked = [name for name in flat.column_names if name not in packed]
+        # Only struct values can be packed, taking the last ones first.
+        n_over = len(unpacked) + 1 - flattening.max_columns
+        candidates = [name for name in unpacked if name not in top_level]
+        if n_over > 0:
+            packed = candidates[len(candidates) - min(n_over, len(candidates)) :] + packed
+
+    unpackable = [name for name in packed if not _can_pack(flat.schema.field(name).type)]
+    if len(unpackable) > 0:
+        logger.warning(
+            "Columns cannot be packed into '%s'; keeping them as columns: %s",
+            flattening.overflow_column,
+            unpackable,
+        )
+        packed = [name for name in packed if name not in unpackable]
+    # In the order of the columns, whichever reason they are packed for.
+    packed_names = set(packed)
+    packed = [name for name in flat.column_names if name in packed_names]
+    if len(packed) == 0:
+        return flat
+
+    if flattening.overflow_column in flat.column_names:
+        raise ValueError(
+            f"The overflow column '{flattening.overflow_column}' is already a column "
+            "of the data. Choose another name for it."
+        )
+    overflow = _pack(flat, packed)
+    flat = flat.drop_columns(packed)
+    return flat.append_column(flattening.overflow_column, overflow)
+
+
+def _flatten_once(table: pa.Table) -> pa.Table:
+    flat = table.flatten()
+    if len(set(flat.column_names)) < flat.num_columns:
+        raise ValueError(
+            f"Flattened column names clash with other columns: {flat.column_names}"
+        )
+    return flat
+
+
+def _has_structs(table: pa.Table) -> bool:
+    return any(_is_struct(table, name) for name in table.column_names)
+
+
+def _is_struct(table: pa.Table, name: str) -> bool:
+    return pa.types.is_struct(table.schema.field(name).type)
+
+
+def _can_pack(type_: pa.DataType) -> bool:
+    return not (
+        pa.types.is_nested(type_)
+        or pa.types.is_binary(type_)
+        or pa.types.is_large_binary(type_)
+        or pa.types.is_fixed_size_binary(type_)
+    )
+
+
+def _pack(table: pa.Table, names: List[str]) -> pa.MapArray:
+    """Pack columns into a map from column name to string value, per row."""
+    n_rows = table.num_rows
+    n_columns = len(names)
+    # All values column by column, then reordered to be row by row.
+    values = pa.concat_arrays(
+        [pc.cast(table[name].combine_chunks(), pa.string()) for name in names]
+    )
+    by_row = (
+        np.arange(n_columns)[np.newaxis, :] * n_rows + np.arange(n_rows)[:, np.newaxis]
+    ).ravel()
+    is_valid = values.is_valid().to_numpy(zero_copy_only=False)[by_row]
+    by_row = by_row[is_valid]
+    keys = pa.array(names, pa.string()).take(pa.array(by_row // max(1, n_rows)))
+    entries_per_row = is_valid.reshape(n_rows, n_columns).sum(axis=1)
+    offsets = np.concatenate([[0], np.cumsum(entries_per_row)]).astype(np.int32)
+    return pa.MapArray.from_arrays(pa.array(offsets), keys, values.take(pa.array(by_row)))
@@ -0,0 +1,198 @@
+import asyncio
+import random
+import time
+from typing import List, Optional, Sequence, Union, overload
+
+from airtrain.client import AirtrainClient, IngestJobStatus, resolve_client
+from airtrain.core import DatasetMetadata
+
+
+_DEFAULT_INITIAL_INTERVAL_SECONDS: float = 1.0
+_DEFAULT_MAX_INTERVAL_SECONDS: float = 30.0
+_INTERVAL_BACKOFF: float = 1.5
+
+IngestJob = Union[DatasetMetadata, str]
+
+
+@overload
+def wait_for_ingest(
+    jobs: IngestJob,
+    timeout: Optional[float] = ...,
+    client: Optional[AirtrainClient] = ...,
+    api_key: Optional[str] = ...,
+    base_url: Optional[str] = ...,
+    initial_interval: float = ...,
+    max_interval: float = ...,
+) -> IngestJobStatus: ...
+
+
+@overload
+def wait_for_ingest(
+    jobs: Sequence[IngestJob],
+    timeout: Optional[float] = ...,
+    client: Optional[AirtrainClient] = ...,
+    api_key: Optional[str] = ...,
+    base_url: Optional[str] = ...,
+    initial_interval: float = ...,
+    max_interval: float = ...,
+) -> List[IngestJobStatus]: ...
+
+
+def wait_for_ingest(
+    jobs: Union[IngestJob, Sequence[IngestJob]],
+    timeout: Optional[float] = None,
+    client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    initial_interval: float = _DEFAULT_INITIAL_INTERVAL_SECONDS,
+    max_interval: float = _DEFAULT_MAX_INTERVAL_SECONDS,
+) -> Union[IngestJobStatus, List[IngestJobStatus]]:
+    """Wait until the ingestion of one or more uploaded datasets is done.
+
+    Uploads return as soon as ingestion has been triggered. Ingestion then
+    continues on Airtrain's side, so other work (like uploading the next dataset)
+    can go on meanwhile, until the ingested dataset is needed.
+
+    Parameters
+    ----------
+    jobs:
+        The dataset metadata returned by an upload, or the id of its ingestion
+        job. Or several of those, whose status is then checked together with a
+        single request per poll.
+    timeout:
+        Optionally, the number of seconds to wait at most, after which a
+        TimeoutError is raised.
+    client:
+        Optionally, the client to check with. See `upload_from_arrow_tables`.
+    api_key:
+        Optionally, the API key to check with. See `upload_from_arrow_tables`.
+    base_url:
+        Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+    initial_interval:
+        The number of seconds to wait between the first checks. The interval
+        grows with every check, up to `max_interval`, and is randomized so that
+        many waiting processes don't all check at once.
+    max_interval:
+        The number of seconds to wait between checks at most.
+
+    Returns
+    -------
+    The final status of the ingestion job, or of each job in the order they were
+    given. A job may have failed: check `succeeded` on the status.
+    """
+    poller = _IngestPoller(jobs, timeout, initial_interval, max_interval)
+    c = resolve_client(client, api_key=api_key, base_url=base_url)
+    while not poller.poll(c):
+        time.sleep(poller.next_interval())
+    return poller.result()
+
+
+@overload
+async def wait_for_ingest_async(
+    jobs: IngestJob,
+    timeout: Optional[float] = ...,
+    client: Optional[AirtrainClient] = ...,
+    api_key: Optional[str] = ...,
+    base_url: Optional[str] = ...,
+    initial_interval: float = ...,
+    max_interval: float = ...,
+) -> IngestJobStatus: ...
+
+
+@overload
+async def wait_for_ingest_async(
+    jobs: Sequence[IngestJob],
+    timeout: Optional[float] = ...,
+    client: Optional[AirtrainClient] = ...,
+    api_key: Optional[str] = ...,
+    base_url: Optional[str] = ...,
+    initial_interval: float = ...,
+    max_interval: float = ...,
+) -> List[IngestJobStatus]: ...
+
+
+async def wait_for_ingest_async(
+    jobs: Union[IngestJob, Sequence[IngestJob]],
+    timeout: Optional[float] = None,
+    client: Optional[AirtrainClient] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    initial_interval: float = _DEFAULT_INITIAL_INTERVAL_SECONDS,
+    max_interval: float = _DEFAULT_MAX_INTERVAL_SECONDS,
+) -> Union[IngestJobStatus, List[IngestJobStatus]]:
+    """Wait until the ingestion of one or more uploaded datasets is done.
+
+    The same as `wait_for_ingest`, without blocking the event loop. Status
+    requests are made from the loop's default executor.
+    """
+    poller = _IngestPoller(jobs, timeout, initial_interval, max_interval)
+    c = resolve_client(client, api_key=api_key, base_url=base_url)
+    loop = asyncio.get_running_loop()
+    while not await loop.run_in_executor(None, poller.poll, c):
+        await asyncio.sleep(poller.next_interval())
+    return poller.result()
+
+
+class _IngestPoller:
+    """Tracks the state of waiting for ingestion jobs, across status checks."""
+
+    def __init__(
+        self,
+        jobs: Union[IngestJob, Sequence[IngestJob]],
+        timeout: Optional[float],
+        initial_interval: float,
+        max_interval: float,
+    ) -> None:
+        self._single = isinstance(jobs, (str, DatasetMetadata))
+        self._job_ids = [
+            _ingest_job_id(job)
+            for job in ([jobs] if isinstance(jobs, (str, DatasetMetadata)) else jobs)
+        ]
+        self._statuses: List[Optional[IngestJobStatus]] = [None] * len(self._job_ids)
+        self._deadline = None if timeout is None else time.monotonic() + timeout
+        self._interval = initial_interval
+        self._max_interval = max_interval
+
+    def poll(self, client: AirtrainClient) -> bool:
+        """Check the jobs which are not yet done. Returns whether all are done."""
+        pending = [
+            i
+            for i, status in enumerate(self._statuses)
+            if status is None or not status.done
+        ]
+        statuses: List[IngestJobStatus] = []
+        if len(pending) == 1:
+            statuses = [client.get_ingest_job(self._job_ids[pending[0]])]
+        elif len(pending) > 1:
+            statuses = client.get_ingest_jobs([self._job_ids[i] for i in pending])
+        for i, status in zip(pending, statuses):
+            self._statuses[i] = status
+        return all(status is not None and status.done for status in self._statuses)
+
+    def next_interval(self) -> float:
+        """Get how long to wait before the next check, or raise on timeout."""
+        interval = self._interval * random.uniform(0.5, 1.0)
+        self._interval = min(self._interval * _INTERVAL_BACKOFF, self._max_interval)
+        if self._deadline is not None:
+            remaining = self._deadline - time.monotonic()
+            if remaining <= 0:
+                pending = [
+                    job_id
+                    for job_id, status in zip(self._job_ids, self._statuses)
+                    if status is None or not status.done
+                ]
+                raise TimeoutError(f"Ingestion jobs not done in time: {pending}")
+            interval = min(interval, remaining)
+        return interval
+
+    def result(self) -> Union[IngestJobStatus, List[IngestJobStatus]]:
+        statuses = [status for status in self._statuses if status is not None]
+        return statuses[0] if self._single else statuses
+
+
+def _ingest_job_id(job: IngestJob) -> str:
+    if isinstance(job, str):
+        return job
+    if job.ingest_job_id is None:
+        raise ValueError(f"Dataset '{job.id}' has no ingestion job.")
+    return job.ingest_job_id
@@ -0,0 +1,213 @@
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PartMetrics:
+    """Measurements for a single uploaded part of a dataset.
+
+    Times are in seconds. Source time includes any conversion that happens
+    while producing tables (ex: from python dicts or DataFrames), while
+    conversion time only includes the preparation done on the produced table.
+    """
+
+    dataset_id: str
+    part_index: int
+    rows: int
+    arrow_bytes: int
+    encoded_bytes: int
+    source_seconds: float
+    conversion_seconds: float
+    validation_seconds: float
+    encode_seconds: float
+    upload_seconds: float
+    retries: int
+    cumulative_rows: int
+    cumulative_encoded_bytes: int
+    elapsed_seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        """Cumulative throughput of the upload so far, in rows."""
+        return _rate(self.cumulative_rows, self.elapsed_seconds)
+
+    @property
+    def encoded_bytes_per_second(self) -> float:
+        """Cumulative throughput of the upload so far, in encoded bytes."""
+        return _rate(self.cumulative_encoded_bytes, self.elapsed_seconds)
+
+
+@dataclass
+class UploadTimings:
+    """Summary of where the time went while uploading a dataset.
+
+    Times are in seconds, and are summed over all parts of the dataset.
+    `optimized_bytes_saved` is the Arrow memory saved by optimizing column types,
+    and `clustered_size_ratio` the encoded size of the first rows when clustered
+    over their size when not, if those were requested.
+    """
+
+    parts: int = 0
+    rows: int = 0
+    arrow_bytes: int = 0
+    encoded_bytes: int = 0
+    source_seconds: float = 0.0
+    conversion_seconds: float = 0.0
+    validation_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    upload_seconds: float = 0.0
+    ingest_seconds: float = 0.0
+    retries: int = 0
+    total_seconds: float = 0.0
+    optimized_bytes_saved: int = 0
+    clustered_size_ratio: Optional[float] = None
+
+    @property
+    def rows_per_second(self) -> float:
+        return _rate(self.rows, self.total_seconds)
+
+    @property
+    def encoded_bytes_per_second(self) -> float:
+        return _rate(self.encoded_bytes, self.total_seconds)
+
+    def add_part(self, part: PartMetrics) -> None:
+        self.parts += 1
+        self.rows += part.rows
+        self.arrow_bytes += part.arrow_bytes
+        self.encoded_bytes += part.encoded_bytes
+        self.source_seconds += part.source_seconds
+        self.conversion_seconds += part.conversion_seconds
+        self.validation_seconds += part.validation_seconds
+        self.encode_seconds += part.encode_seconds
+        self.upload_seconds += part.upload_seconds
+        self.retries += part.retries
+
+
+class UploadObserver:
+    """Receives progress events from an upload.
+
+    Subclass this and override the methods for the events you are interested in.
+    Observers are called from the thread doing the upload, so they should return
+    quickly. Errors raised by an observer are logged and otherwise ignored.
+    """
+
+    def on_start(self, dataset_id: str, name: str) -> None:
+        """Called once the dataset has been created, before any data is read."""
+        pass
+
+    def on_part(self, metrics: PartMetrics) -> None:
+        """Called after each part has been uploaded."""
+        pass
+
+    def on_finish(self, dataset_id: str, timings: UploadTimings) -> None:
+        """Called once ingestion of the dataset has been triggered."""
+        pass
+
+    def on_error(self, dataset_id: str, error: BaseException) -> None:
+        """Called instead of `on_finish` when the upload fails after starting."""
+        pass
+
+
+class CallbackObserver(UploadObserver):
+    """An observer calling a function after each part has been uploaded.
+
+    Parameters
+    ----------
+    on_part:
+        Called with the metrics for each uploaded part.
+    """
+
+    def __init__(self, on_part: Callable[[PartMetrics], None]) -> None:
+        self._on_part = on_part
+
+    def on_part(self, metrics: PartMetrics) -> None:
+        self._on_part(metrics)
+
+
+class MultiObserver(UploadObserver):
+    """An observer forwarding every event to several other observers."""
+
+    def __init__(self, observers: List[UploadObserver]) -> None:
+        self.observers = observers
+
+    def on_start(self, dataset_id: str, name: str) -> None:
+        for observer in self.observers:
+            notify(observer.on_start, dataset_id, name)
+
+    def on_part(self, metrics: PartMetrics) -> None:
+        for observer in self.observers:
+            notify(observer.on_part, metrics)
+
+    def on_finish(self, dataset_id: str, timings: UploadTimings) -> None:
+        for observer in self.observers:
+            notify(observer.on_finish, dataset_id, timings)
+
+    def on_error(self, dataset_id: str, error: BaseException) -> None:
+        for observer in self.observers:
+            notify(observer.on_error, dataset_id, error)
+
+
+class LoggingObserver(UploadObserver):
+    """An observer logging the progress of an upload."""
+
+    def __init__(self, level: int = logging.INFO) -> None:
+        self._level = level
+
+    def on_part(self, metrics: PartMetrics) -> None:
+        logger.log(
+            self._level,
+            "Uploaded part %s of dataset %s: %s rows, %s bytes. "
+            "Total: %s rows at %.1f rows/s",
+            metrics.part_index,
+            metrics.dataset_id,
+            metrics.rows,
+            metrics.encoded_bytes,
+            metrics.cumulative_rows,
+            metrics.rows_per_second,
+        )
+
+    def on_finish(self, dataset_id: str, timings: UploadTimings) -> None:
+        logger.log(
+            self._level,
+            "Finished uploading dataset %s: %s",
+            dataset_id,
+            timings,
+        )
+
+    def on_error(self, dataset_id: str, error: BaseException) -> None:
+        logger.log(
+            self._level,
+            "Failed to upload dataset %s: %r",
+            dataset_id,
+            error,
+        )
+
+
+def notify(callback: Callable[..., None], *args: Any) -> None:
+    """Call an observer method, without letting its errors interrupt an upload."""
+    try:
+        callback(*args)
+    except Exception:
+        logger.exception("Upload observer raised an error")
+
+
+@contextmanager
+def notify_errors(observer: Optional[UploadObserver], dataset_id: str) -> Iterator[None]:
+    """Tell an observer about any error raised while uploading, and re-raise it."""
+    try:
+        yield
+    except BaseException as error:
+        if observer is not None:
+            notify(observer.on_error, dataset_id, error)
+        raise
+
+
+def _rate(amount: float, seconds: float) -> float:
+    if seconds <= 0:
+        return 0.0
+    return amount / seconds
@@ -0,0 +1,124 @@
+import re
+from typing import Any, Iterable, Optional, Sequence
+
+import pyarrow as pa
+
+
+try:
+    import duckdb  # noqa: F401
+
+    ENABLED = True
+except ImportError:
+    ENABLED = False
+
+from airtrain.core import (
+    _MAX_PART_BYTES,
+    CreationArgs,
+    DatasetMetadata,
+    Unpack,
+    _batches_to_tables,
+    _RowLimitedSource,
+    upload_from_arrow_tables,
+)
+
+
+# In case duckdb is not installed
+DuckDBPyConnection = Any
+
+_DEFAULT_BATCH_ROWS: int = 100_000
+# String literals, quoted identifiers, comments, statement separators, and
+# everything else, in pieces which can't contain any of the former.
+_SQL_TOKENS = re.compile(
+    r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|;|[^'"\-/;]+|.""",
+    re.DOTALL,
+)
+
+
+def upload_from_duckdb(
+    connection: DuckDBPyConnection,
+    query: str,
+    parameters: Optional[Sequence[Any]] = None,
+    batch_rows: int = _DEFAULT_BATCH_ROWS,
+    **kwargs: Unpack[CreationArgs],
+) -> DatasetMetadata:
+    """Upload an Airtrain dataset from the results of a DuckDB query.
+
+    Results are streamed from DuckDB in batches, rather than fetched all at once,
+    so memory use is bounded regardless of how many rows the query returns. The
+    query is limited to the dataset's row limit, so DuckDB stops producing rows
+    which could not be uploaded. The query runs on DuckDB's own threads, as
+    configured on the connection (ex: with `SET threads`).
+
+    Parameters
+    ----------
+    connection:
+        The DuckDB connection to query. The query runs on a cursor of it, so
+        the connection stays usable from other threads meanwhile.
+    query:
+        The SQL query producing the data to construct an Airtrain dataset out of.
+        It must be a single statement.
+    parameters:
+        Optionally, the values of prepared statement parameters in the query.
+    batch_rows:
+        The number of rows fetched from DuckDB at a time.
+    kwargs:
+        See `upload_from_arrow_tables` for other arguments.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing the created dataset.
+    """
+    if not ENABLED:
+        raise ImportError(
+            "DuckDB integration not enabled. Please install Airtrain package as "
+            "`airtrain-py[duckdb]`"
+        )
+    source = _DuckDBQuery(connection, query, parameters, batch_rows)
+    return upload_from_arrow_tables(source, **kwargs)
+
+
+class _DuckDBQuery(_RowLimitedSource):
+    def __init__(
+        self,
+        connection: DuckDBPyConnection,
+        query: str,
+        parameters: Optional[Sequence[Any]],
+        batch_rows: int,
+    ) -> None:
+        self.connection = connection
+        self.query = _single_statement(query)
+        self.parameters = parameters
+        self.batch_rows = batch_rows
+
+    def tables(self, row_limit: int) -> Iterable[pa.Table]:
+        limited_query = (
+            f"SELECT * FROM ({self.query}) AS airtrain_query LIMIT {int(row_limit)}"
+        )
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(limited_query, self.parameters)
+            # fetch_record_batch is deprecated in newer versions of duckdb
+            if hasattr(cursor, "to_arrow_reader"):
+                reader = cursor.to_arrow_reader(self.batch_rows)
+            else:
+                reader = cursor.fetch_record_batch(self.batch_rows)
+            yield from _batches_to_tables(reader, _MAX_PART_BYTES)
+        finally:
+            cursor.close()
+
+
+def _single_statement(query: str) -> str:
+    """Remove the trailing semicolons and comments of a query, to nest it."""
+    end = 0
+    ended = False
+    for token in _SQL_TOKENS.finditer(query):
+        text = token.group()
+        if text == ";":
+            ended = True
+        elif not text.isspace() and not text.startswith(("--", "/*")):
+            if ended:
+                raise ValueError("Only a single query can be uploaded from DuckDB.")
+            end = token.end()
+    if end == 0:
+        raise ValueError("The DuckDB query is empty.")
+    return query[:end].strip()
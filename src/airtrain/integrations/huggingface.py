@@ -0,0 +1,93 @@
+from typing import Any, Iterable, List, Optional
+
+import pyarrow as pa
+
+
+try:
+    import datasets
+
+    ENABLED = True
+except ImportError:
+    ENABLED = False
+
+from airtrain.core import (
+    _MAX_PART_BYTES,
+    CreationArgs,
+    DatasetMetadata,
+    Unpack,
+    _RowLimitedSource,
+    _split_into_parts,
+    upload_from_arrow_tables,
+)
+
+
+# In case datasets is not installed
+Dataset = Any
+
+
+def upload_from_hf_dataset(
+    data: Dataset,
+    columns: Optional[List[str]] = None,
+    **kwargs: Unpack[CreationArgs],
+) -> DatasetMetadata:
+    """Upload an Airtrain dataset from a Hugging Face `datasets.Dataset`.
+
+    Datasets loaded from local files are Arrow tables memory-mapped from their
+    cache files. Those are uploaded in slices of the underlying table, without
+    copying the data into python or into memory beforehand. If the rows of the
+    dataset have been reordered or selected (ex: with `shuffle`, `select`, or
+    `filter`), they are gathered in batches instead.
+
+    Parameters
+    ----------
+    data:
+        The Hugging Face dataset. A `DatasetDict` must have one of its splits
+        selected, ex: `dataset_dict["train"]`.
+    columns:
+        Optionally, the names of the columns to upload. All columns are uploaded
+        if not provided.
+    kwargs:
+        See `upload_from_arrow_tables` for other arguments.
+
+    Returns
+    -------
+    A DatasetMetadata object summarizing the created dataset.
+    """
+    if not ENABLED:
+        raise ImportError(
+            "Hugging Face integration not enabled. Please install Airtrain package "
+            "as `airtrain-py[huggingface]`"
+        )
+    if isinstance(data, datasets.DatasetDict):
+        raise TypeError(
+            f"Select one split of the dataset to upload. Splits: {list(data.keys())}"
+        )
+    if not isinstance(data, datasets.Dataset):
+        raise TypeError(f"Expected a datasets.Dataset, got: {type(data)}")
+    if columns is not None:
+        data = data.select_columns(columns)
+    return upload_from_arrow_tables(_HFDatasetSource(data), **kwargs)
+
+
+class _HFDatasetSource(_RowLimitedSource):
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset = dataset
+
+    def tables(self, row_limit: int) -> Iterable[pa.Table]:
+        dataset = self.dataset
+        table: pa.Table = dataset.data.table
+        # Set when rows have been reordered or selected: the table then still
+        # holds all of the original rows.
+        if dataset._indices is None:
+            table = table.slice(0, row_limit)
+            yield from _split_into_parts(table, _MAX_PART_BYTES)
+            return
+
+        n_rows = min(dataset.num_rows, row_limit)
+        if n_rows == 0:
+            return
+        row_bytes = max(1, table.nbytes // max(1, table.num_rows))
+        batch_rows = max(1, _MAX_PART_BYTES // row_bytes)
+        if n_rows < dataset.num_rows:
+            dataset = dataset.select(range(n_rows))
+        yield from dataset.with_format("arrow").iter(batch_size=batch_rows)
@@ -0,0 +1,135 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+try:
+    from opentelemetry import metrics, trace
+    from opentelemetry.trace import Status, StatusCode
+
+    ENABLED = True
+except ImportError:
+    ENABLED = False
+
+from airtrain.instrumentation import PartMetrics, UploadObserver, UploadTimings
+
+
+# In case opentelemetry is not installed
+Tracer = Any
+Meter = Any
+
+_INSTRUMENTATION_NAME: str = "airtrain"
+_STAGES = ("source", "conversion", "validation", "encode", "upload")
+
+
+class OpenTelemetryObserver(UploadObserver):
+    """Report upload progress as OpenTelemetry spans and metrics.
+
+    Each upload is reported as an `airtrain.upload` span, with an
+    `airtrain.upload.part` child span for every uploaded part. The upload span
+    records the exception and has an error status if the upload fails. Rows, bytes,
+    retries, and the time spent in each stage of the upload are also recorded
+    as metrics.
+
+    Parameters
+    ----------
+    tracer:
+        Optionally, the tracer to create spans with. Defaults to a tracer from the
+        global tracer provider.
+    meter:
+        Optionally, the meter to record metrics with. Defaults to a meter from
+        the global meter provider.
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None, meter: Optional[Meter] = None):
+        if not ENABLED:
+            raise ImportError(
+                "OpenTelemetry integration not enabled. Please install Airtrain "
+                "package as `airtrain-py[opentelemetry]`"
+            )
+        self._tracer = tracer or trace.get_tracer(_INSTRUMENTATION_NAME)
+        meter = meter or metrics.get_meter(_INSTRUMENTATION_NAME)
+        self._rows = meter.create_counter(
+            "airtrain.upload.rows", unit="{row}", description="Rows uploaded"
+        )
+        self._bytes = meter.create_counter(
+            "airtrain.upload.bytes", unit="By", description="Encoded bytes uploaded"
+        )
+        self._retries = meter.create_counter(
+            "airtrain.upload.retries", description="Retried upload requests"
+        )
+        self._stage_duration = meter.create_histogram(
+            "airtrain.upload.stage.duration",
+            unit="s",
+            description="Time spent in each stage of uploading a part",
+        )
+        self._lock = threading.Lock()
+        self._upload_spans: Dict[str, Any] = {}
+
+    def on_start(self, dataset_id: str, name: str) -> None:
+        span = self._tracer.start_span(
+            "airtrain.upload",
+            attributes={"airtrain.dataset.id": dataset_id, "airtrain.dataset.name": name},
+        )
+        with self._lock:
+            self._upload_spans[dataset_id] = span
+
+    def on_part(self, metrics: PartMetrics) -> None:
+        with self._lock:
+            parent = self._upload_spans.get(metrics.dataset_id)
+
+        durations = {stage: getattr(metrics, f"{stage}_seconds") for stage in _STAGES}
+        # The part is reported after it is done, so work out when it started.
+        end_time = time.time_ns()
+        start_time = end_time - int(sum(durations.values()) * 1e9)
+        context = trace.set_span_in_context(parent) if parent is not None else None
+        span = self._tracer.start_span(
+            "airtrain.upload.part",
+            context=context,
+            start_time=start_time,
+            attributes={
+                "airtrain.dataset.id": metrics.dataset_id,
+                "airtrain.part.index": metrics.part_index,
+                "airtrain.part.rows": metrics.rows,
+                "airtrain.part.arrow_bytes": metrics.arrow_bytes,
+                "airtrain.part.encoded_bytes": metrics.encoded_bytes,
+                "airtrain.part.retries": metrics.retries,
+                **{
+                    f"airtrain.part.{stage}_seconds": seconds
+                    for stage, seconds in durations.items()
+                },
+            },
+        )
+        span.end(end_time=end_time)
+
+        attributes = {"airtrain.dataset.id": metrics.dataset_id}
+        self._rows.add(metrics.rows, attributes)
+        self._bytes.add(metrics.encoded_bytes, attributes)
+        self._retries.add(metrics.retries, attributes)
+        for stage, seconds in durations.items():
+            self._stage_duration.record(seconds, {**attributes, "stage": stage})
+
+    def on_finish(self, dataset_id: str, timings: UploadTimings) -> None:
+        with self._lock:
+            span = self._upload_spans.pop(dataset_id, None)
+        if span is None:
+            return
+        span.set_attributes(
+            {
+                "airtrain.upload.parts": timings.parts,
+                "airtrain.upload.rows": timings.rows,
+                "airtrain.upload.encoded_bytes": timings.encoded_bytes,
+                "airtrain.upload.retries": timings.retries,
+                "airtrain.upload.total_seconds": timings.total_seconds,
+            }
+        )
+        span.end()
+
+    def on_error(self, dataset_id: str, error: BaseException) -> None:
+        with self._lock:
+            span = self._upload_spans.pop(dataset_id, None)
+        if span is None:
+            return
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, f"{type(error).__name__}: {error}"))
+        span.end()
@@ -0,0 +1,76 @@
+import duckdb
+import pytest
+
+from airtrain.core import DatasetMetadata
+from airtrain.integrations.duckdb import upload_from_duckdb
+from tests.fixtures import MockAirtrainClient, mock_client  # noqa: F401
+
+
+def test_upload_from_duckdb(mock_client: MockAirtrainClient):  # noqa: F811
+    connection = duckdb.connect()
+    connection.execute(
+        "CREATE TABLE foo AS SELECT range AS foo, 'bar' || range AS bar FROM range(50)"
+    )
+    name = "Foo dataset"
+    result = upload_from_duckdb(
+        connection,
+        "SELECT * FROM foo WHERE foo < ? ORDER BY foo;",
+        parameters=[40],
+        batch_rows=7,
+        name=name,
+    )
+    assert isinstance(result, DatasetMetadata)
+    assert result.size == 40
+    fake_dataset = mock_client.get_fake_dataset(result.id)
+    assert fake_dataset.name == name
+    table = fake_dataset.ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == list(range(0, 40))
+    assert table["bar"].to_pylist() == [f"bar{i}" for i in range(0, 40)]
+    # The connection is still usable.
+    assert connection.execute("SELECT count(*) FROM foo").fetchone() == (50,)
+
+
+def test_upload_from_duckdb_row_limit(mock_client: MockAirtrainClient):  # noqa: F811
+    connection = duckdb.connect()
+    # The query only produces rows up to the row limit.
+    query = "SELECT * FROM range(1000000000000) AS t(foo)"
+    result = upload_from_duckdb(connection, query)
+    assert result.size == mock_client.dataset_row_limit
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table.shape[0] == mock_client.dataset_row_limit
+
+
+def test_upload_from_duckdb_trailing_comment(
+    mock_client: MockAirtrainClient,  # noqa: F811
+):
+    connection = duckdb.connect()
+    query = "SELECT range AS foo FROM range(10) -- the first rows"
+    result = upload_from_duckdb(connection, query)
+    assert result.size == 10
+    query = "SELECT ';' AS foo FROM range(10); -- the first rows\n/* done; */"
+    result = upload_from_duckdb(connection, query)
+    assert result.size == 10
+
+
+def test_upload_from_duckdb_several_statements(
+    mock_client: MockAirtrainClient,  # noqa: F811
+):
+    connection = duckdb.connect()
+    with pytest.raises(ValueError, match="single query"):
+        upload_from_duckdb(connection, "SELECT 1 AS foo; SELECT 2 AS foo")
+    with pytest.raises(ValueError, match="query is empty"):
+        upload_from_duckdb(connection, "-- SELECT 1 AS foo;")
+
+
+def test_upload_from_duckdb_embeddings(mock_client: MockAirtrainClient):  # noqa: F811
+    connection = duckdb.connect()
+    query = "SELECT range AS foo, [range, 1.0, 2.0]::FLOAT[3] AS emb FROM range(10)"
+    result = upload_from_duckdb(connection, query, embedding_column="emb")
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["emb"].to_pylist()[1] == [1.0, 1.0, 2.0]
+
+    with pytest.raises(duckdb.Error):
+        upload_from_duckdb(connection, "SELECT * FROM no_such_table")
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+
+import datasets
+import pyarrow as pa
+import pytest
+
+import airtrain
+from airtrain.core import DatasetMetadata
+from airtrain.integrations.huggingface import _HFDatasetSource, upload_from_hf_dataset
+from tests.fixtures import MockAirtrainClient, mock_client  # noqa: F401
+
+
+@pytest.fixture
+def local_dataset(tmp_path):
+    dataset = datasets.Dataset.from_dict(
+        {
+            "foo": list(range(0, 50)),
+            "bar": [f"bar{i}" for i in range(0, 50)],
+            "emb": [[float(i), 1.0] for i in range(0, 50)],
+        }
+    )
+    dataset.save_to_disk(str(tmp_path))
+    return datasets.load_from_disk(str(tmp_path))
+
+
+def test_upload_from_hf_dataset(
+    mock_client: MockAirtrainClient,  # noqa: F811
+    local_dataset,
+):
+    name = "Foo dataset"
+    result = upload_from_hf_dataset(local_dataset, name=name, embedding_column="emb")
+    assert isinstance(result, DatasetMetadata)
+    assert result.size == 50
+    fake_dataset = mock_client.get_fake_dataset(result.id)
+    assert fake_dataset.name == name
+    table = fake_dataset.ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == list(range(0, 50))
+    assert table["bar"].to_pylist() == [f"bar{i}" for i in range(0, 50)]
+
+
+def test_upload_from_hf_dataset_zero_copy(local_dataset):
+    mapped = local_dataset.data.table
+    (table,) = _HFDatasetSource(local_dataset).tables(row_limit=20)
+    assert table.num_rows == 20
+    assert (
+        table["foo"].chunk(0).buffers()[1].address
+        == mapped["foo"].chunk(0).buffers()[1].address
+    )
+
+
+def test_upload_from_hf_dataset_columns_and_limit(
+    mock_client: MockAirtrainClient,  # noqa: F811
+    local_dataset,
+):
+    mock_client.dataset_row_limit = 10
+    result = upload_from_hf_dataset(local_dataset, columns=["bar", "foo"])
+    assert result.size == 10
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table.column_names == ["bar", "foo"]
+    assert table["foo"].to_pylist() == list(range(0, 10))
+
+
+def test_upload_from_hf_dataset_with_indices(
+    mock_client: MockAirtrainClient,  # noqa: F811
+    local_dataset,
+):
+    evens = local_dataset.filter(lambda row: row["foo"] % 2 == 0).shuffle(seed=42)
+    result = upload_from_hf_dataset(evens, columns=["foo"])
+    assert result.size == 25
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == evens["foo"]
+
+    mock_client.dataset_row_limit = 5
+    result = upload_from_hf_dataset(evens)
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == evens["foo"][:5]
+
+
+def test_upload_from_hf_dataset_dict(local_dataset):
+    with pytest.raises(TypeError, match="Select one split"):
+        upload_from_hf_dataset(datasets.DatasetDict({"train": local_dataset}))
+    with pytest.raises(TypeError):
+        upload_from_hf_dataset(pa.table({"foo": [1]}))
+
+
+def test_datasets_imported_lazily():
+    code = (
+        "import sys, airtrain\n"
+        "assert 'datasets' not in sys.modules\n"
+        "assert airtrain.upload_from_hf_dataset\n"
+        "assert 'datasets' in sys.modules\n"
+    )
+    source_dir = os.path.dirname(os.path.dirname(airtrain.__file__))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=source_dir)
@@ -0,0 +1,77 @@
+import pyarrow as pa
+import pytest
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import StatusCode
+
+from airtrain.core import upload_from_arrow_tables, upload_from_dicts
+from airtrain.integrations.opentelemetry import OpenTelemetryObserver
+from tests.fixtures import MockAirtrainClient, mock_client  # noqa: F401
+
+
+def test_opentelemetry_observer(mock_client: MockAirtrainClient):  # noqa: F811
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(metric_readers=[reader])
+
+    observer = OpenTelemetryObserver(
+        tracer=tracer_provider.get_tracer("test"),
+        meter=meter_provider.get_meter("test"),
+    )
+    # enough rows for two parts
+    data = [{"foo": i} for i in range(0, 3000)]
+    mock_client.dataset_row_limit = 10_000
+    result = upload_from_dicts(data, observer=observer)
+
+    spans = exporter.get_finished_spans()
+    part_spans = [s for s in spans if s.name == "airtrain.upload.part"]
+    (upload_span,) = [s for s in spans if s.name == "airtrain.upload"]
+    assert len(part_spans) == 2
+    assert [s.parent for s in part_spans] == [upload_span.context] * 2
+    assert [dict(s.attributes or {})["airtrain.part.rows"] for s in part_spans] == [
+        2000,
+        1000,
+    ]
+    upload_attributes = dict(upload_span.attributes or {})
+    assert upload_attributes["airtrain.dataset.id"] == result.id
+    assert upload_attributes["airtrain.upload.rows"] == 3000
+
+    metrics_data = reader.get_metrics_data()
+    assert metrics_data is not None
+    metrics = {
+        metric.name: metric.data.data_points
+        for resource_metrics in metrics_data.resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    }
+    (rows_point,) = metrics["airtrain.upload.rows"]
+    assert getattr(rows_point, "value") == 3000
+    assert "airtrain.upload.stage.duration" in metrics
+
+
+def test_opentelemetry_observer_error(mock_client: MockAirtrainClient):  # noqa: F811
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    observer = OpenTelemetryObserver(tracer=tracer_provider.get_tracer("test"))
+
+    def tables():
+        yield pa.table({"foo": [1, 2]})
+        raise KeyError("source failed")
+
+    with pytest.raises(KeyError):
+        upload_from_arrow_tables(tables(), observer=observer)
+
+    (upload_span,) = [
+        s for s in exporter.get_finished_spans() if s.name == "airtrain.upload"
+    ]
+    assert upload_span.status.status_code == StatusCode.ERROR
+    assert [event.name for event in upload_span.events] == ["exception"]
+    assert observer._upload_spans == {}
@@ -0,0 +1,113 @@
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """Tracks the bytes held by the in-flight parts of an upload.
+
+    Acquiring bytes blocks while doing so would exceed the budget. To guarantee
+    progress, a single acquisition is always allowed when nothing else is held,
+    even if it is larger than the whole budget.
+
+    Parameters
+    ----------
+    max_bytes:
+        The number of bytes that may be held at once.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least one")
+        self.max_bytes = max_bytes
+        self._in_use = 0
+        self._peak = 0
+        self._condition = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        with self._condition:
+            return self._in_use
+
+    @property
+    def peak(self) -> int:
+        """The most bytes that have been held at once."""
+        with self._condition:
+            return self._peak
+
+    @property
+    def is_full(self) -> bool:
+        with self._condition:
+            return self._in_use >= self.max_bytes
+
+    def acquire(self, n_bytes: int) -> None:
+        """Hold n_bytes, waiting until there is room for them first."""
+        with self._condition:
+            while self._in_use > 0 and self._in_use + n_bytes > self.max_bytes:
+                self._condition.wait()
+            self._in_use += n_bytes
+            self._peak = max(self._peak, self._in_use)
+
+    def release(self, n_bytes: int) -> None:
+        """Stop holding n_bytes."""
+        with self._condition:
+            self._in_use -= n_bytes
+            self._condition.notify_all()
+
+    def wait_for_room(self) -> None:
+        """Wait until less than the whole budget is held."""
+        with self._condition:
+            while self._in_use >= self.max_bytes:
+                self._condition.wait()
+
+
+class SpilledPart:
+    """An encoded part written to a temporary file instead of held in memory.
+
+    Parameters
+    ----------
+    table:
+        The table to encode.
+    spill_dir:
+        The directory to write the temporary file in. Defaults to the system's
+        temporary directory.
+    """
+
+    def __init__(self, table: pa.Table, spill_dir: Optional[str] = None) -> None:
+        self._mapped: Optional[pa.MemoryMappedFile] = None
+        fd, self.path = tempfile.mkstemp(
+            prefix="airtrain-part-", suffix=".parquet", dir=spill_dir
+        )
+        os.close(fd)
+        try:
+            pq.write_table(table, self.path)
+        except BaseException:
+            self.delete()
+            raise
+        self.n_bytes = os.path.getsize(self.path)
+
+    def open(self) -> pa.MemoryMappedFile:
+        """Memory-map the encoded part, for reading.
+
+        Pages of the mapped file are backed by the file rather than by process
+        memory, so the OS may reclaim them under memory pressure.
+        """
+        self._mapped = pa.memory_map(self.path, "r")
+        return self._mapped
+
+    def delete(self) -> None:
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,137 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger(__name__)
+
+# Parquet stores smaller integers as 32 bit integers too, so narrowing further
+# would save nothing, while making later values more likely not to fit.
+_NARROW_INTEGERS: Dict[pa.DataType, pa.DataType] = {
+    pa.int64(): pa.int32(),
+    pa.uint64(): pa.uint32(),
+}
+
+
+@dataclass
+class TypeOptimization:
+    """How to choose more compact types for columns of the data.
+
+    Types are chosen once, from the first table of data, and then used for all
+    tables, so that all parts of the dataset have the same schema:
+
+    - 64 bit integer columns become 32 bit integers if the values seen fit.
+    - 64 bit float columns become 32 bit floats if no value changes by more than
+      `float_tolerance` (relative to the value) in doing so.
+    - String columns with few distinct values are dictionary encoded.
+
+    If a later table has values which don't fit the chosen types, a ValueError
+    is raised. Only columns which are not nested are optimized.
+
+    Parameters
+    ----------
+    float_tolerance:
+        The relative error allowed in converting 64 bit floats to 32 bit floats.
+        With the default of 0, the conversion must be exact.
+    max_dictionary_fraction:
+        String columns are dictionary encoded if their number of distinct values
+        is at most this fraction of their number of values.
+    """
+
+    float_tolerance: float = 0.0
+    max_dictionary_fraction: float = 0.1
+
+
+class _TypeOptimizer:
+    """Converts tables to the types chosen for the first one."""
+
+    def __init__(self, optimization: TypeOptimization) -> None:
+        self.optimization = optimization
+        self.bytes_saved = 0
+        self._types: Optional[Dict[str, pa.DataType]] = None
+
+    def optimize(self, table: pa.Table) -> pa.Table:
+        if self._types is None:
+            self._types = self._choose_types(table)
+            if len(self._types) > 0:
+                logger.info("Optimized column types: %s", self._types)
+
+        optimized = table
+        for name, type_ in self._types.items():
+            index = optimized.schema.get_field_index(name)
+            column = self._convert(name, optimized[name], type_)
+            optimized = optimized.set_column(
+                index, optimized.schema.field(index).with_type(column.type), column
+            )
+        self.bytes_saved += table.nbytes - optimized.nbytes
+        return optimized
+
+    def _choose_types(self, table: pa.Table) -> Dict[str, pa.DataType]:
+        types: Dict[str, pa.DataType] = {}
+        for field in table.schema:
+            column = table[field.name]
+            if column.null_count == len(column):
+                continue
+            type_: Optional[pa.DataType] = None
+            if field.type in _NARROW_INTEGERS:
+                narrow_type = _NARROW_INTEGERS[field.type]
+                if _fits_integer_type(column, narrow_type):
+                    type_ = narrow_type
+            elif pa.types.is_float64(field.type):
+                if _fits_float32(column, self.optimization.float_tolerance):
+                    type_ = pa.float32()
+            elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                n_distinct = pc.count_distinct(column).as_py()
+                n_values = len(column) - column.null_count
+                if n_distinct <= self.optimization.max_dictionary_fraction * n_values:
+                    type_ = pa.dictionary(pa.int32(), field.type)
+            if type_ is not None and type_ != field.type:
+                types[field.name] = type_
+        return types
+
+    def _convert(
+        self, name: str, column: pa.ChunkedArray, type_: pa.DataType
+    ) -> pa.ChunkedArray:
+        if pa.types.is_dictionary(type_):
+            return pc.dictionary_encode(column)
+        if pa.types.is_float32(type_):
+            if not _fits_float32(column, self.optimization.float_tolerance):
+                raise ValueError(
+                    f"Values of column '{name}' can no longer be converted to 32 bit "
+                    "floats, as was chosen from the first rows of data. Provide the "
+                    "types of the data instead of optimizing them."
+                )
+            return pc.cast(column, type_, safe=False)
+        try:
+            return pc.cast(column, type_)
+        except pa.ArrowInvalid:
+            raise ValueError(
+                f"Values of column '{name}' no longer fit in {type_}, as was chosen "
+                "from the first rows of data. Provide the types of the data instead "
+                "of optimizing them."
+            )
+
+
+def _fits_integer_type(
+    column: Union[pa.Array, pa.ChunkedArray], type_: pa.DataType
+) -> bool:
+    min_max = pc.min_max(column)
+    info = np.iinfo(type_.to_pandas_dtype())
+    return bool(info.min <= min_max["min"].as_py() and min_max["max"].as_py() <= info.max)
+
+
+def _fits_float32(column: Union[pa.Array, pa.ChunkedArray], tolerance: float) -> bool:
+    values = column.to_numpy(zero_copy_only=False) if len(column) > 0 else np.zeros(0)
+    with np.errstate(over="ignore", invalid="ignore"):
+        converted = values.astype(np.float32).astype(np.float64)
+        error = np.abs(converted - values)
+        fits = (
+            (converted == values)
+            | (np.isnan(values) & np.isnan(converted))
+            | (error <= tolerance * np.abs(values))
+        )
+    return bool(fits.all())
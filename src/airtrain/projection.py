@@ -0,0 +1,196 @@
+import logging
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger(__name__)
+
+_METHODS = ("random", "pca")
+_DEFAULT_FIT_ROWS: int = 10_000
+
+
+class EmbeddingProjection:
+    """Projects embeddings to fewer dimensions, to make them smaller to upload.
+
+    A projection is fitted to the first embeddings it is used on, and then kept:
+    pass the same projection to later uploads (or save it, and load it later)
+    to project their embeddings identically. Projected embeddings are 32 bit
+    floats.
+
+    Parameters
+    ----------
+    dimensions:
+        The number of dimensions to project embeddings to.
+    method:
+        "random" for a random Gaussian projection, which approximately preserves
+        distances between embeddings, and needs no fitting to the data. "pca"
+        for a projection onto the principal components of the first embeddings,
+        which preserves as much of their variance as possible.
+    seed:
+        Optionally, a seed for the random projection, to make it repeatable.
+    fit_rows:
+        The number of embeddings to fit a PCA projection to. That many rows are
+        read before any is uploaded.
+    """
+
+    def __init__(
+        self,
+        dimensions: int,
+        method: str = "random",
+        seed: Optional[int] = None,
+        fit_rows: int = _DEFAULT_FIT_ROWS,
+    ) -> None:
+        if method not in _METHODS:
+            raise ValueError(
+                f"Unknown projection method '{method}'. Use one of {_METHODS}"
+            )
+        if dimensions < 1:
+            raise ValueError("Embeddings must be projected to at least one dimension.")
+        self.dimensions = dimensions
+        self.method = method
+        self.seed = seed
+        self.fit_rows = fit_rows
+        # Set once fitted: embeddings are projected as (embeddings - mean) @ matrix
+        self.matrix: Optional[np.ndarray] = None
+        self.mean: Optional[np.ndarray] = None
+        # Running sums to fit PCA with
+        self._n_rows = 0
+        self._sum: Optional[np.ndarray] = None
+        self._sum_of_products: Optional[np.ndarray] = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.matrix is not None
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """Project a matrix of embeddings, one per row."""
+        if self.matrix is None or self.mean is None:
+            raise ValueError("The projection has not been fitted yet.")
+        if embeddings.shape[1] != self.matrix.shape[0]:
+            raise ValueError(
+                f"Expected embeddings to have {self.matrix.shape[0]} dimensions, "
+                f"got: {embeddings.shape[1]}"
+            )
+        return ((embeddings - self.mean) @ self.matrix).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        """Save the fitted projection to a `.npz` file."""
+        if self.matrix is None or self.mean is None:
+            raise ValueError("The projection has not been fitted yet.")
+        np.savez(path, method=np.array(self.method), matrix=self.matrix, mean=self.mean)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        """Load a projection saved with `save`."""
+        with np.load(path) as content:
+            matrix = content["matrix"]
+            projection = cls(matrix.shape[1], method=str(content["method"]))
+            projection.matrix = matrix
+            projection.mean = content["mean"]
+        return projection
+
+    def _partial_fit(self, embeddings: np.ndarray) -> None:
+        if self.method == "random":
+            return
+        embeddings = embeddings.astype(np.float64)
+        if self._sum is None or self._sum_of_products is None:
+            self._sum = np.zeros(embeddings.shape[1])
+            self._sum_of_products = np.zeros((embeddings.shape[1], embeddings.shape[1]))
+        self._n_rows += len(embeddings)
+        self._sum += embeddings.sum(axis=0)
+        self._sum_of_products += embeddings.T @ embeddings
+
+    def _finish_fit(self, n_dimensions: int) -> None:
+        if self.dimensions > n_dimensions:
+            raise ValueError(
+                f"Cannot project embeddings with {n_dimensions} dimensions to "
+                f"{self.dimensions} dimensions."
+            )
+        if self.method == "random":
+            rng = np.random.default_rng(self.seed)
+            self.matrix = rng.standard_normal((n_dimensions, self.dimensions)) / np.sqrt(
+                self.dimensions
+            )
+            self.mean = np.zeros(n_dimensions)
+            return
+        if self._sum is None or self._sum_of_products is None:
+            raise ValueError("No embeddings to fit the projection to.")
+        self.mean = self._sum / self._n_rows
+        covariance = self._sum_of_products / self._n_rows - np.outer(self.mean, self.mean)
+        # Eigenvalues are in increasing order: take the last eigenvectors.
+        _, eigenvectors = np.linalg.eigh(covariance)
+        self.matrix = eigenvectors[:, ::-1][:, : self.dimensions].copy()
+        self._sum = self._sum_of_products = None
+
+
+def _project_tables(
+    tables: Iterable[pa.Table], column_name: str, projection: EmbeddingProjection
+) -> Iterator[pa.Table]:
+    """Project the embedding column of tables, fitting the projection first."""
+    tables = iter(tables)
+    fitted_on: List[pa.Table] = []
+    if not projection.fitted:
+        n_rows = 0
+        n_dimensions: Optional[int] = None
+        for table in tables:
+            fitted_on.append(table)
+            if table.num_rows == 0:
+                continue
+            embeddings = _embedding_matrix(table, column_name)
+            n_dimensions = embeddings.shape[1]
+            projection._partial_fit(embeddings)
+            n_rows += table.num_rows
+            if projection.method == "random" or n_rows >= projection.fit_rows:
+                break
+        if n_dimensions is None:
+            return
+        projection._finish_fit(n_dimensions)
+        logger.info(
+            "Fitted a %s projection of embeddings from %s to %s dimensions",
+            projection.method,
+            n_dimensions,
+            projection.dimensions,
+        )
+
+    for table in chain(fitted_on, tables):
+        yield _project_table(table, column_name, projection)
+
+
+def _project_table(
+    table: pa.Table, column_name: str, projection: EmbeddingProjection
+) -> pa.Table:
+    if table.num_rows == 0:
+        projected = np.zeros((0, projection.dimensions), dtype=np.float32)
+    else:
+        projected = projection.transform(_embedding_matrix(table, column_name))
+    column = pa.FixedSizeListArray.from_arrays(
+        pa.array(projected.reshape(-1)), projection.dimensions
+    )
+    index = table.schema.get_field_index(column_name)
+    return table.set_column(index, pa.field(column_name, column.type), column)
+
+
+def _embedding_matrix(table: pa.Table, column_name: str) -> np.ndarray:
+    """Get the embeddings of a column as a matrix, one embedding per row."""
+    if column_name not in table.column_names:
+        raise ValueError(f"No column named '{column_name}' containing embeddings.")
+    column = table[column_name].combine_chunks()
+    if not (
+        pa.types.is_list(column.type)
+        or pa.types.is_large_list(column.type)
+        or pa.types.is_fixed_size_list(column.type)
+    ):
+        raise TypeError(
+            f"Embedding column must contain lists of numbers. Got: {column.type}"
+        )
+    if column.null_count > 0:
+        raise ValueError(f"Found {column.null_count} null values in '{column_name}'")
+    lengths = pc.min_max(pc.list_value_length(column))
+    if lengths["min"].as_py() != lengths["max"].as_py():
+        raise ValueError(f"Not all embeddings in '{column_name}' have the same length.")
+    values = column.flatten().to_numpy(zero_copy_only=False)
+    return values.reshape(len(column), lengths["max"].as_py())
@@ -44,6 +44,8 @@ def __retry_internal(
     backoff: float = 1,
     jitter: Union[float, Tuple[float, float]] = 0,
     logger: Optional[logging.Logger] = logging_logger,
+    max_total_delay: Optional[float] = None,
+    delay_hint: Optional[Callable[[Exception], Optional[float]]] = None,
 ):
     """Executes a function and retries it if it failed.
 
@@ -67,12 +69,21 @@ def __retry_internal(
     logger:
         logger.warning(fmt, error, delay) will be called on failed attempts.
         default: retry.logging_logger. if None, logging is disabled.
+    max_total_delay:
+        the maximum total time to spend sleeping between attempts. if the next
+        delay would exceed it, the last error is raised instead. default: None
+        (no limit).
+    delay_hint:
+        called with the error of a failed attempt. if it returns a number, that
+        is used as the delay before the next attempt instead of the computed
+        one (ex: to honor a server's Retry-After). default: None.
 
     Returns
     -------
     the result of the f function.
     """
     _tries, _delay = tries, delay
+    _total_delay = 0.0
     while _tries != 0:
         try:
             return f()
@@ -81,16 +92,24 @@ def __retry_internal(
             if _tries == 0:
                 raise
 
+            hinted = delay_hint(e) if delay_hint is not None else None
+            sleep_for = _delay if hinted is None else hinted
+            if max_total_delay is not None and (
+                _total_delay + sleep_for > max_total_delay
+            ):
+                raise
+            _total_delay += sleep_for
+
             if logger is not None:
                 logger.warning(e)
                 logger.warning(
                     "Retrying %s in %s seconds with %s tries left...",
                     f.__name__,
-                    _delay,
+                    sleep_for,
                     _tries,
                 )
 
-            time.sleep(_delay)
+            time.sleep(sleep_for)
             _delay *= backoff
 
             if isinstance(jitter, tuple):
@@ -166,8 +185,10 @@ def retry_call(
     delay: float = 0,
     max_delay: Optional[float] = None,
     backoff: float = 1,
-    jitter: float = 0,
+    jitter: Union[float, Tuple[float, float]] = 0,
     logger: Optional[logging.Logger] = logging_logger,
+    max_total_delay: Optional[float] = None,
+    delay_hint: Optional[Callable[[Exception], Optional[float]]] = None,
 ):
     """Calls a function and re-executes it if it failed.
 
@@ -195,6 +216,12 @@ def retry_call(
     logger:
         logger.warning(fmt, error, delay) will be called on failed attempts.
         default: retry.logging_logger. if None, logging is disabled.
+    max_total_delay:
+        the maximum total time to spend sleeping between attempts. default: None
+        (no limit).
+    delay_hint:
+        called with the error of a failed attempt. if it returns a number, that
+        is used as the delay before the next attempt. default: None.
 
     Returns
     --------
@@ -213,6 +240,8 @@ def retry_call(
         backoff=backoff,
         jitter=jitter,
         logger=logger,
+        max_total_delay=max_total_delay,
+        delay_hint=delay_hint,
     )
 
 
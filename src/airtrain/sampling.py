@@ -0,0 +1,204 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Sampling:
+    """How to choose the rows to upload when the data has more than the row limit.
+
+    By default, rows are sampled uniformly at random. If `stratify_by` is given,
+    rows are sampled so that every distinct value of that column is represented
+    as equally as possible: each value gets the same number of rows, except for
+    values with fewer rows than that, whose unused share goes to other values.
+
+    Sampled rows keep the order they had in the source. Sampling holds about
+    as many rows in memory as the row limit, and uploading starts once the whole
+    source has been read.
+
+    Parameters
+    ----------
+    stratify_by:
+        Optionally, the name of a column to sample the distinct values of
+        equally.
+    seed:
+        Optionally, a seed for the random choice of rows, to make it repeatable.
+    """
+
+    stratify_by: Optional[str] = None
+    seed: Optional[int] = None
+
+
+def sample_tables(
+    tables: Iterable[pa.Table], n_rows: int, sampling: Sampling
+) -> Iterator[pa.Table]:
+    """Sample up to n_rows from tables, in one pass. See `Sampling`."""
+    sampler = _Sampler(n_rows, sampling)
+    for table in tables:
+        sampler.add(table)
+    sample = sampler.result()
+    if sample is not None:
+        yield sample
+
+
+class _Sampler:
+    """Keeps, for every stratum, the rows with the smallest random keys.
+
+    Giving every row a uniformly random key, the rows with the k smallest keys
+    of a stratum are a uniform sample of k of its rows. The number of rows a
+    stratum ends up with is at most the water level of the final quotas, and
+    the level only goes down as more rows are seen. So at any time, only the
+    rows under the current level need to be kept.
+    """
+
+    def __init__(self, n_rows: int, sampling: Sampling) -> None:
+        self.n_rows = n_rows
+        self.stratify_by = sampling.stratify_by
+        self._rng = np.random.default_rng(sampling.seed)
+        self._schema: Optional[pa.Schema] = None
+        # Rows kept so far, and those added since the last compaction
+        self._tables: List[pa.Table] = []
+        self._keys: List[np.ndarray] = []
+        self._strata: List[np.ndarray] = []
+        self._positions: List[np.ndarray] = []
+        self._n_buffered = 0
+        self._n_seen = 0
+        # Rows seen, and the largest key of the rows kept if the stratum is at
+        # its quota, by stratum code
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._thresholds = np.zeros(0)
+        self._stratum_codes: Dict[object, int] = {}
+
+    def add(self, table: pa.Table) -> None:
+        if self._schema is None:
+            self._schema = table.schema
+        if self._schema != table.schema:
+            logger.error("Mismatched schemas:\n%s\n\n%s", self._schema, table.schema)
+            raise ValueError("All uploaded tables must have the same schema.")
+        n = table.num_rows
+        if n == 0:
+            return
+        strata = self._stratum_codes_of(table)
+        n_new_strata = len(self._stratum_codes) - len(self._counts)
+        self._counts = np.pad(self._counts, (0, n_new_strata))
+        self._thresholds = np.pad(self._thresholds, (0, n_new_strata), constant_values=1)
+        self._counts += np.bincount(strata, minlength=len(self._counts))
+
+        keys = self._rng.random(n)
+        positions = np.arange(self._n_seen, self._n_seen + n)
+        self._n_seen += n
+        # Quotas only go down, so rows with larger keys than all the rows kept
+        # for a full stratum will never be kept.
+        candidates = keys < self._thresholds[strata]
+        if not candidates.all():
+            indices = np.flatnonzero(candidates)
+            table = table.take(pa.array(indices))
+            keys, strata, positions = keys[indices], strata[indices], positions[indices]
+        self._tables.append(table)
+        self._keys.append(keys)
+        self._strata.append(strata)
+        self._positions.append(positions)
+        self._n_buffered += len(keys)
+        # Compacting only once as many rows as the limit have been added
+        # amortizes the cost of copying the kept rows.
+        if self._n_buffered >= max(self.n_rows, 1):
+            self._compact(_quotas(self._counts, self.n_rows, exact=False))
+
+    def result(self) -> Optional[pa.Table]:
+        if self._n_seen == 0:
+            return None
+        table = self._compact(_quotas(self._counts, self.n_rows, exact=True))
+        # Restore the order of the source.
+        order = np.argsort(self._positions[0], kind="stable")
+        return table.take(pa.array(order))
+
+    def _compact(self, quotas: np.ndarray) -> pa.Table:
+        keys = np.concatenate(self._keys)
+        strata = np.concatenate(self._strata)
+        positions = np.concatenate(self._positions)
+        keep = np.flatnonzero(_rank_within_stratum(keys, strata) < quotas[strata])
+        table = pa.concat_tables(self._tables).take(pa.array(keep))
+        keys, strata, positions = keys[keep], strata[keep], positions[keep]
+        largest_keys = np.zeros(len(quotas))
+        np.maximum.at(largest_keys, strata, keys)
+        # A stratum whose quota is capped by the rows it has so far is not full:
+        # its quota grows with the rows still to come.
+        full = (np.bincount(strata, minlength=len(quotas)) >= quotas) & (
+            self._counts > quotas
+        )
+        self._thresholds = np.where(full, largest_keys, 1.0)
+        self._tables = [table]
+        self._keys = [keys]
+        self._strata = [strata]
+        self._positions = [positions]
+        self._n_buffered = 0
+        return table
+
+    def _stratum_codes_of(self, table: pa.Table) -> np.ndarray:
+        if self.stratify_by is None:
+            self._stratum_codes.setdefault(None, 0)
+            return np.zeros(table.num_rows, dtype=np.int64)
+        if self.stratify_by not in table.column_names:
+            raise ValueError(f"No column named '{self.stratify_by}' to stratify by.")
+        column = table[self.stratify_by].combine_chunks()
+        encoded = pc.dictionary_encode(column, null_encoding="encode")
+        # Map the codes local to this table to codes for the whole source. Only
+        # the distinct values are handled in python. Nulls are one of them.
+        local_to_global = np.array(
+            [
+                self._stratum_codes.setdefault(value, len(self._stratum_codes))
+                for value in encoded.dictionary.to_pylist()
+            ],
+            dtype=np.int64,
+        )
+        return local_to_global[encoded.indices.to_numpy()]
+
+
+def _rank_within_stratum(keys: np.ndarray, strata: np.ndarray) -> np.ndarray:
+    """Get the rank of every key among the keys of the same stratum."""
+    # Keys are in [0, 1), so this sorts by stratum, then by key.
+    order = np.argsort(strata + keys)
+    sorted_strata = strata[order]
+    stratum_starts = np.searchsorted(sorted_strata, sorted_strata, side="left")
+    ranks = np.empty(len(keys), dtype=np.int64)
+    ranks[order] = np.arange(len(keys)) - stratum_starts
+    return ranks
+
+
+def _quotas(counts: np.ndarray, n_rows: int, exact: bool) -> np.ndarray:
+    """Split n_rows between strata with the given row counts, by water filling.
+
+    Every stratum gets the same share of rows, or all of its rows if it has
+    fewer, with leftover rows split between the other strata. Unless exact, the
+    shares are rounded up, giving an upper bound on the final quotas.
+    """
+    if counts.sum() <= n_rows:
+        return counts.copy()
+    order = np.argsort(counts, kind="stable")
+    sorted_counts = counts[order]
+    remaining = n_rows
+    n_strata = len(counts)
+    level = 0.0
+    for i, count in enumerate(sorted_counts):
+        share = remaining / (n_strata - i)
+        if count >= share:
+            level = share
+            break
+        remaining -= count
+    if not exact:
+        return np.minimum(counts, math.ceil(level))
+
+    quotas = np.minimum(counts, math.floor(level))
+    # Hand out the rows lost to rounding down, to strata which have rows left.
+    leftover = n_rows - int(quotas.sum())
+    has_more = np.flatnonzero(counts > quotas)
+    quotas[has_more[:leftover]] += 1
+    return quotas
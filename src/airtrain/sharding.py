@@ -0,0 +1,377 @@
+import base64
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+
+from airtrain.client import AirtrainClient, resolve_client
+from airtrain.core import (
+    _DEFAULT_MAX_INFLIGHT_BYTES,
+    DatasetMetadata,
+    _encode_part,
+    _PartUploader,
+    _upload_tables,
+)
+from airtrain.instrumentation import (
+    UploadObserver,
+    UploadTimings,
+    notify,
+    notify_errors,
+)
+from airtrain.memory import MemoryBudget
+
+
+@dataclass
+class ShardResult:
+    """What was uploaded for one shard of a `ShardedUpload`.
+
+    Returned by `ShardedUpload.upload_shard`, to be passed to
+    `ShardedUpload.finalize`. Can be sent between machines with `to_json`.
+    """
+
+    shard: int
+    rows: int
+    # The serialized Arrow schema of the shard's data, base64 encoded, if any
+    schema: Optional[str]
+    timings: UploadTimings
+    # Where the shard's parts were uploaded to. See `ShardUploadError`.
+    parts: List[str] = field(default_factory=list)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, content: str) -> "ShardResult":
+        fields = json.loads(content)
+        timings = UploadTimings(**fields.pop("timings"))
+        return cls(timings=timings, **fields)
+
+    def arrow_schema(self) -> Optional[pa.Schema]:
+        if self.schema is None:
+            return None
+        return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(self.schema)))
+
+
+class ShardUploadError(Exception):
+    """Uploading a shard of a `ShardedUpload` failed.
+
+    Pass `parts` as the `replace_parts` of `upload_shard` to retry the shard,
+    replacing the parts it already uploaded instead of adding to them.
+
+    Parameters
+    ----------
+    shard:
+        The index of the shard that failed.
+    parts:
+        Where the shard's parts were uploaded to before it failed.
+    """
+
+    def __init__(self, shard: int, parts: List[str]) -> None:
+        super().__init__(f"Uploading shard {shard} failed, after {len(parts)} parts")
+        self.shard = shard
+        self.parts = parts
+
+
+@dataclass
+class ShardedUpload:
+    """A dataset uploaded in shards, from several processes or machines at once.
+
+    An upload has three phases:
+
+    1. `ShardedUpload.create` creates the dataset, and splits its row limit
+       between a number of shards.
+    2. Each shard's data is uploaded with `upload_shard`, from any machine. The
+       upload can be sent to other machines with `to_json` and `from_json`, or
+       by pickling it.
+    3. `finalize` is called once every shard has been uploaded, with the result
+       of each, and ingests the dataset.
+
+    Parts uploaded by a shard that fails are not removed. To retry the shard,
+    pass the `parts` of the `ShardUploadError` it raised to `upload_shard`,
+    which uploads over them rather than adding to them.
+
+    Parameters
+    ----------
+    dataset_id:
+        The id of the dataset being uploaded.
+    name:
+        The name of the dataset.
+    embedding_column:
+        The name of the column containing embeddings, if any.
+    url:
+        The URL of the dataset in the Airtrain dashboard.
+    shard_rows:
+        The most rows each shard may upload, so that all shards together stay
+        within the row limit of the dataset.
+    """
+
+    dataset_id: str
+    name: str
+    embedding_column: Optional[str]
+    url: str
+    shard_rows: List[int]
+
+    @property
+    def n_shards(self) -> int:
+        return len(self.shard_rows)
+
+    @classmethod
+    def create(
+        cls,
+        n_shards: int,
+        name: Optional[str] = None,
+        embedding_column: Optional[str] = None,
+        client: Optional[AirtrainClient] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ) -> "ShardedUpload":
+        """Create a dataset to upload in n_shards shards.
+
+        Parameters
+        ----------
+        n_shards:
+            The number of shards the data will be uploaded in. The row limit of
+            the dataset is split evenly between them.
+        name:
+            The name of the dataset. See `upload_from_arrow_tables`.
+        embedding_column:
+            The name of a column containing embeddings. See
+            `upload_from_arrow_tables`.
+        client:
+            Optionally, the client to create the dataset with. See
+            `upload_from_arrow_tables`.
+        api_key:
+            Optionally, the API key to use. See `upload_from_arrow_tables`.
+        base_url:
+            Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+        """
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least one")
+        name = name or f"My Dataset {datetime.now()}"
+        c = resolve_client(client, api_key=api_key, base_url=base_url)
+        response = c.create_dataset(name=name, embedding_column_name=embedding_column)
+        rows_per_shard, n_larger_shards = divmod(response.row_limit, n_shards)
+        return cls(
+            dataset_id=response.dataset_id,
+            name=name,
+            embedding_column=embedding_column,
+            url=c.dataset_dashboard_url(response.dataset_id),
+            shard_rows=[
+                rows_per_shard + (1 if shard < n_larger_shards else 0)
+                for shard in range(n_shards)
+            ],
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, content: str) -> "ShardedUpload":
+        return cls(**json.loads(content))
+
+    def upload_shard(
+        self,
+        shard: int,
+        data: Iterable[pa.Table],
+        client: Optional[AirtrainClient] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        observer: Optional[UploadObserver] = None,
+        upload_concurrency: Optional[int] = None,
+        max_inflight_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        stream_encoding: Optional[bool] = None,
+        replace_parts: Optional[List[str]] = None,
+    ) -> ShardResult:
+        """Upload the data of one shard, up to the shard's share of the row limit.
+
+        Parameters
+        ----------
+        shard:
+            The index of the shard, from 0 to `n_shards - 1`.
+        data:
+            An iterable of arrow tables holding the shard's data. All shards must
+            have the same schema.
+        client:
+            Optionally, the client to upload with. See `upload_from_arrow_tables`.
+        api_key:
+            Optionally, the API key to use. See `upload_from_arrow_tables`.
+        base_url:
+            Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+        observer:
+            Optionally, an observer to receive progress events and metrics for
+            every uploaded part of the shard. See `airtrain.instrumentation`.
+        upload_concurrency:
+            The number of parts that may be uploaded at once. See
+            `upload_from_arrow_tables`.
+        max_inflight_bytes:
+            The memory budget for parts not yet uploaded. See
+            `upload_from_arrow_tables`.
+        spill_dir:
+            Optionally, a directory to spill encoded parts to. See
+            `upload_from_arrow_tables`.
+        stream_encoding:
+            If True, encode parts while uploading them. See
+            `upload_from_arrow_tables`.
+        replace_parts:
+            Optionally, when retrying the shard, the parts uploaded by the
+            attempts that failed, from `ShardUploadError.parts`. They are
+            uploaded over, and those left over are replaced with empty parts.
+
+        Returns
+        -------
+        The result of the shard, to pass to `finalize`.
+
+        Raises
+        ------
+        ShardUploadError
+            If uploading fails, from the original error, recording the parts
+            uploaded so far.
+        """
+        if not 0 <= shard < self.n_shards:
+            raise ValueError(f"Shard must be between 0 and {self.n_shards - 1}.")
+        started = time.perf_counter()
+        c = resolve_client(client, api_key=api_key, base_url=base_url)
+        if observer is not None:
+            notify(observer.on_start, self.dataset_id, self.name)
+        uploader = _PartUploader(
+            client=c,
+            dataset_id=self.dataset_id,
+            started=started,
+            observer=observer,
+            concurrency=upload_concurrency or 1,
+            budget=MemoryBudget(max_inflight_bytes or _DEFAULT_MAX_INFLIGHT_BYTES),
+            spill_dir=spill_dir,
+            stream_encoding=bool(stream_encoding),
+            replaced_parts=replace_parts,
+        )
+        schemas: List[pa.Schema] = []
+
+        def record_schema(tables: Iterable[pa.Table]) -> Iterator[pa.Table]:
+            for table in tables:
+                if len(schemas) == 0:
+                    schemas.append(table.schema)
+                yield table
+
+        try:
+            with notify_errors(observer, self.dataset_id):
+                size = _upload_tables(
+                    record_schema(data),
+                    self.embedding_column,
+                    self.shard_rows[shard],
+                    uploader,
+                )
+                if len(uploader.replaced_parts) > 0:
+                    self._empty_parts(c, uploader, schemas)
+        except Exception as e:
+            parts = uploader.parts + list(uploader.replaced_parts)
+            raise ShardUploadError(shard, parts) from e
+        finally:
+            # Ingestion, which would release them, is triggered elsewhere.
+            c.release_upload_targets(self.dataset_id)
+        timings = uploader.timings
+        timings.total_seconds = time.perf_counter() - started
+        if observer is not None:
+            notify(observer.on_finish, self.dataset_id, timings)
+        schema = None
+        if size > 0:
+            serialized = schemas[0].serialize().to_pybytes()
+            schema = base64.b64encode(serialized).decode("ascii")
+        return ShardResult(
+            shard=shard, rows=size, schema=schema, timings=timings, parts=uploader.parts
+        )
+
+    def _empty_parts(
+        self, c: AirtrainClient, uploader: _PartUploader, schemas: List[pa.Schema]
+    ) -> None:
+        """Replace the parts of failed attempts that this one had no data for."""
+        if len(schemas) == 0:
+            raise ValueError("Cannot replace the parts of a shard with no data.")
+        empty = _encode_part(schemas[0].empty_table())
+        while len(uploader.replaced_parts) > 0:
+            location = uploader.replaced_parts[0]
+            empty.seek(0)
+            c.replace_dataset_data(location, empty)
+            uploader.parts.append(uploader.replaced_parts.popleft())
+
+    def finalize(
+        self,
+        results: List[ShardResult],
+        client: Optional[AirtrainClient] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        observer: Optional[UploadObserver] = None,
+    ) -> DatasetMetadata:
+        """Ingest the dataset, once every shard has been uploaded.
+
+        Parameters
+        ----------
+        results:
+            The result of `upload_shard` for every shard, in any order.
+        client:
+            Optionally, the client to ingest with. See `upload_from_arrow_tables`.
+        api_key:
+            Optionally, the API key to use. See `upload_from_arrow_tables`.
+        base_url:
+            Optionally, the URL of the Airtrain API. See `upload_from_arrow_tables`.
+        observer:
+            Optionally, an observer to notify with the timings of the whole
+            upload, once ingestion has been triggered. See
+            `airtrain.instrumentation`.
+
+        Returns
+        -------
+        A DatasetMetadata object summarizing the created dataset. Its timings
+        are those of all shards added together, except for the total time,
+        which is that of the slowest shard plus the time to trigger ingestion.
+        """
+        shards = sorted(result.shard for result in results)
+        if shards != list(range(self.n_shards)):
+            raise ValueError(
+                f"Expected one result for each of {self.n_shards} shards. "
+                f"Got results for shards: {shards}"
+            )
+        schemas = [result.arrow_schema() for result in results]
+        known_schemas = [schema for schema in schemas if schema is not None]
+        if any(not schema.equals(known_schemas[0]) for schema in known_schemas):
+            raise ValueError("All shards must have the same schema.")
+        size = sum(result.rows for result in results)
+        if size == 0:
+            raise ValueError("Cannot ingest empty dataset.")
+        c = resolve_client(client, api_key=api_key, base_url=base_url)
+        timings = _combine_timings([result.timings for result in results])
+        ingest_started = time.perf_counter()
+        response = c.trigger_dataset_ingest(self.dataset_id)
+        timings.ingest_seconds = time.perf_counter() - ingest_started
+        timings.total_seconds += timings.ingest_seconds
+        if observer is not None:
+            notify(observer.on_finish, self.dataset_id, timings)
+        return DatasetMetadata(
+            name=self.name,
+            id=self.dataset_id,
+            url=self.url,
+            size=size,
+            timings=timings,
+            ingest_job_id=response.ingest_job_id,
+        )
+
+
+def _combine_timings(shard_timings: List[UploadTimings]) -> UploadTimings:
+    """Add up the timings of shards, which were uploaded at the same time."""
+    timings = UploadTimings()
+    for shard in shard_timings:
+        timings.parts += shard.parts
+        timings.rows += shard.rows
+        timings.arrow_bytes += shard.arrow_bytes
+        timings.encoded_bytes += shard.encoded_bytes
+        timings.source_seconds += shard.source_seconds
+        timings.conversion_seconds += shard.conversion_seconds
+        timings.validation_seconds += shard.validation_seconds
+        timings.encode_seconds += shard.encode_seconds
+        timings.upload_seconds += shard.upload_seconds
+        timings.retries += shard.retries
+        timings.total_seconds = max(timings.total_seconds, shard.total_seconds)
+    return timings
@@ -0,0 +1,112 @@
+"""Embeddings uploaded as dense binary matrices, next to the Parquet parts.
+
+With a sidecar, the embedding column is removed from each part before it is
+encoded to Parquet, and uploaded separately as a contiguous little-endian
+matrix, one embedding per row, in the same row order as the part. The two are
+paired by a part id, which is stored in the Parquet schema metadata of the part,
+and in the header of the sidecar:
+
+- 8 bytes: `SIDECAR_MAGIC`
+- 32 bytes: the part id, as ASCII hex
+- 24 bytes: zero padding, so that the matrix starts 64 byte aligned
+
+The matrix then follows, and can be memory-mapped from offset `HEADER_BYTES`.
+"""
+
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from airtrain.projection import _embedding_matrix
+
+
+SIDECAR_MAGIC: bytes = b"ATEMB\x00\x00\x01"
+HEADER_BYTES: int = 64
+# Keys of the Parquet schema metadata of parts with a sidecar
+PART_ID_KEY: bytes = b"airtrain.sidecar.part_id"
+COLUMN_KEY: bytes = b"airtrain.sidecar.column"
+COLUMN_INDEX_KEY: bytes = b"airtrain.sidecar.column_index"
+
+_DTYPES: Dict[str, np.dtype] = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+}
+
+
+@dataclass
+class EmbeddingSidecar:
+    """How to upload embeddings as a dense binary matrix next to each part.
+
+    Parameters
+    ----------
+    dtype:
+        "float32", or "float16" to halve the size of embeddings at the cost of
+        precision.
+    """
+
+    dtype: str = "float32"
+
+    def __post_init__(self) -> None:
+        if self.dtype not in _DTYPES:
+            raise ValueError(
+                f"Unsupported sidecar dtype '{self.dtype}'. Use one of: {list(_DTYPES)}"
+            )
+
+
+@dataclass
+class _SidecarPart:
+    part_id: str
+    content: bytes
+    dimensions: int
+
+
+def split_embeddings(
+    table: pa.Table, column_name: str, sidecar: EmbeddingSidecar
+) -> Tuple[pa.Table, _SidecarPart]:
+    """Remove the embedding column of a part, encoding it as a sidecar."""
+    matrix = _embedding_matrix(table, column_name).astype(_DTYPES[sidecar.dtype])
+    part_id = uuid.uuid4().hex
+    header = SIDECAR_MAGIC + part_id.encode("ascii")
+    header += b"\x00" * (HEADER_BYTES - len(header))
+    metadata = dict(table.schema.metadata or {})
+    metadata[PART_ID_KEY] = part_id.encode("ascii")
+    metadata[COLUMN_KEY] = column_name.encode("utf8")
+    metadata[COLUMN_INDEX_KEY] = str(table.schema.get_field_index(column_name)).encode()
+    rest = table.drop_columns([column_name]).replace_schema_metadata(metadata)
+    content = header + np.ascontiguousarray(matrix).tobytes()
+    return rest, _SidecarPart(part_id, content, dimensions=matrix.shape[1])
+
+
+def read_sidecar(content: bytes, dtype: str, dimensions: int) -> Tuple[str, np.ndarray]:
+    """Read the part id and embedding matrix of a sidecar, without copying."""
+    if content[: len(SIDECAR_MAGIC)] != SIDECAR_MAGIC:
+        raise ValueError("Not an embeddings sidecar.")
+    part_id = content[len(SIDECAR_MAGIC) : len(SIDECAR_MAGIC) + 32].decode("ascii")
+    matrix = np.frombuffer(content, dtype=_DTYPES[dtype], offset=HEADER_BYTES)
+    return part_id, matrix.reshape(-1, dimensions)
+
+
+def join_embeddings(table: pa.Table, matrix: np.ndarray) -> pa.Table:
+    """Put the embeddings of a sidecar back into the table of its part."""
+    metadata = dict(table.schema.metadata or {})
+    column_name = metadata.pop(COLUMN_KEY).decode("utf8")
+    index = int(metadata.pop(COLUMN_INDEX_KEY))
+    metadata.pop(PART_ID_KEY)
+    if len(matrix) != table.num_rows:
+        raise ValueError(
+            f"Sidecar has {len(matrix)} embeddings for a part of {table.num_rows} rows."
+        )
+    column = pa.FixedSizeListArray.from_arrays(
+        pa.array(matrix.reshape(-1)), matrix.shape[1]
+    )
+    table = table.replace_schema_metadata(metadata or None)
+    return table.add_column(index, column_name, column)
+
+
+def sidecar_part_id(table: pa.Table) -> Optional[str]:
+    """Get the id of the sidecar of a part, if it has one."""
+    part_id = (table.schema.metadata or {}).get(PART_ID_KEY)
+    return None if part_id is None else part_id.decode("ascii")
@@ -0,0 +1,131 @@
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pyarrow as pa
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SparseKeys:
+    """How to convert dicts with many distinct, mostly missing, keys.
+
+    Keys with values in at least `min_frequency` of the first batch of rows
+    become columns, and all other keys go into a single `map<string, string>` column,
+    from key to value. String values are kept as they are, and other values are
+    encoded as JSON. Keys missing from a row are left out of its map, so the cost
+    of converting rows is proportional to the keys they have, rather than to all
+    of the keys seen. The columns are decided once, so every batch of rows has
+    the same schema.
+
+    Parameters
+    ----------
+    min_frequency:
+        The fraction of rows of the first batch a key must have a value in to
+        become a column.
+    max_columns:
+        Optionally, the number of columns there may be at most, including the
+        overflow column. The most frequent keys are kept as columns.
+    overflow_column:
+        The name of the column holding the other keys and their values.
+    """
+
+    min_frequency: float = 0.05
+    max_columns: Optional[int] = None
+    overflow_column: str = "overflow"
+
+
+class _SparseDictConverter:
+    """Converts batches of dicts to tables with the same schema, per `SparseKeys`.
+
+    If a schema is given, its fields are the columns and other keys overflow.
+    Otherwise, the columns and their types are decided from the first batch.
+    """
+
+    def __init__(self, sparse_keys: SparseKeys, schema: Optional[pa.Schema]) -> None:
+        self.sparse_keys = sparse_keys
+        self.schema = schema
+        if schema is not None:
+            if sparse_keys.overflow_column in schema.names:
+                raise ValueError(
+                    f"The overflow column '{sparse_keys.overflow_column}' is already "
+                    "in the schema. Choose another name for it."
+                )
+            self.schema = schema.append(
+                pa.field(sparse_keys.overflow_column, pa.map_(pa.string(), pa.string()))
+            )
+        self._columns: Optional[Dict[str, int]] = (
+            None if schema is None else {name: i for i, name in enumerate(schema.names)}
+        )
+
+    def to_table(self, rows: Sequence[Dict[str, Any]]) -> pa.Table:
+        for row in rows:
+            if not isinstance(row, dict):
+                logger.error("Unexpected row: %s", row)
+                raise ValueError("All data rows must be python dicts.")
+        if self._columns is None:
+            self._columns = self._choose_columns(rows)
+
+        columns = self._columns
+        values: List[List[Any]] = [[None] * len(rows) for _ in columns]
+        overflow_keys: List[str] = []
+        overflow_values: List[str] = []
+        entries_per_row = np.zeros(len(rows), dtype=np.int32)
+        for i, row in enumerate(rows):
+            n_entries = 0
+            for key, value in row.items():
+                column = columns.get(key)
+                if column is not None:
+                    values[column][i] = value
+                elif value is not None:
+                    overflow_keys.append(key)
+                    overflow_values.append(_to_string(value))
+                    n_entries += 1
+            entries_per_row[i] = n_entries
+
+        offsets = np.concatenate([[0], np.cumsum(entries_per_row)]).astype(np.int32)
+        overflow = pa.MapArray.from_arrays(
+            pa.array(offsets),
+            pa.array(overflow_keys, pa.string()),
+            pa.array(overflow_values, pa.string()),
+        )
+        arrays: Dict[str, Any] = dict(zip(columns, values))
+        arrays[self.sparse_keys.overflow_column] = overflow
+        table = pa.table(arrays, schema=self.schema)
+        if self.schema is None:
+            # Ensure later batches use the same schema.
+            self.schema = table.schema
+        return table
+
+    def _choose_columns(self, rows: Sequence[Dict[str, Any]]) -> Dict[str, int]:
+        # Keys only ever seen with null values would not have a type.
+        counts = Counter(
+            key for row in rows for key, value in row.items() if value is not None
+        )
+        min_count = self.sparse_keys.min_frequency * len(rows)
+        frequent = [key for key, count in counts.most_common() if count >= min_count]
+        if self.sparse_keys.max_columns is not None:
+            frequent = frequent[: max(0, self.sparse_keys.max_columns - 1)]
+        if self.sparse_keys.overflow_column in frequent:
+            raise ValueError(
+                f"The overflow column '{self.sparse_keys.overflow_column}' is already "
+                "a key of the data. Choose another name for it."
+            )
+        logger.info(
+            "Keeping %s of %s keys as columns: %s", len(frequent), len(counts), frequent
+        )
+        # In the order keys were first seen in, rather than by frequency.
+        frequent_keys = set(frequent)
+        first_seen = [key for key in counts if key in frequent_keys]
+        return {key: i for i, key in enumerate(first_seen)}
+
+
+def _to_string(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
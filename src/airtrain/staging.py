@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import pyarrow.parquet as pq
+
+from airtrain.client import (
+    ByteStreamFactory,
+    CreateDatasetResponse,
+    TriggerIngestResponse,
+)
+
+
+MANIFEST_FILE_NAME: str = "manifest.json"
+_MANIFEST_VERSION: int = 1
+
+
+@dataclass
+class StagedPart:
+    """A Parquet file holding one part of a staged dataset."""
+
+    file: str
+    rows: int
+    n_bytes: int
+
+
+@dataclass
+class StagedManifest:
+    """Describes a dataset staged to a local directory, to be pushed later."""
+
+    local_id: str
+    name: str
+    embedding_column: Optional[str]
+    parts: List[StagedPart] = field(default_factory=list)
+    # Stats of the columns, as sent when triggering ingestion, if collected
+    column_stats: Optional[List[Dict[str, Any]]] = None
+    version: int = _MANIFEST_VERSION
+
+    @property
+    def rows(self) -> int:
+        return sum(part.rows for part in self.parts)
+
+    def write(self, directory: str) -> None:
+        path = os.path.join(directory, MANIFEST_FILE_NAME)
+        # Written last and atomically: a directory with a manifest is complete.
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def read(cls, directory: str) -> "StagedManifest":
+        path = os.path.join(directory, MANIFEST_FILE_NAME)
+        if not os.path.exists(path):
+            raise ValueError(
+                f"No staged dataset in '{directory}'. Staging may not have finished."
+            )
+        with open(path) as f:
+            content = json.load(f)
+        if content.get("version") != _MANIFEST_VERSION:
+            raise ValueError(
+                f"Unsupported staged dataset version: {content.get('version')}"
+            )
+        parts = [StagedPart(**part) for part in content.pop("parts")]
+        return cls(parts=parts, **content)
+
+
+class StagingClient:
+    """Stands in for an AirtrainClient, writing parts to a local directory.
+
+    Parts are written exactly as they would have been uploaded, and "triggering
+    ingestion" writes the manifest describing them. Intended for internal
+    package use.
+
+    Parameters
+    ----------
+    directory:
+        The directory to stage the dataset to. It is created if it does not
+        exist, and must not already hold a staged dataset.
+    """
+
+    def __init__(self, directory: str) -> None:
+        if os.path.exists(os.path.join(directory, MANIFEST_FILE_NAME)):
+            raise ValueError(f"A dataset has already been staged to '{directory}'.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.manifest: Optional[StagedManifest] = None
+        self._lock = threading.Lock()
+
+    def create_dataset(
+        self, name: str, embedding_column_name: Optional[str]
+    ) -> CreateDatasetResponse:
+        self.manifest = StagedManifest(
+            local_id=f"local-{uuid.uuid4().hex}",
+            name=name,
+            embedding_column=embedding_column_name,
+        )
+        # The row limit of the account is only known once pushed.
+        return CreateDatasetResponse(
+            dataset_id=self.manifest.local_id, row_limit=sys.maxsize
+        )
+
+    def upload_dataset_data(
+        self, dataset_id: str, data: Union[io.BufferedIOBase, ByteStreamFactory]
+    ) -> str:
+        manifest = self._manifest(dataset_id)
+        with self._lock:
+            file_name = f"part-{len(manifest.parts):05d}.parquet"
+            part = StagedPart(file=file_name, rows=0, n_bytes=0)
+            manifest.parts.append(part)
+        self._write_part(part, data)
+        return file_name
+
+    def replace_dataset_data(
+        self, location: str, data: Union[io.BufferedIOBase, ByteStreamFactory]
+    ) -> None:
+        parts = self.manifest.parts if self.manifest is not None else []
+        part = next((part for part in parts if part.file == location), None)
+        if part is None:
+            raise ValueError(f"No staged part '{location}'")
+        self._write_part(part, data)
+
+    def _write_part(
+        self, part: StagedPart, data: Union[io.BufferedIOBase, ByteStreamFactory]
+    ) -> None:
+        path = os.path.join(self.directory, part.file)
+        with open(path, "wb") as f:
+            if callable(data):
+                for chunk in data():
+                    f.write(chunk)
+            else:
+                shutil.copyfileobj(data, f)
+        part.n_bytes = os.path.getsize(path)
+        part.rows = pq.read_metadata(path).num_rows
+
+    def trigger_dataset_ingest(
+        self, dataset_id: str, column_stats: Optional[List[Dict[str, Any]]] = None
+    ) -> TriggerIngestResponse:
+        manifest = self._manifest(dataset_id)
+        manifest.column_stats = column_stats
+        manifest.write(self.directory)
+        return TriggerIngestResponse(ingest_job_id=dataset_id)
+
+    def dataset_dashboard_url(self, dataset_id: str) -> str:
+        return Path(self.directory).resolve().as_uri()
+
+    def _manifest(self, dataset_id: str) -> StagedManifest:
+        if self.manifest is None or self.manifest.local_id != dataset_id:
+            raise ValueError(f"Unknown staged dataset: {dataset_id}")
+        return self.manifest
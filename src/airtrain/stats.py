@@ -0,0 +1,411 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger(__name__)
+
+# The quantiles reported for distributions of values, lengths, and norms
+QUANTILES: List[float] = [0.0, 0.01, 0.25, 0.5, 0.75, 0.99, 1.0]
+
+_HLL_PRECISION: int = 12
+_TDIGEST_COMPRESSION: float = 100.0
+# Strings are hashed this many bytes at a time, to bound the memory used.
+_HASH_CHUNK_BYTES: int = 4 * 1024 * 1024
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_UINT64_MASK = (1 << 64) - 1
+
+
+@dataclass
+class ColumnStats:
+    """A profile of the values of one column of a dataset.
+
+    Distinct counts are estimates, with a typical error of under 2%. Quantiles
+    are estimates too, most accurate near the extremes, and are listed for each
+    of `QUANTILES`.
+
+    Parameters
+    ----------
+    name:
+        The name of the column.
+    type:
+        The Arrow type of the column, as a string.
+    count:
+        The number of values, including nulls.
+    null_count:
+        The number of null values.
+    min:
+        The smallest value, for numbers, times, and strings.
+    max:
+        The largest value, for numbers, times, and strings.
+    distinct_count:
+        The estimated number of distinct values, for numbers, times, and strings.
+    quantiles:
+        The quantiles of the values, for numbers.
+    length_quantiles:
+        The quantiles of the lengths of values, for strings and binary data.
+    norm_quantiles:
+        The quantiles of the L2 norms of values, for lists of numbers (ex:
+        embeddings).
+    """
+
+    name: str
+    type: str
+    count: int = 0
+    null_count: int = 0
+    min: Any = None
+    max: Any = None
+    distinct_count: Optional[int] = None
+    quantiles: Optional[List[float]] = None
+    length_quantiles: Optional[List[float]] = None
+    norm_quantiles: Optional[List[float]] = None
+
+    def to_json(self) -> Dict[str, Any]:
+        """Get the stats in the form they are sent to Airtrain in."""
+        content = {
+            "name": self.name,
+            "type": self.type,
+            "count": self.count,
+            "nullCount": self.null_count,
+            "min": _to_json_value(self.min),
+            "max": _to_json_value(self.max),
+            "distinctCount": self.distinct_count,
+            "quantiles": _to_json_list(self.quantiles),
+            "lengthQuantiles": _to_json_list(self.length_quantiles),
+            "normQuantiles": _to_json_list(self.norm_quantiles),
+        }
+        return {key: value for key, value in content.items() if value is not None}
+
+    @classmethod
+    def from_json(cls, content: Dict[str, Any]) -> "ColumnStats":
+        """Read stats in the form returned by `to_json`."""
+        return cls(
+            name=content["name"],
+            type=content["type"],
+            count=content["count"],
+            null_count=content["nullCount"],
+            min=content.get("min"),
+            max=content.get("max"),
+            distinct_count=content.get("distinctCount"),
+            quantiles=content.get("quantiles"),
+            length_quantiles=content.get("lengthQuantiles"),
+            norm_quantiles=content.get("normQuantiles"),
+        )
+
+
+class HyperLogLog:
+    """A mergeable sketch estimating the number of distinct 64 bit hashes."""
+
+    def __init__(self, precision: int = _HLL_PRECISION) -> None:
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        p = self.precision
+        indices = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        # The position of the first set bit of the rest, counting from 1
+        _, exponents = np.frexp(rest.astype(np.float64))
+        ranks = (64 - p - exponents + 1).astype(np.uint8)
+        np.maximum.at(self.registers, indices, ranks)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        n_zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and n_zeros > 0:
+            # Linear counting is more accurate for small numbers.
+            return int(round(m * np.log(m / n_zeros)))
+        return int(round(raw))
+
+
+class TDigest:
+    """A mergeable sketch of a distribution, estimating its quantiles.
+
+    Values are summarized by centroids (a mean and a weight), which are smaller
+    near the extremes of the distribution. Adding values and merging digests
+    both sort the centroids together, and combine neighbors that fit within one
+    unit of the k1 scale function, in a single vectorized pass.
+    """
+
+    def __init__(self, compression: float = _TDIGEST_COMPRESSION) -> None:
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values: np.ndarray) -> None:
+        # Infinities would turn the means of their centroids into NaN.
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(
+            np.concatenate([self.means, values]),
+            np.concatenate([self.weights, np.ones(len(values))]),
+        )
+
+    def merge(self, other: "TDigest") -> None:
+        if len(other.means) == 0:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+        )
+
+    def quantiles(self, qs: List[float]) -> Optional[List[float]]:
+        if len(self.means) == 0:
+            return None
+        total = self.weights.sum()
+        # Centroids are placed at the middle of the weight they cover.
+        centers = (np.cumsum(self.weights) - self.weights / 2) / total
+        positions = np.concatenate([[0.0], centers, [1.0]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return [float(v) for v in np.interp(qs, positions, values)]
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # The quantile at the middle of each centroid, on the k1 scale
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        groups = np.floor(k - k.min()).astype(np.int64)
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+
+@dataclass
+class _ColumnProfile:
+    stats: ColumnStats
+    distinct: Optional[HyperLogLog] = None
+    values: Optional[TDigest] = None
+    lengths: Optional[TDigest] = None
+    norms: Optional[TDigest] = None
+
+
+class _StatsCollector:
+    """Accumulates the stats of every column, one table at a time."""
+
+    def __init__(self) -> None:
+        self._profiles: Dict[str, _ColumnProfile] = {}
+
+    def add(self, table: pa.Table) -> None:
+        for name in table.column_names:
+            column = table[name]
+            profile = self._profiles.get(name)
+            if profile is None:
+                profile = _new_profile(name, column.type)
+                self._profiles[name] = profile
+            try:
+                _add_column(profile, column)
+            except Exception:
+                # Stats are optional: they must never make an upload fail.
+                logger.warning(
+                    "Could not compute stats of column '%s'", name, exc_info=True
+                )
+                profile.distinct = profile.values = None
+                profile.lengths = profile.norms = None
+
+    def result(self) -> Dict[str, ColumnStats]:
+        result = {}
+        for name, profile in self._profiles.items():
+            stats = profile.stats
+            if profile.distinct is not None:
+                stats.distinct_count = min(
+                    profile.distinct.estimate(), stats.count - stats.null_count
+                )
+            if profile.values is not None:
+                stats.quantiles = profile.values.quantiles(QUANTILES)
+            if profile.lengths is not None:
+                stats.length_quantiles = profile.lengths.quantiles(QUANTILES)
+            if profile.norms is not None:
+                stats.norm_quantiles = profile.norms.quantiles(QUANTILES)
+            result[name] = stats
+        return result
+
+
+def _new_profile(name: str, type_: pa.DataType) -> _ColumnProfile:
+    profile = _ColumnProfile(ColumnStats(name=name, type=str(type_)))
+    value_type = _value_type(type_)
+    if _is_comparable(value_type):
+        profile.distinct = HyperLogLog()
+    if _is_number(value_type):
+        profile.values = TDigest()
+    if _is_text(value_type):
+        profile.lengths = TDigest()
+    if _is_list(value_type) and _is_number(value_type.value_type):
+        profile.norms = TDigest()
+    return profile
+
+
+def _add_column(profile: _ColumnProfile, column: pa.ChunkedArray) -> None:
+    stats = profile.stats
+    stats.count += len(column)
+    stats.null_count += column.null_count
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    values = pc.drop_null(column.combine_chunks())
+    if len(values) == 0:
+        return
+    if pa.types.is_float16(values.type):
+        # Few kernels support half floats.
+        values = pa.array(values.to_numpy(zero_copy_only=False).astype(np.float32))
+
+    if profile.distinct is not None:
+        _add_min_max(stats, values)
+        profile.distinct.add(_hash_values(values))
+    if profile.values is not None:
+        profile.values.add(values.to_numpy(zero_copy_only=False).astype(np.float64))
+    if profile.lengths is not None:
+        length = pc.utf8_length if _is_string(values.type) else pc.binary_length
+        profile.lengths.add(length(values).to_numpy().astype(np.float64))
+    if profile.norms is not None:
+        flat = pc.list_flatten(values).to_numpy(zero_copy_only=False)
+        row_of_value = pc.list_parent_indices(values).to_numpy()
+        squares = np.zeros(len(values))
+        np.add.at(squares, row_of_value, np.square(flat.astype(np.float64)))
+        profile.norms.add(np.sqrt(squares))
+
+
+def _add_min_max(stats: ColumnStats, values: pa.Array) -> None:
+    try:
+        min_max = pc.min_max(values)
+    except pa.ArrowNotImplementedError:
+        # ex: durations
+        return
+    low, high = min_max["min"].as_py(), min_max["max"].as_py()
+    stats.min = low if stats.min is None else min(stats.min, low)
+    stats.max = high if stats.max is None else max(stats.max, high)
+
+
+def _hash_values(values: pa.Array) -> np.ndarray:
+    """Hash values to 64 bits, vectorized. Equal values get equal hashes."""
+    if _is_text(values.type):
+        return _hash_strings(values)
+    if pa.types.is_boolean(values.type):
+        bits = values.to_numpy(zero_copy_only=False).astype(np.uint64)
+    elif pa.types.is_floating(values.type):
+        bits = values.to_numpy().astype(np.float64).view(np.uint64)
+    elif pa.types.is_temporal(values.type):
+        # Dates and times, as the integers they are stored as
+        storage = pa.int32() if values.type.bit_width == 32 else pa.int64()
+        bits = values.view(storage).to_numpy().astype(np.int64).view(np.uint64)
+    else:
+        bits = values.to_numpy().astype(np.uint64)
+    return _mix(bits)
+
+
+def _hash_strings(values: pa.Array) -> np.ndarray:
+    """Hash strings by their bytes, as a polynomial, without python loops.
+
+    The hash of bytes b_0 ... b_n is sum(b_i * M^i) modulo 2^64, computed for all
+    strings at once from cumulative sums over the whole data buffer.
+    """
+    values = values.cast(pa.large_binary())
+    offsets = np.frombuffer(values.buffers()[1], dtype=np.int64)[
+        values.offset : values.offset + len(values) + 1
+    ]
+    data = values.buffers()[2]
+    data_bytes = (
+        np.frombuffer(data, dtype=np.uint8) if data is not None else np.zeros(0, np.uint8)
+    )
+    hashes = np.empty(len(values), dtype=np.uint64)
+    inverse = np.uint64(pow(int(_HASH_MULTIPLIER), -1, 1 << 64))
+    start = 0
+    while start < len(values):
+        # Strings covering about a chunk of bytes
+        end = int(np.searchsorted(offsets, offsets[start] + _HASH_CHUNK_BYTES, "right"))
+        end = min(max(end - 1, start + 1), len(values))
+        first, last = int(offsets[start]), int(offsets[end])
+        chunk = data_bytes[first:last].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            powers = np.cumprod(np.full(len(chunk), _HASH_MULTIPLIER, dtype=np.uint64))
+            inverse_powers = np.cumprod(np.full(len(chunk) + 1, inverse, dtype=np.uint64))
+            sums = np.concatenate([[np.uint64(0)], np.cumsum(chunk * powers)])
+            local = offsets[start : end + 1] - first
+            # Strip the powers of the preceding bytes from each string's sum.
+            hashes[start:end] = (sums[local[1:]] - sums[local[:-1]]) * inverse_powers[
+                local[:-1]
+            ]
+            hashes[start:end] += (local[1:] - local[:-1]).astype(np.uint64)
+        start = end
+    return _mix(hashes)
+
+
+def _mix(bits: np.ndarray) -> np.ndarray:
+    """Spread the bits of 64 bit values over the whole hash (splitmix64)."""
+    with np.errstate(over="ignore"):
+        z = bits + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _value_type(type_: pa.DataType) -> pa.DataType:
+    return type_.value_type if pa.types.is_dictionary(type_) else type_
+
+
+def _is_number(type_: pa.DataType) -> bool:
+    return pa.types.is_integer(type_) or pa.types.is_floating(type_)
+
+
+def _is_string(type_: pa.DataType) -> bool:
+    return pa.types.is_string(type_) or pa.types.is_large_string(type_)
+
+
+def _is_text(type_: pa.DataType) -> bool:
+    return (
+        _is_string(type_) or pa.types.is_binary(type_) or pa.types.is_large_binary(type_)
+    )
+
+
+def _is_list(type_: pa.DataType) -> bool:
+    return (
+        pa.types.is_list(type_)
+        or pa.types.is_large_list(type_)
+        or pa.types.is_fixed_size_list(type_)
+    )
+
+
+def _is_comparable(type_: pa.DataType) -> bool:
+    return (
+        _is_number(type_)
+        or _is_text(type_)
+        or pa.types.is_boolean(type_)
+        or pa.types.is_temporal(type_)
+    )
+
+
+def _to_json_value(value: Any) -> Union[None, bool, int, float, str]:
+    if isinstance(value, float) and not math.isfinite(value):
+        # Not allowed in JSON
+        return None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, bytes):
+        return None
+    # ex: dates and times
+    return str(value)
+
+
+def _to_json_list(values: Optional[List[float]]) -> Optional[List[Optional[float]]]:
+    if values is None:
+        return None
+    return [value if math.isfinite(value) else None for value in values]
@@ -0,0 +1,592 @@
+"""A local emulator of the Airtrain API, for testing code that uploads data.
+
+The emulator speaks the same HTTP protocol as the real API, so uploads through
+it exercise the whole SDK, including the HTTP client:
+
+```python
+from airtrain.testing import Fault, LocalAirtrainApi
+
+with LocalAirtrainApi() as api:
+    result = at.upload_from_dicts(rows, client=api.client())
+    table = api.dataset(result.id).table()
+```
+
+Latency, limited bandwidth, and failures can be injected to test how uploads
+behave under realistic conditions:
+
+```python
+faults = [
+    # the first two part uploads are throttled by the server
+    Fault("PUT storage", status_code=429, retry_after=1, on_requests=[1, 2]),
+    # a tenth of part uploads lose their connection
+    Fault("PUT storage", drop_connection=True, probability=0.1),
+    # upload targets only accept data slowly
+    Fault("PUT storage", bytes_per_second=1e6),
+]
+with LocalAirtrainApi(latency_seconds=0.05, faults=faults, seed=42) as api:
+    ...
+```
+"""
+
+import io
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from airtrain.client import AirtrainClient, IngestJobState
+from airtrain.sidecar import join_embeddings, read_sidecar, sidecar_part_id
+
+
+logger = logging.getLogger(__name__)
+
+
+_HOST: str = "127.0.0.1"
+_API_KEY: str = "local-api-key"
+_DEFAULT_ROW_LIMIT: int = 1_000_000
+_READ_CHUNK_SIZE: int = 64 * 1024
+_POLL_INTERVAL_SECONDS: float = 0.05
+_DATASET_PATH = re.compile(r"^/dataset/(?P<dataset_id>[^/]+)/(?P<action>source|ingest)$")
+_STORAGE_PATH = re.compile(r"^/storage/(?P<dataset_id>[^/]+)/(?P<target_id>[^/]+)$")
+_INGEST_JOB_PATH = re.compile(r"^/ingestion-job/(?P<job_id>[^/]+)$")
+
+# The endpoints of the emulated API, as used to count requests and target faults.
+ENDPOINTS: Tuple[str, ...] = (
+    "POST dataset",
+    "PUT dataset/source",
+    "PUT storage",
+    "POST dataset/ingest",
+    "GET ingestion-job",
+    "POST ingestion-job/status",
+)
+_ANY_ENDPOINT: str = "*"
+
+
+@dataclass
+class Fault:
+    """A failure or slowdown to inject into requests to the emulated API.
+
+    A fault applies to requests to its endpoint. By default it applies to every
+    such request, which can be narrowed down with `on_requests`, `probability`,
+    and `max_times`. Delays and bandwidth limits of all applicable faults are
+    combined; the first applicable failure (error status or dropped connection)
+    determines the response.
+
+    Parameters
+    ----------
+    endpoint:
+        One of `ENDPOINTS`, or "*" for all of them. Requests to upload targets
+        are "PUT storage".
+    status_code:
+        Respond with this (error) status code instead of handling the request.
+    retry_after:
+        With `status_code`, the value for the Retry-After header, in seconds.
+    drop_connection:
+        Close the connection after reading the request, without responding.
+    delay_seconds:
+        Extra time to wait before responding.
+    bytes_per_second:
+        Read the request body no faster than this.
+    on_requests:
+        Only apply to these requests to the endpoint, numbered from 1.
+    probability:
+        Apply to each request with this probability.
+    max_times:
+        Apply at most this many times.
+    """
+
+    endpoint: str
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+    drop_connection: bool = False
+    delay_seconds: float = 0.0
+    bytes_per_second: Optional[float] = None
+    on_requests: Optional[Collection[int]] = None
+    probability: float = 1.0
+    max_times: Optional[int] = None
+    times_applied: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        if self.endpoint not in ENDPOINTS + (_ANY_ENDPOINT,):
+            raise ValueError(
+                f"Unknown endpoint '{self.endpoint}'. Must be one of {ENDPOINTS} or "
+                f"'{_ANY_ENDPOINT}'"
+            )
+        if self.status_code is not None and self.status_code < 400:
+            raise ValueError("Faults may only respond with error status codes.")
+
+    @property
+    def is_failure(self) -> bool:
+        return self.status_code is not None or self.drop_connection
+
+    def _applies_to(self, endpoint: str, request_number: int, rng: random.Random) -> bool:
+        if self.endpoint not in (endpoint, _ANY_ENDPOINT):
+            return False
+        if self.on_requests is not None and request_number not in self.on_requests:
+            return False
+        if self.max_times is not None and self.times_applied >= self.max_times:
+            return False
+        return self.probability >= 1.0 or rng.random() < self.probability
+
+
+@dataclass
+class InjectedFault:
+    """A record of a fault having been applied to a request."""
+
+    endpoint: str
+    request_number: int
+    fault: Fault
+
+
+@dataclass
+class LocalDataset:
+    """A dataset created on the local stand-in."""
+
+    id: str
+    name: str
+    embedding_column: Optional[str]
+    # Upload targets handed out by the source redirect, in order. Targets that are
+    # never uploaded to are never read from.
+    targets: List[str] = field(default_factory=list)
+    # Uploaded parts, by target id, in the order their uploads completed.
+    parts: Dict[str, bytes] = field(default_factory=dict)
+    # The query parameters each target was requested with, ex: its format
+    target_params: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    ingest_job_id: Optional[str] = None
+    ingest_triggered_at: Optional[float] = None
+    # Set to make the ingestion job report this state, ex: IngestJobState.FAILED
+    ingest_state: Optional[str] = None
+    # The column stats sent when triggering ingestion, if any
+    column_stats: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def ingested(self) -> bool:
+        return self.ingest_job_id is not None
+
+    def table(self) -> pa.Table:
+        """Read all uploaded parts back as one table.
+
+        Embedding sidecars are joined back into the parts they belong to.
+        """
+        sidecars = {}
+        tables = []
+        for target_id, part in self.parts.items():
+            params = self.target_params.get(target_id, {})
+            if params.get("format") == "embeddings":
+                part_id, matrix = read_sidecar(
+                    part, params["dtype"], int(params["dimensions"])
+                )
+                sidecars[part_id] = matrix
+            else:
+                tables.append(pq.read_table(io.BytesIO(part)))
+        for i, table in enumerate(tables):
+            part_id = sidecar_part_id(table)
+            if part_id is not None:
+                if part_id not in sidecars:
+                    raise ValueError(f"No embeddings sidecar uploaded for '{part_id}'")
+                tables[i] = join_embeddings(table, sidecars[part_id])
+        if len(tables) == 0:
+            raise ValueError(f"No data was uploaded to dataset '{self.id}'")
+        return pa.concat_tables(tables)
+
+
+class LocalAirtrainApi:
+    """A local HTTP server mimicking the Airtrain API endpoints used by the SDK.
+
+    Parameters
+    ----------
+    row_limit:
+        The row limit returned for every created dataset.
+    api_key:
+        The API key the server requires callers to use.
+    latency_seconds:
+        A delay added before responding to every request, to simulate the
+        round trip time to a remote server.
+    bandwidth_bytes_per_second:
+        Optionally, the rate at which each connection may send request bodies
+        to the server. Unlimited if not provided.
+    faults:
+        Failures and slowdowns to inject. More may be added with `add_fault`.
+    seed:
+        Seed for the randomness of faults with a probability.
+    ingest_seconds:
+        How long ingestion jobs run for, before they report having succeeded.
+    """
+
+    def __init__(
+        self,
+        row_limit: int = _DEFAULT_ROW_LIMIT,
+        api_key: str = _API_KEY,
+        latency_seconds: float = 0.0,
+        bandwidth_bytes_per_second: Optional[float] = None,
+        faults: Optional[List[Fault]] = None,
+        seed: Optional[int] = None,
+        ingest_seconds: float = 0.0,
+    ) -> None:
+        self.row_limit = row_limit
+        self.ingest_seconds = ingest_seconds
+        self.api_key = api_key
+        self.latency_seconds = latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.datasets: Dict[str, LocalDataset] = {}
+        # Number of requests received, by endpoint. See ENDPOINTS.
+        self.request_counts: Dict[str, int] = {}
+        self.faults: List[Fault] = list(faults or [])
+        self.injected_faults: List[InjectedFault] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("The local API is not running.")
+        return f"http://{_HOST}:{self._server.server_port}"
+
+    def start(self) -> "LocalAirtrainApi":
+        """Start serving in a background thread."""
+        if self._server is not None:
+            return self
+        self._server = ThreadingHTTPServer((_HOST, 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            kwargs={"poll_interval": _POLL_INTERVAL_SECONDS},
+            name="airtrain-local-api",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self) -> "LocalAirtrainApi":
+        return self.start()
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+    def client(self, **kwargs: Any) -> AirtrainClient:
+        """Get a new client that talks to this server.
+
+        Parameters
+        ----------
+        kwargs:
+            Passed on to `AirtrainClient`.
+        """
+        return AirtrainClient(api_key=self.api_key, base_url=self.url, **kwargs)
+
+    def dataset(self, dataset_id: str) -> LocalDataset:
+        with self._lock:
+            return self.datasets[dataset_id]
+
+    def add_fault(self, fault: Fault) -> None:
+        """Start injecting a fault into requests."""
+        with self._lock:
+            self.faults.append(fault)
+
+    def clear_faults(self) -> None:
+        """Stop injecting faults into requests."""
+        with self._lock:
+            self.faults.clear()
+
+    def _count(self, endpoint: str) -> Tuple[int, List[Fault]]:
+        """Count a request, and get its number and the faults that apply to it."""
+        with self._lock:
+            request_number = self.request_counts.get(endpoint, 0) + 1
+            self.request_counts[endpoint] = request_number
+            faults = [
+                fault
+                for fault in self.faults
+                if fault._applies_to(endpoint, request_number, self._rng)
+            ]
+            for fault in faults:
+                fault.times_applied += 1
+                self.injected_faults.append(
+                    InjectedFault(endpoint, request_number, fault)
+                )
+        return request_number, faults
+
+    def _handle(self, handler: "_Handler") -> None:
+        path = urlsplit(handler.path).path
+        route = self._route(handler.command, path)
+        if route is None:
+            handler.read_body()
+            handler.send_json(404, {"errorMessage": f"No route for {path}"})
+            return
+        endpoint, respond = route
+        _, faults = self._count(endpoint)
+
+        bandwidth_limits = [
+            limit
+            for limit in [self.bandwidth_bytes_per_second]
+            + [fault.bytes_per_second for fault in faults]
+            if limit is not None
+        ]
+        body = handler.read_body(min(bandwidth_limits, default=None))
+        delay = self.latency_seconds + sum(fault.delay_seconds for fault in faults)
+        if delay > 0:
+            time.sleep(delay)
+
+        failure = next((fault for fault in faults if fault.is_failure), None)
+        if failure is not None and failure.drop_connection:
+            handler.drop_connection()
+        elif failure is not None and failure.status_code is not None:
+            headers = {}
+            if failure.retry_after is not None:
+                headers["Retry-After"] = str(failure.retry_after)
+            handler.send_json(
+                failure.status_code,
+                {"errorMessage": f"Injected fault for {endpoint}"},
+                headers,
+            )
+        else:
+            respond(handler, body)
+
+    def _route(
+        self, method: str, path: str
+    ) -> Optional[Tuple[str, Callable[["_Handler", bytes], None]]]:
+        storage_match = _STORAGE_PATH.match(path)
+        if method == "PUT" and storage_match is not None:
+            dataset_id, target_id = storage_match.group("dataset_id", "target_id")
+            return "PUT storage", lambda handler, body: self._store_part(
+                handler, body, dataset_id, target_id
+            )
+
+        if method == "POST" and path == "/dataset":
+            return "POST dataset", self._authorized(
+                lambda handler, body: self._create_dataset(handler, json.loads(body))
+            )
+
+        if method == "POST" and path == "/ingestion-job/status":
+            return "POST ingestion-job/status", self._authorized(
+                lambda handler, body: self._ingest_job_statuses(
+                    handler, json.loads(body).get("ingestionJobIds", [])
+                )
+            )
+        job_match = _INGEST_JOB_PATH.match(path)
+        if method == "GET" and job_match is not None:
+            job_id = job_match.group("job_id")
+            return "GET ingestion-job", self._authorized(
+                lambda handler, body: self._ingest_job_status(handler, job_id)
+            )
+
+        dataset_match = _DATASET_PATH.match(path)
+        if dataset_match is None:
+            return None
+        dataset_id, action = dataset_match.group("dataset_id", "action")
+        if method == "PUT" and action == "source":
+            return "PUT dataset/source", self._authorized(
+                lambda handler, body: self._redirect_to_storage(handler, dataset_id)
+            )
+        if method == "POST" and action == "ingest":
+            return "POST dataset/ingest", self._authorized(
+                lambda handler, body: self._ingest(
+                    handler, dataset_id, json.loads(body or b"{}")
+                )
+            )
+        return None
+
+    def _authorized(
+        self, respond: Callable[["_Handler", bytes], None]
+    ) -> Callable[["_Handler", bytes], None]:
+        def respond_if_authorized(handler: "_Handler", body: bytes) -> None:
+            if handler.headers.get("Authorization") != f"Bearer {self.api_key}":
+                handler.send_json(401, {"errorMessage": "Invalid API key"})
+            else:
+                respond(handler, body)
+
+        return respond_if_authorized
+
+    def _get_dataset(
+        self, handler: "_Handler", dataset_id: str
+    ) -> Optional[LocalDataset]:
+        with self._lock:
+            dataset = self.datasets.get(dataset_id)
+        if dataset is None:
+            handler.send_json(404, {"errorMessage": f"No dataset '{dataset_id}'"})
+        return dataset
+
+    def _create_dataset(self, handler: "_Handler", request: Dict[str, Any]) -> None:
+        dataset = LocalDataset(
+            id=uuid.uuid4().hex,
+            name=request.get("name") or "",
+            embedding_column=request.get("embeddingColumn"),
+        )
+        with self._lock:
+            self.datasets[dataset.id] = dataset
+        handler.send_json(
+            200, {"data": {"datasetId": dataset.id, "rowLimit": self.row_limit}}
+        )
+
+    def _redirect_to_storage(self, handler: "_Handler", dataset_id: str) -> None:
+        dataset = self._get_dataset(handler, dataset_id)
+        if dataset is None:
+            return
+        target_id = uuid.uuid4().hex
+        with self._lock:
+            dataset.targets.append(target_id)
+            dataset.target_params[target_id] = dict(
+                parse_qsl(urlsplit(handler.path).query)
+            )
+        handler.send_response(307)
+        handler.send_header("Location", f"{self.url}/storage/{dataset.id}/{target_id}")
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    def _store_part(
+        self, handler: "_Handler", body: bytes, dataset_id: str, target_id: str
+    ) -> None:
+        with self._lock:
+            dataset = self.datasets.get(dataset_id)
+            is_valid_target = dataset is not None and target_id in dataset.targets
+            if dataset is not None and is_valid_target:
+                dataset.parts[target_id] = body
+        if not is_valid_target:
+            handler.send_json(403, {"errorMessage": "Invalid upload target"})
+            return
+        handler.send_json(200, {})
+
+    def _ingest(
+        self, handler: "_Handler", dataset_id: str, content: Dict[str, Any]
+    ) -> None:
+        dataset = self._get_dataset(handler, dataset_id)
+        if dataset is None:
+            return
+        with self._lock:
+            if dataset.ingest_job_id is None:
+                dataset.ingest_job_id = uuid.uuid4().hex
+                dataset.ingest_triggered_at = time.monotonic()
+                dataset.column_stats = content.get("columnStats")
+            job_id = dataset.ingest_job_id
+        handler.send_json(200, {"data": {"ingestionJobId": job_id}})
+
+    def _ingest_job_status(self, handler: "_Handler", job_id: str) -> None:
+        status = self._find_ingest_job(job_id)
+        if status is None:
+            handler.send_json(404, {"errorMessage": f"No ingestion job '{job_id}'"})
+        else:
+            handler.send_json(200, {"data": status})
+
+    def _ingest_job_statuses(self, handler: "_Handler", job_ids: List[str]) -> None:
+        statuses = [self._find_ingest_job(job_id) for job_id in job_ids]
+        handler.send_json(
+            200,
+            {"data": {"ingestionJobs": [status for status in statuses if status]}},
+        )
+
+    def _find_ingest_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            dataset = next(
+                (d for d in self.datasets.values() if d.ingest_job_id == job_id), None
+            )
+            if dataset is None or dataset.ingest_triggered_at is None:
+                return None
+            state = dataset.ingest_state
+            if state is None:
+                elapsed = time.monotonic() - dataset.ingest_triggered_at
+                done = elapsed >= self.ingest_seconds
+                state = IngestJobState.SUCCEEDED if done else IngestJobState.RUNNING
+        status: Dict[str, Any] = {"ingestionJobId": job_id, "status": state}
+        if state == IngestJobState.FAILED:
+            status["errorMessage"] = "Ingestion failed"
+        return status
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api: LocalAirtrainApi
+
+    def do_GET(self) -> None:
+        self.api._handle(self)
+
+    def do_POST(self) -> None:
+        self.api._handle(self)
+
+    def do_PUT(self) -> None:
+        self.api._handle(self)
+
+    def read_body(self, bytes_per_second: Optional[float] = None) -> bytes:
+        started = time.monotonic()
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            n_bytes = 0
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    # skip any trailers, up to the final blank line
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                n_bytes += size
+                _throttle(started, n_bytes, bytes_per_second)
+            return b"".join(chunks)
+
+        expected = int(self.headers.get("Content-Length", 0))
+        chunks = []
+        n_bytes = 0
+        while n_bytes < expected:
+            chunk = self.rfile.read(min(expected - n_bytes, _READ_CHUNK_SIZE))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            n_bytes += len(chunk)
+            _throttle(started, n_bytes, bytes_per_second)
+        return b"".join(chunks)
+
+    def send_json(
+        self,
+        status_code: int,
+        content: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        encoded = json.dumps(content).encode("utf8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def drop_connection(self) -> None:
+        self.close_connection = True
+        self.connection.shutdown(socket.SHUT_RDWR)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format, *args)
+
+
+def _throttle(started: float, n_bytes: int, bytes_per_second: Optional[float]) -> None:
+    if bytes_per_second is None:
+        return
+    ahead_by = n_bytes / bytes_per_second - (time.monotonic() - started)
+    if ahead_by > 0:
+        time.sleep(ahead_by)
+
+
+def _make_handler(api: LocalAirtrainApi) -> type:
+    return type("_LocalApiHandler", (_Handler,), {"api": api})
@@ -1,7 +1,7 @@
 import io
 import uuid
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from unittest.mock import patch, MagicMock
 
 import pyarrow as pa
@@ -44,7 +44,9 @@ class MockAirtrainClient(AirtrainClient):
     def get_fake_dataset(self, dataset_id: str) -> FakeDataset:
         return self._fake_datasets[dataset_id]
 
-    def trigger_dataset_ingest(self, dataset_id: str) -> TriggerIngestResponse:
+    def trigger_dataset_ingest(
+        self, dataset_id: str, column_stats: Optional[List[Dict[str, Any]]] = None
+    ) -> TriggerIngestResponse:
         job_id = uuid.uuid4().hex
         if dataset_id not in self._fake_datasets:
             raise NotFoundError("Dataset not uploaded first")
@@ -1,8 +1,10 @@
 import io
 import itertools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock
 
+import httpx
 import pytest
 
 from airtrain.client import (
@@ -10,12 +12,21 @@ from airtrain.client import (
     AirtrainClient,
     AuthenticationError,
     BadRequestError,
+    ClientRegistry,
     NotFoundError,
+    RateLimitError,
+    RetryPolicy,
     ServerError,
+    ServiceUnavailableError,
+    TransientServerError,
     client,
+    record_attempts,
+    resolve_client,
     set_api_key,
     _buffer_to_byte_iterable,
+    _parse_retry_after,
 )
+from airtrain.testing import LocalAirtrainApi
 from tests.utils import environment_variables
 
 
@@ -104,13 +115,229 @@ def test_handle_response():
     with pytest.raises(BadRequestError):
         c._handle_response(mock_response, expect_json=True)
 
+    mock_response.status_code = 429
+    with pytest.raises(RateLimitError):
+        c._handle_response(mock_response, expect_json=True)
+
     mock_response.status_code = 500
     with pytest.raises(ServerError):
         c._handle_response(mock_response, expect_json=True)
 
+    mock_response.status_code = 503
+    with pytest.raises(ServiceUnavailableError):
+        c._handle_response(mock_response, expect_json=True)
+
     mock_response.reset_mock()
     mock_response.status_code = 200
     mock_response.json.side_effect = ValueError("A problem has be to your computer")
     with pytest.raises(ServerError):
         c._handle_response(mock_response, expect_json=True)
     c._handle_response(mock_response, expect_json=False)
+
+
+def test_client_registry():
+    registry = ClientRegistry(max_clients=2)
+    foo = registry.get("foo", "https://a.local/")
+    assert registry.get("foo", "https://a.local") is foo
+    assert foo._base_url == "https://a.local"
+
+    bar = registry.get("bar", "https://a.local")
+    assert bar is not foo
+    assert bar._http_client is not foo._http_client
+    assert registry.get("foo", "https://a.local") is foo
+    assert registry.get("foo", "https://b.local") is not foo
+
+    # "bar" was used least recently, so it was evicted.
+    assert len(registry) == 2
+    assert registry.get("foo", "https://a.local") is foo
+    assert registry.get("bar", "https://a.local") is not bar
+
+    registry.clear()
+    assert len(registry) == 0
+
+    with pytest.raises(ValueError):
+        ClientRegistry(max_clients=0)
+
+
+def test_client_registry_threads():
+    registry = ClientRegistry()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda i: registry.get(f"key-{i % 4}"), range(0, 64)))
+    assert len(registry) == 4
+    assert len({id(c) for c in clients}) == 4
+
+
+def test_resolve_client():
+    client.cache_clear()
+    set_api_key("secret")
+    assert resolve_client() is client()
+
+    explicit = AirtrainClient(api_key="explicit")
+    assert resolve_client(explicit) is explicit
+    with pytest.raises(ValueError):
+        resolve_client(explicit, api_key="other")
+
+    tenant = resolve_client(api_key="tenant")
+    assert tenant._api_key == "tenant"
+    assert resolve_client(api_key="tenant") is tenant
+    assert tenant is not client()
+
+    # the default key is used if only a base url is given
+    other_url = resolve_client(base_url="https://other.local")
+    assert other_url._api_key == "secret"
+    assert other_url._base_url == "https://other.local"
+
+
+def _client_with_transport(handler, tries=3) -> AirtrainClient:
+    c = AirtrainClient(
+        api_key="secret",
+        base_url="https://fake.local",
+        retry_policy=RetryPolicy(tries=tries, delay=0, jitter=(0, 0)),
+    )
+    c._http_client = httpx.Client(transport=httpx.MockTransport(handler))
+    return c
+
+
+def test_put_bytes_retries_storage_without_rereading():
+    storage_attempts = []
+    redirects = itertools.count()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "fake.local":
+            next(redirects)
+            return httpx.Response(307, headers={"Location": "https://storage.local/part"})
+        storage_attempts.append(request.read())
+        if len(storage_attempts) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        if len(storage_attempts) == 2:
+            raise httpx.ReadError("connection reset", request=request)
+        return httpx.Response(200)
+
+    c = _client_with_transport(handler)
+    content = b"some encoded part" * 1000
+    with record_attempts() as attempts:
+        c.upload_dataset_data("abc", io.BytesIO(content))
+
+    assert storage_attempts == [content, content, content]
+    assert next(redirects) == 1
+    assert [a.operation for a in attempts] == [
+        "PUT dataset/abc/source",
+        "PUT storage",
+        "PUT storage",
+        "PUT storage",
+    ]
+    assert attempts[1].status_code == 503
+    assert not attempts[2].succeeded
+    assert attempts[3].succeeded
+
+
+def test_put_bytes_streams_from_factory_per_attempt():
+    storage_attempts = []
+    calls = itertools.count()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "fake.local":
+            return httpx.Response(307, headers={"Location": "https://storage.local/part"})
+        storage_attempts.append(
+            (request.headers.get("Transfer-Encoding"), request.read())
+        )
+        if len(storage_attempts) == 1:
+            return httpx.Response(503, headers={"Retry-After": "0"})
+        return httpx.Response(200)
+
+    def chunks():
+        next(calls)
+        yield b"first chunk, "
+        yield b"second chunk"
+
+    c = _client_with_transport(handler)
+    c.upload_dataset_data("abc", chunks)
+
+    expected = ("chunked", b"first chunk, second chunk")
+    assert storage_attempts == [expected, expected]
+    assert next(calls) == 2
+
+
+def test_post_json_retries_only_unprocessed():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(500),
+        httpx.Response(200, json={"data": {"ingestionJobId": "job"}}),
+    ]
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return responses[len(seen) - 1]
+
+    recorded = []
+    c = _client_with_transport(handler)
+    c.retry_policy.on_attempt = recorded.append
+
+    # The 429 is retried, but the 500 may have triggered the ingest.
+    with pytest.raises(TransientServerError):
+        c.trigger_dataset_ingest("abc")
+    assert len(seen) == 2
+    assert [a.status_code for a in recorded] == [429, 500]
+
+    # Idempotent requests retry after both.
+    seen.clear()
+    assert c._post_json("foo", {}, idempotent=True) == {"ingestionJobId": "job"}
+    assert len(seen) == 3
+
+
+def test_retry_budget():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503, headers={"Retry-After": "3600"})
+
+    c = _client_with_transport(handler, tries=5)
+    c.retry_policy.max_total_delay = 10
+    with record_attempts() as attempts:
+        with pytest.raises(ServiceUnavailableError):
+            c.create_dataset("foo", None)
+    # waiting for the Retry-After would exceed the budget
+    assert len(attempts) == 1
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after("12") == 12.0
+    assert _parse_retry_after("-1") == 0.0
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert _parse_retry_after("soon") is None
+    assert _parse_retry_after(None) is None
+
+
+def test_upload_target_prefetch():
+    with LocalAirtrainApi() as api:
+        c = api.client(upload_target_prefetch=2)
+        dataset_id = c.create_dataset("foo", None).dataset_id
+
+        c.upload_dataset_data(dataset_id, io.BytesIO(b"first"))
+        # A single upload doesn't prefetch anything.
+        assert api.request_counts["PUT dataset/source"] == 1
+
+        for i in range(0, 5):
+            c.upload_dataset_data(dataset_id, io.BytesIO(f"part {i}".encode()))
+        c.trigger_dataset_ingest(dataset_id)
+
+        dataset = api.dataset(dataset_id)
+        assert sorted(dataset.parts.values()) == sorted(
+            [b"first"] + [f"part {i}".encode() for i in range(0, 5)]
+        )
+        # At most the prefetched targets go unused.
+        assert 6 <= len(dataset.targets) <= 8
+        assert dataset.ingested
+
+
+def test_upload_target_prefetch_disabled():
+    with LocalAirtrainApi() as api:
+        c = api.client(upload_target_prefetch=0)
+        dataset_id = c.create_dataset("foo", None).dataset_id
+        for i in range(0, 3):
+            c.upload_dataset_data(dataset_id, io.BytesIO(f"part {i}".encode()))
+        assert api.request_counts["PUT dataset/source"] == 3
+        assert list(api.dataset(dataset_id).parts.values()) == [
+            b"part 0",
+            b"part 1",
+            b"part 2",
+        ]
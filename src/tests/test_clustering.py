@@ -0,0 +1,75 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from airtrain.clustering import (
+    Clustering,
+    _Clusterer,
+    _similarity_hash,
+    cluster_table,
+)
+
+
+def test_cluster_table_sort_by():
+    table = pa.table({"kind": ["b", "a", "b", "a"], "id": [4, 3, 2, 1]})
+    clustered = cluster_table(table, Clustering(sort_by=["kind", "id"]))
+    assert clustered["kind"].to_pylist() == ["a", "a", "b", "b"]
+    assert clustered["id"].to_pylist() == [1, 3, 2, 4]
+
+    clustered = cluster_table(table, Clustering(sort_by="id"))
+    assert clustered["id"].to_pylist() == [1, 2, 3, 4]
+
+
+def test_cluster_table_similar_by():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((2, 32))
+    labels = np.arange(200) % 2
+    embeddings = centers[labels] + 0.01 * rng.standard_normal((200, 32))
+    table = pa.table(
+        {
+            "label": labels,
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.reshape(-1)), 32
+            ),
+        }
+    )
+    clustered = cluster_table(table, Clustering(similar_by="embedding"))
+    ordered_labels = clustered["label"].to_pylist()
+    # Rows with nearby embeddings end up together.
+    assert sum(a != b for a, b in zip(ordered_labels, ordered_labels[1:])) < 10
+
+
+def test_similarity_hash():
+    table = pa.table({"embedding": [[1.0, 0.5], [2.0, 1.0], [-1.0, -0.5]]})
+    hashes = _similarity_hash(table, "embedding", 64)
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[1]
+    assert hashes[0] != hashes[2]
+    with pytest.raises(TypeError, match="must contain embeddings"):
+        _similarity_hash(pa.table({"x": [1]}), "x", 8)
+
+
+def test_clusterer_size_ratio():
+    n = 20_000
+    rng = np.random.default_rng(0)
+    words = np.array(["alpha", "beta", "gamma", "delta"])
+    table = pa.table(
+        {
+            "kind": words[rng.integers(0, 4, n)],
+            "value": rng.integers(0, 4, n) * 1000,
+        }
+    )
+    clusterer = _Clusterer(Clustering(sort_by=["kind", "value"]))
+    clustered = clusterer.cluster(table)
+    assert clustered.num_rows == n
+    assert clusterer.size_ratio is not None
+    assert clusterer.size_ratio < 0.5
+
+
+def test_clustering_invalid():
+    with pytest.raises(ValueError, match="Provide columns"):
+        Clustering()
+    with pytest.raises(ValueError, match="similarity_bits"):
+        Clustering(similar_by="embedding", similarity_bits=65)
+    with pytest.raises(ValueError, match="to sort by"):
+        cluster_table(pa.table({"x": [1]}), Clustering(sort_by=["y"]))
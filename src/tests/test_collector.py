@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+
+import pyarrow as pa
+import pytest
+
+from airtrain.collector import (
+    Collector,
+    CollectorSink,
+    _encoded_size,
+    _read_segment,
+    _write_segment,
+)
+from airtrain.testing import LocalAirtrainApi
+
+
+def _produce(sink: CollectorSink, start: int, n_rows: int) -> None:
+    with sink:
+        for i in range(start, start + n_rows, 100):
+            if sink.stopped:
+                break
+            ids = list(range(i, i + 100))
+            sink.write(pa.table({"id": ids, "text": [str(id_) for id_ in ids]}))
+
+
+def test_segment_round_trip():
+    table = pa.table({"id": [1, 2, 3], "embedding": [[1.0, 2.0]] * 3})
+    n_bytes = _encoded_size(table)
+    read = _read_segment(_write_segment(table, n_bytes), n_bytes)
+    assert read.equals(table)
+
+
+def test_collect_from_processes():
+    collector = Collector(max_buffered_bytes=10_000)
+    workers = [
+        multiprocessing.Process(target=_produce, args=(collector.sink(), i * 2000, 2000))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    with LocalAirtrainApi() as api:
+        result = collector.upload(client=api.client(), upload_concurrency=2)
+        table = api.dataset(result.id).table()
+    for worker in workers:
+        worker.join()
+    assert result.size == 8000
+    assert sorted(table["id"].to_pylist()) == list(range(8000))
+    assert table["text"].to_pylist()[:1] == [str(table["id"][0].as_py())]
+
+
+def test_collect_up_to_row_limit():
+    collector = Collector(max_buffered_bytes=10_000)
+    workers = [
+        multiprocessing.Process(
+            target=_produce, args=(collector.sink(), i * 10**6, 10**6)
+        )
+        for i in range(2)
+    ]
+    for worker in workers:
+        worker.start()
+    with LocalAirtrainApi(row_limit=1000) as api:
+        result = collector.upload(client=api.client())
+    # Workers see that the upload stopped, instead of blocking on the buffer.
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+    assert result.size == 1000
+
+
+def test_collector_errors():
+    collector = Collector()
+    with pytest.raises(ValueError, match="Create sinks"):
+        collector.upload()
+    sink = collector.sink()
+    sink.close()
+    with pytest.raises(ValueError, match="closed sink"):
+        sink.write(pa.table({"id": [1]}))
+    with pytest.raises(ValueError, match="max_buffered_bytes"):
+        Collector(max_buffered_bytes=0)
+
+
+def _produce_and_crash(sink: CollectorSink) -> None:
+    sink.write(pa.table({"id": [1, 2, 3]}))
+    os._exit(1)
+
+
+def test_collector_worker_killed(monkeypatch):
+    # The killed worker's last write is never sent, so don't wait long for it.
+    monkeypatch.setattr("airtrain.collector._DRAIN_TIMEOUT_SECONDS", 0.1)
+    collector = Collector()
+    worker = multiprocessing.Process(target=_produce_and_crash, args=(collector.sink(),))
+    worker.start()
+    with LocalAirtrainApi() as api:
+        with pytest.raises(RuntimeError, match="1 of their sinks were never closed"):
+            collector.upload(workers=[worker], client=api.client())
+
+
+def test_collector_timeout():
+    collector = Collector(timeout=0.2)
+    collector.sink()
+    with LocalAirtrainApi() as api:
+        with pytest.raises(TimeoutError, match="1 of them are still open"):
+            collector.upload(client=api.client())
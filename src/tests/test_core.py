@@ -1,15 +1,36 @@
+import datetime
+import os
+import time
 from itertools import count
 
+import numpy as np
 import pyarrow as pa
+import pyarrow.parquet as pq
 import pytest
 
 from airtrain.core import (
     DatasetMetadata,
+    DatasetSpec,
+    upload_from_arrow_stream,
     upload_from_arrow_tables,
+    upload_from_columns,
     upload_from_dicts,
+    upload_many,
     _assert_can_be_written_to_parquet,
+    _batches_to_tables,
+    _column_to_arrow,
     _remove_illegal_parquet_types,
+    _split_into_parts,
+    _StreamedPart,
 )
+from airtrain.client import BadRequestError, RetryPolicy
+from airtrain.clustering import Clustering
+from airtrain.instrumentation import CallbackObserver, UploadObserver
+from airtrain.memory import MemoryBudget
+from airtrain.projection import EmbeddingProjection
+from airtrain.sampling import Sampling
+from airtrain.sparse import SparseKeys
+from airtrain.testing import Fault, LocalAirtrainApi
 from tests.fixtures import MockAirtrainClient, mock_client  # noqa: F401
 
 
@@ -55,6 +76,72 @@ def test_upload_from_dicts_limits(mock_client: MockAirtrainClient):  # noqa: F81
     assert result.size == row_limit
 
 
+def test_upload_from_dicts_sampling(mock_client: MockAirtrainClient):  # noqa: F811
+    data = [{"foo": i, "even": i % 2 == 0} for i in range(1000)]
+    row_limit = mock_client.dataset_row_limit
+    result = upload_from_dicts(data, sampling=Sampling(stratify_by="even", seed=0))
+    assert result.size == row_limit
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table.num_rows == row_limit
+    assert table["even"].to_pylist().count(True) == row_limit // 2
+    assert max(table["foo"].to_pylist()) > row_limit
+
+
+def test_upload_from_arrow_tables_flatten_nested(
+    mock_client: MockAirtrainClient,  # noqa: F811
+):
+    table = pa.Table.from_pylist(
+        [{"doc": {"text": "hi", "vector": [1.0, 2.0]}, "id": i} for i in range(5)]
+    )
+    result = upload_from_arrow_tables(
+        [table], embedding_column="doc.vector", flatten_nested=True
+    )
+    ingested = mock_client.get_fake_dataset(result.id).ingested
+    assert ingested.column_names == ["doc.text", "doc.vector", "id"]
+    assert ingested["doc.text"].to_pylist() == ["hi"] * 5
+
+
+def test_upload_from_dicts_sparse_keys(mock_client: MockAirtrainClient):  # noqa: F811
+    data = [{"id": i, f"attribute_{i % 7}": i} for i in range(50)]
+    result = upload_from_dicts(data, sparse_keys=SparseKeys(min_frequency=0.5))
+    ingested = mock_client.get_fake_dataset(result.id).ingested
+    assert ingested.column_names == ["id", "overflow"]
+    assert ingested["overflow"].to_pylist()[8] == [("attribute_1", "8")]
+
+
+def test_upload_from_dicts_optimize_types(mock_client: MockAirtrainClient):  # noqa: F811
+    data = [{"id": i, "label": "even" if i % 2 == 0 else "odd"} for i in range(100)]
+    result = upload_from_dicts(data, optimize_types=True)
+    assert result.timings.optimized_bytes_saved > 0
+    ingested = mock_client.get_fake_dataset(result.id).ingested
+    assert ingested.schema.field("id").type == pa.int32()
+    assert ingested["label"].to_pylist()[:2] == ["even", "odd"]
+
+
+def test_upload_from_dicts_cluster_rows(mock_client: MockAirtrainClient):  # noqa: F811
+    data = [{"id": i, "kind": ["b", "c", "a"][i % 3]} for i in range(30)]
+    result = upload_from_dicts(data, cluster_rows=Clustering(sort_by=["kind"]))
+    assert result.timings.clustered_size_ratio is not None
+    ingested = mock_client.get_fake_dataset(result.id).ingested
+    assert ingested["kind"].to_pylist() == sorted(row["kind"] for row in data)
+
+
+def test_upload_from_dicts_project_embeddings(
+    mock_client: MockAirtrainClient,  # noqa: F811
+):
+    data = [{"id": i, "embedding": [float(i)] * 32} for i in range(50)]
+    projection = EmbeddingProjection(8, seed=0)
+    result = upload_from_dicts(
+        data, embedding_column="embedding", project_embeddings=projection
+    )
+    assert projection.fitted
+    ingested = mock_client.get_fake_dataset(result.id).ingested
+    assert len(ingested["embedding"][0]) == 8
+
+    with pytest.raises(ValueError, match="requires an embedding_column"):
+        upload_from_dicts(data, project_embeddings=projection)
+
+
 def test_upload_from_dicts_invalid(mock_client: MockAirtrainClient):  # noqa: F811
     data = [{"foo": 42}, {"foo": 43}, {"foo": 44}, {"foo": 45, "bar": "hi"}]
     with pytest.raises(pa.lib.ArrowInvalid):
@@ -167,6 +254,97 @@ def test_upload_from_mismatched_tables(mock_client: MockAirtrainClient):  # noqa
         upload_from_arrow_tables([table_1, table_2], name="My Arrow")
 
 
+def test_upload_from_arrow_stream(mock_client: MockAirtrainClient):  # noqa: F811
+    schema = pa.schema([("foo", pa.int64())])
+    batches = [
+        pa.record_batch([pa.array(range(i, i + 10))], schema=schema) for i in (0, 10)
+    ]
+    reader = pa.RecordBatchReader.from_batches(schema, batches)
+    result = upload_from_arrow_stream(reader, name="Stream")
+    assert result.size == 20
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == list(range(0, 20))
+
+
+def test_upload_from_arrow_c_stream(mock_client: MockAirtrainClient):  # noqa: F811
+    class StreamProducer:
+        def __init__(self, table):
+            self.table = table
+
+        def __arrow_c_stream__(self, requested_schema=None):
+            return self.table.__arrow_c_stream__(requested_schema)
+
+    table = pa.table({"foo": [1, 2, 3], "bar": ["a", "b", "c"]})
+    result = upload_from_arrow_stream(StreamProducer(table))
+    assert mock_client.get_fake_dataset(result.id).ingested == table
+
+    with pytest.raises(TypeError, match="__arrow_c_stream__"):
+        upload_from_arrow_stream([table])
+
+
+def test_batches_to_tables():
+    schema = pa.schema([("foo", pa.int64())])
+    batches = [
+        pa.record_batch([pa.array(range(i, i + 10))], schema=schema)
+        for i in range(0, 100, 10)
+    ]
+    batches.insert(3, pa.record_batch([pa.array([], pa.int64())], schema=schema))
+    reader = pa.RecordBatchReader.from_batches(schema, batches)
+    tables = list(_batches_to_tables(reader, batches[0].nbytes * 4))
+    assert [table.num_rows for table in tables] == [40, 40, 20]
+    assert [table["foo"].num_chunks for table in tables] == [4, 4, 2]
+    assert pa.concat_tables(tables)["foo"].to_pylist() == list(range(0, 100))
+    # The tables reference the batches rather than copying them.
+    assert (
+        tables[0]["foo"].chunk(0).buffers()[1].address
+        == batches[0]["foo"].buffers()[1].address
+    )
+
+
+def test_upload_from_columns(mock_client: MockAirtrainClient):  # noqa: F811
+    embeddings = np.arange(0, 30, dtype=np.float32).reshape(10, 3)
+    result = upload_from_columns(
+        {
+            "id": np.arange(0, 10),
+            "text": [f"text {i}" for i in range(0, 10)],
+            "embedding": embeddings,
+            "score": pa.array([0.5] * 10),
+        },
+        name="Columns",
+        embedding_column="embedding",
+    )
+    assert result.size == 10
+    table = mock_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["id"].to_pylist() == list(range(0, 10))
+    assert table["text"].to_pylist()[3] == "text 3"
+    assert table.schema.field("embedding").type == pa.list_(pa.float32(), 3)
+    assert table["embedding"].to_pylist()[2] == [6.0, 7.0, 8.0]
+    assert table["score"].to_pylist() == [0.5] * 10
+
+
+def test_upload_from_columns_errors(mock_client: MockAirtrainClient):  # noqa: F811
+    with pytest.raises(ValueError, match="same length"):
+        upload_from_columns({"foo": np.arange(0, 10), "bar": np.arange(0, 9)})
+    with pytest.raises(ValueError, match="1 or 2 dimensions"):
+        upload_from_columns({"foo": np.zeros((2, 2, 2))})
+
+
+def test_column_to_arrow_zero_copy():
+    embeddings = np.arange(0, 30, dtype=np.float32).reshape(10, 3)
+    array = _column_to_arrow("embedding", embeddings)
+    assert isinstance(array, pa.FixedSizeListArray)
+    assert array.values.buffers()[1].address == embeddings.ctypes.data
+
+    ids = np.arange(0, 10)
+    assert _column_to_arrow("id", ids).buffers()[1].address == ids.ctypes.data
+
+    # Not C-contiguous, so copied into the right layout
+    transposed = np.arange(0, 6, dtype=np.float64).reshape(3, 2).T
+    assert _column_to_arrow("t", transposed).to_pylist() == [[0, 2, 4], [1, 3, 5]]
+
+
 def test_remove_illegal_parquet_types():
     table = pa.table(
         {
@@ -251,3 +429,370 @@ def test_assert_can_be_written_to_parquet(arrow_type, expected_error_substring):
         raise AssertionError(
             f"Expected error '... {expected_error_substring} ...' did not occur."
         )
+
+
+def test_upload_with_explicit_client():
+    tenant_client = MockAirtrainClient()
+    result = upload_from_dicts([{"foo": 1}, {"foo": 2}], client=tenant_client)
+    table = tenant_client.get_fake_dataset(result.id).ingested
+    assert table is not None
+    assert table["foo"].to_pylist() == [1, 2]
+
+    with pytest.raises(ValueError):
+        upload_from_dicts([{"foo": 1}], client=tenant_client, api_key="other")
+
+
+def test_upload_through_local_api():
+    with LocalAirtrainApi(row_limit=5000) as api:
+        data = ({"foo": i, "bar": str(i)} for i in count())
+        result = upload_from_dicts(data, name="Local", client=api.client())
+        assert result.size == 5000
+        dataset = api.dataset(result.id)
+        assert dataset.name == "Local"
+        assert dataset.ingested
+        table = dataset.table()
+        assert sorted(table["foo"].to_pylist()) == list(range(0, 5000))
+
+
+@pytest.mark.parametrize("stream_encoding", [False, True])
+def test_upload_embedding_sidecar_through_local_api(stream_encoding):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((3000, 16)).astype(np.float32)
+    table = pa.table(
+        {
+            "id": np.arange(3000),
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.reshape(-1)), 16
+            ),
+        }
+    )
+    with LocalAirtrainApi() as api:
+        result = upload_from_arrow_tables(
+            _split_into_parts(table, 50_000),
+            embedding_column="embedding",
+            client=api.client(),
+            upload_concurrency=4,
+            stream_encoding=stream_encoding,
+            embedding_sidecar=True,
+        )
+        assert result.timings is not None
+        assert result.timings.parts > 1
+        dataset = api.dataset(result.id)
+        assert len(dataset.parts) == 2 * result.timings.parts
+        uploaded = dataset.table().sort_by("id")
+    assert uploaded.column_names == ["id", "embedding"]
+    assert uploaded["embedding"].to_pylist() == table["embedding"].to_pylist()
+
+
+@pytest.mark.parametrize("stream_encoding", [False, True])
+def test_upload_embedding_sidecar_small_budget(stream_encoding):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((2000, 64)).astype(np.float32)
+    table = pa.table(
+        {
+            "text": [rng.bytes(100).hex() for _ in range(2000)],
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.reshape(-1)), 64
+            ),
+        }
+    )
+    with LocalAirtrainApi() as api:
+        # The part and its sidecar are each smaller than the budget, but not
+        # both together.
+        result = upload_from_arrow_tables(
+            [table],
+            embedding_column="embedding",
+            client=api.client(),
+            max_inflight_bytes=600_000,
+            stream_encoding=stream_encoding,
+            embedding_sidecar=True,
+        )
+        assert result.size == 2000
+
+
+def test_upload_embedding_sidecar_invalid(tmp_path):
+    table = pa.table({"embedding": [[1.0, 2.0]]})
+    with pytest.raises(ValueError, match="requires an embedding_column"):
+        upload_from_arrow_tables([table], embedding_sidecar=True)
+    with pytest.raises(ValueError, match="cannot have an embedding sidecar"):
+        upload_from_arrow_tables(
+            [table],
+            embedding_column="embedding",
+            embedding_sidecar=True,
+            stage_to=str(tmp_path),
+        )
+
+
+def test_upload_column_stats_through_local_api():
+    table = pa.table({"id": np.arange(3000), "text": ["a", "bb", None] * 1000})
+    with LocalAirtrainApi() as api:
+        result = upload_from_arrow_tables(
+            _split_into_parts(table, 10_000), client=api.client(), column_stats=True
+        )
+        sent = api.dataset(result.id).column_stats
+    assert result.column_stats is not None
+    assert result.column_stats["id"].count == 3000
+    assert (result.column_stats["id"].min, result.column_stats["id"].max) == (0, 2999)
+    assert result.column_stats["text"].null_count == 1000
+    assert result.column_stats["text"].distinct_count == 2
+    assert sent == [column.to_json() for column in result.column_stats.values()]
+
+
+def test_upload_column_stats_of_dates():
+    data = [{"day": datetime.date(2024, 1, 1), "x": 1}] * 10
+    with LocalAirtrainApi() as api:
+        result = upload_from_dicts(data, client=api.client(), column_stats=True)
+        assert api.dataset(result.id).ingested
+    assert result.column_stats is not None
+    assert result.column_stats["day"].max == datetime.date(2024, 1, 1)
+
+
+def test_upload_concurrently_through_local_api():
+    parts = []
+    with LocalAirtrainApi(row_limit=5000, latency_seconds=0.01) as api:
+        data = ({"foo": i, "bar": str(i)} for i in count())
+        result = upload_from_dicts(
+            data,
+            client=api.client(),
+            upload_concurrency=4,
+            observer=CallbackObserver(parts.append),
+        )
+        assert result.size == 5000
+        table = api.dataset(result.id).table()
+        assert sorted(table["foo"].to_pylist()) == list(range(0, 5000))
+    assert sorted(part.part_index for part in parts) == [0, 1, 2]
+    assert max(part.cumulative_rows for part in parts) == 5000
+
+
+def test_upload_within_memory_budget(monkeypatch):
+    monkeypatch.setattr("airtrain.core._MAX_PART_BYTES", 8000)
+    table = pa.table({"foo": list(range(0, 5000))})
+    parts = []
+    with LocalAirtrainApi(row_limit=5000) as api:
+        result = upload_from_arrow_tables(
+            [table],
+            client=api.client(),
+            upload_concurrency=2,
+            max_inflight_bytes=20000,
+            observer=CallbackObserver(parts.append),
+        )
+        assert result.size == 5000
+        assert result.timings is not None
+        assert result.timings.parts == 5
+        uploaded = api.dataset(result.id).table()
+        assert sorted(uploaded["foo"].to_pylist()) == list(range(0, 5000))
+    assert sorted(part.rows for part in parts) == [1000] * 5
+
+
+@pytest.mark.parametrize("upload_concurrency", [1, 3])
+def test_upload_splits_tables_to_fit_memory_budget(monkeypatch, upload_concurrency):
+    budgets = []
+
+    def recording_budget(max_bytes):
+        budgets.append(MemoryBudget(max_bytes))
+        return budgets[-1]
+
+    monkeypatch.setattr("airtrain.core.MemoryBudget", recording_budget)
+    rng = np.random.default_rng(0)
+    table = pa.table({"foo": rng.integers(0, 2**62, 2_000_000)})
+    with LocalAirtrainApi(row_limit=2_000_000) as api:
+        result = upload_from_arrow_tables(
+            [table],
+            client=api.client(),
+            upload_concurrency=upload_concurrency,
+            max_inflight_bytes=8_000_000,
+        )
+        assert result.size == 2_000_000
+        assert result.timings is not None
+        assert result.timings.parts > 1
+    (budget,) = budgets
+    assert 0 < budget.peak <= 8_000_000
+
+
+def test_upload_spills_to_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr("airtrain.core._MAX_PART_BYTES", 8000)
+    table = pa.table({"foo": list(range(0, 5000))})
+    with LocalAirtrainApi(row_limit=5000, latency_seconds=0.05) as api:
+        result = upload_from_arrow_tables(
+            [table],
+            client=api.client(),
+            upload_concurrency=2,
+            max_inflight_bytes=1,
+            spill_dir=str(tmp_path),
+        )
+        uploaded = api.dataset(result.id).table()
+        assert sorted(uploaded["foo"].to_pylist()) == list(range(0, 5000))
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_concurrently_raises_upload_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr("airtrain.core._MAX_PART_BYTES", 8000)
+    table = pa.table({"foo": list(range(0, 5000))})
+    with LocalAirtrainApi(row_limit=5000) as api:
+        api.add_fault(Fault(endpoint="PUT storage", status_code=400, on_requests=[3]))
+        with pytest.raises(BadRequestError):
+            upload_from_arrow_tables(
+                [table],
+                client=api.client(),
+                upload_concurrency=2,
+                max_inflight_bytes=1,
+                spill_dir=str(tmp_path),
+            )
+    assert os.listdir(tmp_path) == []
+
+
+def test_upload_with_stream_encoding(monkeypatch):
+    monkeypatch.setattr("airtrain.core._STREAM_ROW_GROUP_BYTES", 4000)
+    table = pa.table({"foo": list(range(0, 5000)), "bar": ["baz"] * 5000})
+    parts = []
+    with LocalAirtrainApi(row_limit=5000) as api:
+        # The first upload fails part way, so the part is encoded again.
+        api.add_fault(Fault(endpoint="PUT storage", status_code=503, on_requests=[1]))
+        result = upload_from_arrow_tables(
+            [table],
+            client=api.client(retry_policy=RetryPolicy(delay=0)),
+            stream_encoding=True,
+            observer=CallbackObserver(parts.append),
+        )
+        dataset = api.dataset(result.id)
+        assert dataset.table() == table
+        (encoded,) = dataset.parts.values()
+    assert parts[0].retries == 1
+    assert parts[0].encoded_bytes == len(encoded)
+    assert pq.ParquetFile(pa.BufferReader(encoded)).num_row_groups > 1
+
+
+def test_streamed_part():
+    table = pa.table({"foo": list(range(0, 100))})
+    part = _StreamedPart(table, table.nbytes // 4)
+    assert part.row_group_rows == 25
+    chunks = list(part.chunks())
+    # A chunk per row group, and one for the footer
+    assert len(chunks) == 5
+    assert part.n_bytes == sum(len(chunk) for chunk in chunks)
+    assert pq.read_table(pa.BufferReader(b"".join(chunks))) == table
+    # Encoding again produces the same bytes.
+    assert b"".join(part.chunks()) == b"".join(chunks)
+    assert part.n_bytes == sum(len(chunk) for chunk in chunks)
+
+    empty = _StreamedPart(table.slice(0, 0), 1000)
+    assert pq.read_table(pa.BufferReader(b"".join(empty.chunks()))) == table.slice(0, 0)
+
+
+def test_upload_many():
+    def tables(offset):
+        return [
+            pa.table({"foo": list(range(i, i + 100))}) for i in range(offset, 300, 100)
+        ]
+
+    specs = [DatasetSpec(tables(0), name=f"Dataset {i}") for i in range(0, 4)]
+    parts = []
+    latency = 0.05
+    with LocalAirtrainApi(latency_seconds=latency) as api:
+        started = time.perf_counter()
+        results = upload_many(
+            specs, client=api.client(), observer=CallbackObserver(parts.append)
+        )
+        elapsed = time.perf_counter() - started
+        assert [result.name for result in results] == [spec.name for spec in specs]
+        for result in results:
+            assert result.size == 300
+            dataset = api.dataset(result.id)
+            assert dataset.ingested
+            assert sorted(dataset.table()["foo"].to_pylist()) == list(range(0, 300))
+    assert len(parts) == 12
+    # Uploading one dataset at a time would take at least 8 requests each.
+    assert elapsed < 4 * 8 * latency * 0.75
+
+
+def test_upload_many_raises_first_error():
+    good = pa.table({"foo": [1, 2, 3]})
+    bad = pa.table({"bar": ["a"]})
+    specs = [
+        DatasetSpec([good], name="Good"),
+        DatasetSpec([good, bad], name="Bad"),
+        DatasetSpec([good, good], name="Also good"),
+    ]
+    with LocalAirtrainApi() as api:
+        with pytest.raises(ValueError, match="same schema"):
+            upload_many(specs, client=api.client(), max_workers=2)
+        ingested = sorted(
+            dataset.name for dataset in api.datasets.values() if dataset.ingested
+        )
+        assert ingested == ["Also good", "Good"]
+
+    assert upload_many([]) == []
+
+
+def test_split_into_parts():
+    table = pa.table({"foo": list(range(0, 100))})
+    assert list(_split_into_parts(table, table.nbytes)) == [table]
+    parts = list(_split_into_parts(table, table.nbytes // 3))
+    assert [part.shape[0] for part in parts] == [33, 33, 33, 1]
+    assert pa.concat_tables(parts) == table
+
+
+def test_upload_observer(mock_client: MockAirtrainClient):  # noqa: F811
+    class RecordingObserver(UploadObserver):
+        def __init__(self):
+            self.events = []
+
+        def on_start(self, dataset_id, name):
+            self.events.append(("start", dataset_id, name))
+
+        def on_part(self, metrics):
+            self.events.append(("part", metrics))
+
+        def on_finish(self, dataset_id, timings):
+            self.events.append(("finish", dataset_id, timings))
+
+    observer = RecordingObserver()
+    table = pa.table({"foo": list(range(0, 60))})
+    result = upload_from_arrow_tables([table, table], name="Foo", observer=observer)
+
+    assert observer.events[0] == ("start", result.id, "Foo")
+    parts = [event[1] for event in observer.events[1:-1]]
+    assert [part.rows for part in parts] == [60, 40]
+    assert [part.cumulative_rows for part in parts] == [60, 100]
+    assert all(part.encoded_bytes > 0 for part in parts)
+    assert all(part.retries == 0 for part in parts)
+    assert observer.events[-1] == ("finish", result.id, result.timings)
+
+    timings = result.timings
+    assert timings is not None
+    assert timings.parts == 2
+    assert timings.rows == 100
+    assert timings.encoded_bytes == sum(part.encoded_bytes for part in parts)
+    assert timings.total_seconds >= timings.upload_seconds > 0
+
+
+def test_upload_observer_on_error(mock_client: MockAirtrainClient):  # noqa: F811
+    class RecordingObserver(UploadObserver):
+        def __init__(self):
+            self.events = []
+
+        def on_finish(self, dataset_id, timings):
+            self.events.append(("finish", dataset_id))
+
+        def on_error(self, dataset_id, error):
+            self.events.append(("error", dataset_id, error))
+
+    def tables():
+        yield pa.table({"foo": [1, 2]})
+        raise KeyError("source failed")
+
+    observer = RecordingObserver()
+    with pytest.raises(KeyError) as info:
+        upload_from_arrow_tables(tables(), observer=observer)
+    ((event, dataset_id, error),) = observer.events
+    assert event == "error"
+    assert list(mock_client._fake_datasets) == [dataset_id]
+    assert error is info.value
+
+
+def test_upload_observer_errors_ignored(mock_client: MockAirtrainClient):  # noqa: F811
+    def fail(metrics):
+        raise RuntimeError("observer bug")
+
+    result = upload_from_dicts([{"foo": 1}], observer=CallbackObserver(fail))
+    assert result.size == 1
@@ -0,0 +1,69 @@
+import pyarrow as pa
+import pytest
+
+from airtrain.flattening import Flattening, flatten_table
+
+
+def _nested_table() -> pa.Table:
+    return pa.Table.from_pylist(
+        [
+            {
+                "id": 1,
+                "meta": {"author": {"name": "Ada", "age": 36}, "tags": ["a", "b"]},
+                "extra": {"score": 0.5},
+            },
+            {"id": 2, "meta": None, "extra": {"score": None}},
+        ]
+    )
+
+
+def test_flatten_table():
+    table = flatten_table(_nested_table(), Flattening())
+    assert table.column_names == [
+        "id",
+        "meta.author.name",
+        "meta.author.age",
+        "meta.tags",
+        "extra.score",
+    ]
+    assert table["meta.author.name"].to_pylist() == ["Ada", None]
+    assert table["meta.tags"].to_pylist() == [["a", "b"], None]
+    assert table["extra.score"].to_pylist() == [0.5, None]
+
+
+def test_flatten_table_max_depth():
+    table = flatten_table(_nested_table(), Flattening(max_depth=1))
+    assert table.column_names == ["id", "meta.tags", "extra.score", "overflow"]
+    assert pa.types.is_map(table.schema.field("overflow").type)
+    assert table["overflow"].to_pylist() == [
+        [("meta.author.name", "Ada"), ("meta.author.age", "36")],
+        [],
+    ]
+
+
+def test_flatten_table_max_columns(caplog):
+    table = flatten_table(
+        _nested_table(), Flattening(max_columns=3, overflow_column="rest")
+    )
+    assert table.column_names == ["id", "meta.author.name", "meta.tags", "rest"]
+    assert table["rest"].to_pylist() == [
+        [("meta.author.age", "36"), ("extra.score", "0.5")],
+        [],
+    ]
+    # Lists can't be packed.
+    assert "meta.tags" in caplog.text
+
+
+def test_flatten_table_no_structs():
+    table = pa.table({"a": [1, 2], "empty": pa.array([{}, {}], pa.struct([]))})
+    assert flatten_table(table, Flattening()).column_names == ["a"]
+
+
+def test_flatten_table_name_clashes():
+    table = pa.table({"a.b": [1], "a": [{"b": 2}]})
+    with pytest.raises(ValueError, match="clash"):
+        flatten_table(table, Flattening())
+
+    table = pa.table({"overflow": [1], "a": [{"b": {"c": 2}}]})
+    with pytest.raises(ValueError, match="overflow column"):
+        flatten_table(table, Flattening(max_depth=1))
@@ -0,0 +1,91 @@
+import asyncio
+
+import pyarrow as pa
+import pytest
+
+from airtrain.client import IngestJobState, NotFoundError
+from airtrain.core import DatasetMetadata, upload_from_arrow_tables
+from airtrain.ingest import _IngestPoller, wait_for_ingest, wait_for_ingest_async
+from airtrain.testing import LocalAirtrainApi
+
+
+def _upload(api: LocalAirtrainApi, name: str) -> DatasetMetadata:
+    table = pa.table({"foo": [1, 2, 3]})
+    return upload_from_arrow_tables([table], name=name, client=api.client())
+
+
+def test_wait_for_ingest():
+    with LocalAirtrainApi(ingest_seconds=0.2) as api:
+        result = _upload(api, "Foo")
+        assert result.ingest_job_id == api.dataset(result.id).ingest_job_id
+
+        status = wait_for_ingest(result, client=api.client(), initial_interval=0.05)
+        assert status.ingest_job_id == result.ingest_job_id
+        assert status.succeeded
+        assert api.request_counts["GET ingestion-job"] > 1
+
+
+def test_wait_for_many_ingests_in_batches():
+    with LocalAirtrainApi(ingest_seconds=0.2) as api:
+        results = [_upload(api, f"Foo {i}") for i in range(0, 3)]
+        api.dataset(results[1].id).ingest_state = IngestJobState.FAILED
+
+        assert results[0].ingest_job_id is not None
+        statuses = wait_for_ingest(
+            [results[0].ingest_job_id, results[1], results[2]],
+            client=api.client(),
+            initial_interval=0.05,
+        )
+        assert [status.ingest_job_id for status in statuses] == [
+            result.ingest_job_id for result in results
+        ]
+        assert [status.state for status in statuses] == [
+            IngestJobState.SUCCEEDED,
+            IngestJobState.FAILED,
+            IngestJobState.SUCCEEDED,
+        ]
+        assert statuses[1].error_message is not None
+        assert api.request_counts["POST ingestion-job/status"] >= 1
+
+
+def test_wait_for_ingest_async():
+    with LocalAirtrainApi(ingest_seconds=0.2) as api:
+        results = [_upload(api, f"Foo {i}") for i in range(0, 2)]
+
+        async def wait():
+            return await asyncio.gather(
+                wait_for_ingest_async(
+                    results[0], client=api.client(), initial_interval=0.05
+                ),
+                wait_for_ingest_async(
+                    results, client=api.client(), initial_interval=0.05
+                ),
+            )
+
+        single, both = asyncio.run(wait())
+        assert single.succeeded
+        assert [status.succeeded for status in both] == [True, True]
+
+
+def test_wait_for_ingest_errors():
+    with LocalAirtrainApi(ingest_seconds=10) as api:
+        result = _upload(api, "Foo")
+        with pytest.raises(TimeoutError):
+            wait_for_ingest(
+                result, client=api.client(), timeout=0.2, initial_interval=0.05
+            )
+        with pytest.raises(NotFoundError):
+            wait_for_ingest("no-such-job", client=api.client())
+        with pytest.raises(NotFoundError):
+            wait_for_ingest([result, "no-such-job"], client=api.client())
+
+    with pytest.raises(ValueError, match="no ingestion job"):
+        wait_for_ingest(DatasetMetadata(name="Foo", id="bar", url="baz", size=1))
+
+
+def test_ingest_poller_backoff():
+    poller = _IngestPoller(["foo"], None, initial_interval=1.0, max_interval=3.0)
+    intervals = [poller.next_interval() for _ in range(0, 6)]
+    maximums = [1.0, 1.5, 2.25, 3.0, 3.0, 3.0]
+    for interval, maximum in zip(intervals, maximums):
+        assert maximum / 2 <= interval <= maximum
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from airtrain.memory import MemoryBudget, SpilledPart
+
+
+def test_memory_budget():
+    budget = MemoryBudget(100)
+    budget.acquire(60)
+    budget.acquire(40)
+    assert budget.in_use == 100
+    assert budget.is_full
+
+    acquired = threading.Event()
+
+    def acquire_more():
+        budget.acquire(10)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_more)
+    thread.start()
+    time.sleep(0.05)
+    assert not acquired.is_set()
+    budget.release(60)
+    thread.join(timeout=1)
+    assert acquired.is_set()
+    assert budget.in_use == 50
+    assert budget.peak == 100
+    assert not budget.is_full
+
+
+def test_memory_budget_allows_oversized_acquisition():
+    budget = MemoryBudget(10)
+    budget.acquire(1000)
+    assert budget.in_use == 1000
+    budget.release(1000)
+    assert budget.in_use == 0
+
+    with pytest.raises(ValueError):
+        MemoryBudget(0)
+
+
+def test_spilled_part(tmp_path):
+    table = pa.table({"foo": list(range(0, 100)), "bar": ["baz"] * 100})
+    part = SpilledPart(table, str(tmp_path))
+    assert part.path.startswith(str(tmp_path))
+    assert part.n_bytes > 0
+    assert pq.read_table(part.open()) == table
+    part.delete()
+    assert list(tmp_path.iterdir()) == []
+    # Deleting again is harmless.
+    part.delete()
@@ -0,0 +1,54 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from airtrain.optimization import TypeOptimization, _TypeOptimizer
+
+
+def _table(ids, scores, labels):
+    return pa.table(
+        {
+            "id": pa.array(ids, pa.int64()),
+            "score": pa.array(scores, pa.float64()),
+            "label": pa.array(labels, pa.string()),
+            "vector": pa.array([[1.0, 2.0]] * len(ids)),
+        }
+    )
+
+
+def test_type_optimizer():
+    optimizer = _TypeOptimizer(TypeOptimization())
+    n = 1000
+    table = _table(np.arange(n), np.arange(n) / 4, ["a", "b"] * (n // 2))
+    optimized = optimizer.optimize(table)
+    assert optimized.schema.field("id").type == pa.int32()
+    assert optimized.schema.field("score").type == pa.float32()
+    assert optimized.schema.field("label").type == pa.dictionary(pa.int32(), pa.string())
+    assert optimized.schema.field("vector").type == table.schema.field("vector").type
+    assert optimized["score"].to_pylist() == table["score"].to_pylist()
+    assert optimized["label"].to_pylist() == table["label"].to_pylist()
+    assert optimizer.bytes_saved > 0
+    assert optimizer.bytes_saved == table.nbytes - optimized.nbytes
+
+    later = optimizer.optimize(_table([5], [0.5], ["c"]))
+    assert later.schema == optimized.schema
+
+
+def test_type_optimizer_keeps_lossy_types():
+    optimizer = _TypeOptimizer(TypeOptimization())
+    table = _table([2**40, 1], [0.1, 0.2], ["a", "b"])
+    optimized = optimizer.optimize(table)
+    assert optimized.schema == table.schema
+
+    tolerant = _TypeOptimizer(TypeOptimization(float_tolerance=1e-6))
+    optimized = tolerant.optimize(table)
+    assert optimized.schema.field("score").type == pa.float32()
+
+
+def test_type_optimizer_later_violations():
+    optimizer = _TypeOptimizer(TypeOptimization())
+    optimizer.optimize(_table([1, 2], [0.5, 1.5], ["a", "a"]))
+    with pytest.raises(ValueError, match="no longer fit in int32"):
+        optimizer.optimize(_table([2**40], [0.5], ["a"]))
+    with pytest.raises(ValueError, match="32 bit floats"):
+        optimizer.optimize(_table([1], [0.1], ["a"]))
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from airtrain.projection import (
+    EmbeddingProjection,
+    _embedding_matrix,
+    _project_tables,
+)
+
+
+def _tables(embeddings, rows_per_table=100):
+    for start in range(0, len(embeddings), rows_per_table):
+        chunk = embeddings[start : start + rows_per_table]
+        yield pa.table(
+            {
+                "id": np.arange(start, start + len(chunk)),
+                "embedding": pa.FixedSizeListArray.from_arrays(
+                    pa.array(chunk.reshape(-1)), chunk.shape[1]
+                ),
+            }
+        )
+
+
+def _low_rank_embeddings(n_rows=500, rank=4, dimensions=64):
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((n_rows, rank)) @ rng.standard_normal((rank, dimensions))
+
+
+def test_project_tables_random():
+    embeddings = _low_rank_embeddings()
+    projection = EmbeddingProjection(16, seed=0)
+    tables = list(_project_tables(_tables(embeddings), "embedding", projection))
+    assert projection.fitted
+    assert sum(table.num_rows for table in tables) == len(embeddings)
+    assert tables[0].schema.field("embedding").type == pa.list_(pa.float32(), 16)
+    projected = np.concatenate(
+        [_embedding_matrix(table, "embedding") for table in tables]
+    )
+    # Distances are roughly preserved.
+    original_distance = np.linalg.norm(embeddings[0] - embeddings[1])
+    projected_distance = np.linalg.norm(projected[0] - projected[1])
+    assert 0.5 < projected_distance / original_distance < 1.5
+
+
+def test_project_tables_pca(tmp_path):
+    embeddings = _low_rank_embeddings()
+    projection = EmbeddingProjection(4, method="pca", fit_rows=250)
+    tables = list(_project_tables(_tables(embeddings), "embedding", projection))
+    projected = np.concatenate(
+        [_embedding_matrix(table, "embedding") for table in tables]
+    )
+    # The embeddings have rank 4, so 4 components keep all distances.
+    original_distance = np.linalg.norm(embeddings[0] - embeddings[1])
+    projected_distance = np.linalg.norm(projected[0] - projected[1])
+    assert projected_distance == pytest.approx(original_distance, rel=1e-3)
+
+    path = os.path.join(tmp_path, "projection.npz")
+    projection.save(path)
+    loaded = EmbeddingProjection.load(path)
+    assert loaded.method == "pca"
+    assert loaded.dimensions == 4
+    again = next(_project_tables(_tables(embeddings), "embedding", loaded))
+    assert again["embedding"].to_pylist() == tables[0]["embedding"].to_pylist()
+
+
+def test_embedding_projection_errors():
+    with pytest.raises(ValueError, match="Unknown projection method"):
+        EmbeddingProjection(4, method="magic")
+    projection = EmbeddingProjection(128)
+    with pytest.raises(ValueError, match="not been fitted"):
+        projection.transform(np.zeros((1, 64)))
+    with pytest.raises(ValueError, match="Cannot project"):
+        list(_project_tables(_tables(_low_rank_embeddings()), "embedding", projection))
+    with pytest.raises(ValueError, match="same length"):
+        _embedding_matrix(pa.table({"e": [[1.0], [1.0, 2.0]]}), "e")
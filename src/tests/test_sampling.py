@@ -0,0 +1,97 @@
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from airtrain.sampling import Sampling, _quotas, _rank_within_stratum, sample_tables
+
+
+def _tables(labels, rows_per_table=7, label_type=pa.string()):
+    n = len(labels)
+    for start in range(0, n, rows_per_table):
+        yield pa.table(
+            {
+                "id": list(range(start, min(n, start + rows_per_table))),
+                "label": pa.array(labels[start : start + rows_per_table], label_type),
+            }
+        )
+
+
+def test_sample_tables_uniform():
+    labels = ["a"] * 1000
+    sampled = list(sample_tables(_tables(labels), 100, Sampling(seed=0)))
+    assert len(sampled) == 1
+    ids = sampled[0]["id"].to_pylist()
+    assert len(ids) == 100
+    assert len(set(ids)) == 100
+    # Rows keep the order of the source, and come from all of it.
+    assert ids == sorted(ids)
+    assert ids[-1] > 500
+
+    again = next(sample_tables(_tables(labels), 100, Sampling(seed=0)))
+    assert again["id"].to_pylist() == ids
+
+
+def test_sample_tables_is_uniform():
+    n_picked = np.zeros(100)
+    for seed in range(200):
+        table = next(
+            sample_tables(
+                _tables(list(range(100)), label_type=pa.int64()), 10, Sampling(seed=seed)
+            )
+        )
+        n_picked[table["id"].to_numpy()] += 1
+    # Every row is picked with probability 0.1, so about 20 times.
+    assert n_picked.min() > 5
+    assert n_picked.max() < 40
+
+
+def test_sample_tables_fewer_rows_than_limit():
+    table = next(sample_tables(_tables(["a", "b", "c"]), 100, Sampling()))
+    assert table["id"].to_pylist() == [0, 1, 2]
+    assert list(sample_tables([], 100, Sampling())) == []
+
+
+def test_sample_tables_stratified():
+    labels = ["common"] * 900 + ["rare"] * 10 + ["medium"] * 90 + [None] * 30
+    sampling = Sampling(stratify_by="label", seed=1)
+    table = next(sample_tables(_tables(labels), 100, sampling))
+    counts = Counter(table["label"].to_pylist())
+    # The rare label gets all of its rows, and the others share the rest.
+    assert counts == {"rare": 10, "common": 30, "medium": 30, None: 30}
+    assert table["id"].to_pylist() == sorted(table["id"].to_pylist())
+
+
+def test_sample_tables_stratified_uneven_arrival():
+    # Most of "b" arrives after the first compaction, once "a" is complete.
+    tables = [
+        pa.table({"label": ["a"] * 9 + ["b"]}),
+        pa.table({"label": ["b"] * 100}),
+    ]
+    for seed in range(50):
+        sampling = Sampling(stratify_by="label", seed=seed)
+        table = next(sample_tables(tables, 10, sampling))
+        assert Counter(table["label"].to_pylist()) == {"a": 5, "b": 5}
+
+
+def test_sample_tables_errors():
+    with pytest.raises(ValueError, match="to stratify by"):
+        list(sample_tables(_tables(["a"] * 10), 5, Sampling(stratify_by="nope")))
+    tables = [pa.table({"id": [1]}), pa.table({"id": ["1"]})]
+    with pytest.raises(ValueError, match="same schema"):
+        list(sample_tables(tables, 5, Sampling()))
+
+
+def test_quotas():
+    counts = np.array([5, 100, 50])
+    assert _quotas(counts, 200, exact=True).tolist() == [5, 100, 50]
+    assert _quotas(counts, 65, exact=True).tolist() == [5, 30, 30]
+    assert _quotas(counts, 66, exact=True).tolist() == [5, 31, 30]
+    assert _quotas(counts, 66, exact=False).tolist() == [5, 31, 31]
+
+
+def test_rank_within_stratum():
+    keys = np.array([0.5, 0.1, 0.9, 0.3, 0.2])
+    strata = np.array([0, 0, 1, 1, 0])
+    assert _rank_within_stratum(keys, strata).tolist() == [2, 0, 1, 0, 1]
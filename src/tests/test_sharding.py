@@ -0,0 +1,142 @@
+import multiprocessing
+
+import pyarrow as pa
+import pytest
+
+from airtrain.client import BadRequestError
+from airtrain.instrumentation import UploadObserver
+from airtrain.sharding import ShardedUpload, ShardResult, ShardUploadError
+from airtrain.testing import Fault, LocalAirtrainApi
+
+
+def _upload_shard(session: str, shard: int, api_key: str, base_url: str) -> str:
+    upload = ShardedUpload.from_json(session)
+    tables = [
+        pa.table({"id": list(range(start, start + 100)), "shard": [shard] * 100})
+        for start in range(shard * 1000, shard * 1000 + 1000, 100)
+    ]
+    result = upload.upload_shard(shard, tables, api_key=api_key, base_url=base_url)
+    return result.to_json()
+
+
+def test_sharded_upload_from_processes():
+    with LocalAirtrainApi() as api:
+        upload = ShardedUpload.create(3, name="Sharded", client=api.client())
+        assert upload.n_shards == 3
+        arguments = [
+            (upload.to_json(), shard, api.api_key, api.url) for shard in range(3)
+        ]
+        with multiprocessing.Pool(3) as pool:
+            results = [
+                ShardResult.from_json(r) for r in pool.starmap(_upload_shard, arguments)
+            ]
+        assert [result.rows for result in results] == [1000, 1000, 1000]
+        assert not api.dataset(upload.dataset_id).ingested
+
+        finished = []
+
+        class FinishObserver(UploadObserver):
+            def on_finish(self, dataset_id, timings):
+                finished.append((dataset_id, timings))
+
+        result = upload.finalize(results, client=api.client(), observer=FinishObserver())
+        assert result.size == 3000
+        assert result.ingest_job_id is not None
+        assert result.timings is not None
+        assert result.timings.rows == 3000
+        assert result.timings.parts == sum(r.timings.parts for r in results)
+        assert result.timings.total_seconds >= max(
+            r.timings.total_seconds for r in results
+        )
+        assert finished == [(upload.dataset_id, result.timings)]
+        dataset = api.dataset(result.id)
+        assert dataset.name == "Sharded"
+        assert dataset.ingested
+        assert sorted(dataset.table()["id"].to_pylist()) == list(range(3000))
+
+
+def test_sharded_upload_row_limit():
+    with LocalAirtrainApi(row_limit=250) as api:
+        upload = ShardedUpload.create(2, client=api.client())
+        assert upload.shard_rows == [125, 125]
+        results = [
+            upload.upload_shard(
+                shard, [pa.table({"id": list(range(1000))})], client=api.client()
+            )
+            for shard in range(2)
+        ]
+        result = upload.finalize(results, client=api.client())
+        assert result.size == 250
+        assert api.dataset(result.id).table().num_rows == 250
+
+
+def test_sharded_upload_errors():
+    with LocalAirtrainApi() as api:
+        upload = ShardedUpload.create(2, client=api.client())
+        with pytest.raises(ValueError, match="between 0 and 1"):
+            upload.upload_shard(2, [], client=api.client())
+        first = upload.upload_shard(0, [pa.table({"id": [1]})], client=api.client())
+        second = upload.upload_shard(1, [pa.table({"id": ["1"]})], client=api.client())
+        with pytest.raises(ValueError, match="one result for each of 2 shards"):
+            upload.finalize([first, first], client=api.client())
+        with pytest.raises(ValueError, match="same schema"):
+            upload.finalize([first, second], client=api.client())
+
+        empty = ShardedUpload.create(1, client=api.client())
+        results = [empty.upload_shard(0, [], client=api.client())]
+        assert results[0].schema is None
+        with pytest.raises(ValueError, match="empty dataset"):
+            empty.finalize(results, client=api.client())
+    with pytest.raises(ValueError, match="at least one"):
+        ShardedUpload.create(0, api_key="foo", base_url="http://localhost:1")
+
+
+def test_upload_shard_releases_upload_targets():
+    with LocalAirtrainApi() as api:
+        upload = ShardedUpload.create(1, client=api.client())
+        client = api.client()
+        tables = [pa.table({"id": list(range(i, i + 10))}) for i in range(0, 50, 10)]
+        upload.upload_shard(0, tables, client=client, upload_concurrency=2)
+        assert client._upload_target_pools == {}
+        assert client._prefetch_executor is None
+
+
+def test_retry_failed_shard():
+    tables = [pa.table({"id": list(range(i, i + 10))}) for i in range(0, 50, 10)]
+    with LocalAirtrainApi() as api:
+        upload = ShardedUpload.create(1, client=api.client())
+        api.add_fault(Fault(endpoint="PUT storage", status_code=400, on_requests=[3]))
+        with pytest.raises(ShardUploadError) as info:
+            upload.upload_shard(0, tables, client=api.client())
+        assert isinstance(info.value.__cause__, BadRequestError)
+        assert len(info.value.parts) == 2
+
+        # The retry uploads over the two parts, instead of adding to them.
+        result = upload.upload_shard(
+            0, tables, client=api.client(), replace_parts=info.value.parts
+        )
+        assert result.parts[:2] == info.value.parts
+        assert ShardResult.from_json(result.to_json()) == result
+        upload.finalize([result], client=api.client())
+        dataset = api.dataset(upload.dataset_id)
+        assert len(dataset.parts) == 5
+        assert sorted(dataset.table()["id"].to_pylist()) == list(range(50))
+
+
+def test_retry_shard_with_fewer_parts():
+    tables = [pa.table({"id": list(range(i, i + 10))}) for i in range(0, 50, 10)]
+    with LocalAirtrainApi() as api:
+        upload = ShardedUpload.create(1, client=api.client())
+        api.add_fault(Fault(endpoint="PUT storage", status_code=400, on_requests=[4]))
+        with pytest.raises(ShardUploadError) as info:
+            upload.upload_shard(0, tables, client=api.client())
+        assert len(info.value.parts) == 3
+
+        # Parts the retry has no data for are emptied.
+        result = upload.upload_shard(
+            0, tables[:1], client=api.client(), replace_parts=info.value.parts
+        )
+        assert sorted(result.parts) == sorted(info.value.parts)
+        upload.finalize([result], client=api.client())
+        table = api.dataset(upload.dataset_id).table()
+        assert table["id"].to_pylist() == list(range(10))
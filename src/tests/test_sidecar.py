@@ -0,0 +1,70 @@
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from airtrain.sidecar import (
+    HEADER_BYTES,
+    EmbeddingSidecar,
+    join_embeddings,
+    read_sidecar,
+    sidecar_part_id,
+    split_embeddings,
+)
+
+
+def _table(n_rows=10, dimensions=4):
+    embeddings = np.arange(n_rows * dimensions, dtype=np.float64) / 8
+    return pa.table(
+        {
+            "id": np.arange(n_rows),
+            "embedding": pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings), dimensions
+            ),
+            "text": [str(i) for i in range(n_rows)],
+        }
+    )
+
+
+def test_sidecar_round_trip():
+    table = _table()
+    rest, sidecar = split_embeddings(table, "embedding", EmbeddingSidecar())
+    assert rest.column_names == ["id", "text"]
+    assert sidecar.dimensions == 4
+    assert len(sidecar.content) == HEADER_BYTES + 10 * 4 * 4
+
+    # Parts go through Parquet, which keeps the metadata pairing them.
+    buffer = io.BytesIO()
+    pq.write_table(rest, buffer)
+    rest = pq.read_table(io.BytesIO(buffer.getvalue()))
+    assert sidecar_part_id(rest) == sidecar.part_id
+
+    part_id, matrix = read_sidecar(sidecar.content, "float32", 4)
+    assert part_id == sidecar.part_id
+    assert matrix.shape == (10, 4)
+    joined = join_embeddings(rest, matrix)
+    assert joined.column_names == ["id", "embedding", "text"]
+    assert joined["embedding"].to_pylist() == table["embedding"].to_pylist()
+    assert sidecar_part_id(joined) is None
+
+
+def test_sidecar_float16():
+    table = _table()
+    _, sidecar = split_embeddings(table, "embedding", EmbeddingSidecar("float16"))
+    assert len(sidecar.content) == HEADER_BYTES + 10 * 4 * 2
+    _, matrix = read_sidecar(sidecar.content, "float16", 4)
+    assert matrix.dtype == np.float16
+    assert matrix.reshape(-1).tolist() == (np.arange(40) / 8).tolist()
+
+
+def test_sidecar_errors():
+    with pytest.raises(ValueError, match="Unsupported sidecar dtype"):
+        EmbeddingSidecar("int8")
+    with pytest.raises(ValueError, match="Not an embeddings sidecar"):
+        read_sidecar(b"\x00" * 100, "float32", 4)
+    rest, sidecar = split_embeddings(_table(), "embedding", EmbeddingSidecar())
+    _, matrix = read_sidecar(sidecar.content, "float32", 4)
+    with pytest.raises(ValueError, match="10 rows"):
+        join_embeddings(rest, matrix[:5])
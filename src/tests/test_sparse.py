@@ -0,0 +1,54 @@
+import pyarrow as pa
+import pytest
+
+from airtrain.sparse import SparseKeys, _SparseDictConverter
+
+
+def _events(start, n):
+    return [
+        {"id": i, "kind": "click", f"attribute_{i}": i * 10, "note": None}
+        for i in range(start, start + n)
+    ]
+
+
+def test_sparse_dict_converter():
+    converter = _SparseDictConverter(SparseKeys(min_frequency=0.5), None)
+    table = converter.to_table(_events(0, 3))
+    assert table.column_names == ["id", "kind", "overflow"]
+    assert table["overflow"].to_pylist() == [
+        [("attribute_0", "0")],
+        [("attribute_1", "10")],
+        [("attribute_2", "20")],
+    ]
+
+    # Later batches have the same schema, whichever keys they have.
+    later = converter.to_table([{"id": 5, "other": {"a": [1]}}, {"kind": "view"}])
+    assert later.schema == table.schema
+    assert later["id"].to_pylist() == [5, None]
+    assert later["overflow"].to_pylist() == [[("other", '{"a": [1]}')], []]
+
+
+def test_sparse_dict_converter_max_columns():
+    rows = [{"a": 1, "b": 2, "c": 3}, {"b": 2, "c": 3}, {"c": 3}]
+    sparse_keys = SparseKeys(min_frequency=0.0, max_columns=3, overflow_column="rest")
+    table = _SparseDictConverter(sparse_keys, None).to_table(rows)
+    assert table.column_names == ["b", "c", "rest"]
+    assert table["rest"].to_pylist() == [[("a", "1")], [], []]
+
+
+def test_sparse_dict_converter_schema():
+    schema = pa.schema([("id", pa.float64())])
+    table = _SparseDictConverter(SparseKeys(), schema).to_table(_events(0, 2))
+    assert table.column_names == ["id", "overflow"]
+    assert table["id"].to_pylist() == [0.0, 1.0]
+    assert table["overflow"].to_pylist()[0] == [("kind", "click"), ("attribute_0", "0")]
+
+
+def test_sparse_dict_converter_errors():
+    with pytest.raises(ValueError, match="overflow column"):
+        _SparseDictConverter(SparseKeys(), pa.schema([("overflow", pa.int64())]))
+    converter = _SparseDictConverter(SparseKeys(), None)
+    with pytest.raises(ValueError, match="overflow column"):
+        converter.to_table([{"overflow": 1}])
+    with pytest.raises(ValueError, match="must be python dicts"):
+        converter.to_table([1])
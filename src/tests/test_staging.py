@@ -0,0 +1,88 @@
+import os
+from itertools import count
+
+import pyarrow as pa
+import pytest
+
+from airtrain.core import push_staged, upload_from_arrow_tables, upload_from_dicts
+from airtrain.staging import MANIFEST_FILE_NAME, StagedManifest
+from airtrain.testing import LocalAirtrainApi
+
+
+def test_stage_and_push(tmp_path):
+    stage_dir = str(tmp_path / "staged")
+    data = ({"foo": i, "bar": [float(i), 1.0]} for i in range(0, 5000))
+    staged = upload_from_dicts(
+        data, name="Staged", embedding_column="bar", stage_to=stage_dir
+    )
+    assert staged.size == 5000
+    assert staged.id.startswith("local-")
+    assert staged.url.startswith("file://")
+
+    manifest = StagedManifest.read(stage_dir)
+    assert manifest.name == "Staged"
+    assert manifest.embedding_column == "bar"
+    assert manifest.rows == 5000
+    assert [part.rows for part in manifest.parts] == [2000, 2000, 1000]
+
+    with LocalAirtrainApi(row_limit=10000) as api:
+        result = push_staged(stage_dir, client=api.client(), upload_concurrency=3)
+        assert result.size == 5000
+        assert result.timings is not None
+        assert result.timings.parts == 3
+        dataset = api.dataset(result.id)
+        assert dataset.name == "Staged"
+        assert dataset.embedding_column == "bar"
+        assert dataset.ingested
+        assert sorted(dataset.table()["foo"].to_pylist()) == list(range(0, 5000))
+        # The staged parts are uploaded without being re-encoded.
+        staged_bytes = set()
+        for part in manifest.parts:
+            with open(os.path.join(stage_dir, part.file), "rb") as f:
+                staged_bytes.add(f.read())
+        assert set(dataset.parts.values()) == staged_bytes
+
+
+def test_push_staged_within_row_limit(tmp_path):
+    stage_dir = str(tmp_path)
+    tables = [pa.table({"foo": list(range(i, i + 100))}) for i in range(0, 500, 100)]
+    upload_from_arrow_tables(tables, stage_to=stage_dir)
+
+    with LocalAirtrainApi(row_limit=250) as api:
+        result = push_staged(stage_dir, client=api.client())
+        assert result.size == 250
+        table = api.dataset(result.id).table()
+        assert sorted(table["foo"].to_pylist()) == list(range(0, 250))
+
+
+def test_push_staged_column_stats(tmp_path):
+    stage_dir = str(tmp_path)
+    tables = [pa.table({"foo": list(range(i, i + 100))}) for i in range(0, 500, 100)]
+    staged = upload_from_arrow_tables(tables, stage_to=stage_dir, column_stats=True)
+    assert staged.column_stats is not None
+    assert StagedManifest.read(stage_dir).column_stats == [
+        staged.column_stats["foo"].to_json()
+    ]
+
+    with LocalAirtrainApi() as api:
+        result = push_staged(stage_dir, client=api.client())
+        assert result.column_stats == staged.column_stats
+        assert api.dataset(result.id).column_stats == [
+            staged.column_stats["foo"].to_json()
+        ]
+
+
+def test_staging_errors(tmp_path):
+    stage_dir = str(tmp_path)
+    with pytest.raises(ValueError, match="No staged dataset"):
+        push_staged(stage_dir, api_key="foo", base_url="http://localhost:1")
+
+    data = ({"foo": i} for i in count())
+    with LocalAirtrainApi() as api:
+        with pytest.raises(ValueError, match="cannot be uploaded with a client"):
+            upload_from_dicts(data, client=api.client(), stage_to=stage_dir)
+
+    upload_from_dicts([{"foo": 1}], stage_to=stage_dir)
+    assert os.path.exists(os.path.join(stage_dir, MANIFEST_FILE_NAME))
+    with pytest.raises(ValueError, match="already been staged"):
+        upload_from_dicts([{"foo": 1}], stage_to=stage_dir)
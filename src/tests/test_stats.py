@@ -0,0 +1,161 @@
+import datetime
+import json
+
+import numpy as np
+import pyarrow as pa
+
+from airtrain.stats import QUANTILES, HyperLogLog, TDigest, _hash_values, _StatsCollector
+
+
+def test_hyperloglog():
+    rng = np.random.default_rng(0)
+    sketches = []
+    for start in (0, 50_000):
+        sketch = HyperLogLog()
+        values = pa.array(np.arange(start, start + 100_000))
+        sketch.add(_hash_values(values))
+        sketches.append(sketch)
+    assert abs(sketches[0].estimate() - 100_000) < 5000
+    sketches[0].merge(sketches[1])
+    assert abs(sketches[0].estimate() - 150_000) < 7500
+
+    small = HyperLogLog()
+    small.add(_hash_values(pa.array(rng.integers(0, 20, 1000))))
+    assert small.estimate() == 20
+
+
+def test_hash_strings():
+    values = pa.array(["foo", "", "bar", "foo", None, "fo", "o"])
+    hashes = _hash_values(values.drop_null())
+    assert hashes[0] == hashes[3]
+    assert len(set(hashes.tolist())) == 5
+    # Equal strings hash equally, wherever they are in the buffer.
+    sliced = _hash_values(pa.array(["foo", "bar"]).slice(1))
+    assert sliced[0] == hashes[2]
+    assert _hash_values(pa.array(["bar"], pa.large_string()))[0] == hashes[2]
+
+
+def test_tdigest():
+    rng = np.random.default_rng(0)
+    values = rng.standard_normal(100_000)
+    digests = []
+    for chunk in np.split(values, 10):
+        digest = TDigest()
+        digest.add(chunk)
+        digests.append(digest)
+    merged = TDigest()
+    for digest in digests:
+        merged.merge(digest)
+    assert len(merged.means) < 200
+    assert merged.weights.sum() == len(values)
+    estimated = merged.quantiles(QUANTILES)
+    assert estimated is not None
+    np.testing.assert_allclose(estimated, np.quantile(values, QUANTILES), atol=0.02)
+    assert TDigest().quantiles(QUANTILES) is None
+
+
+def test_stats_collector():
+    collector = _StatsCollector()
+    for start in (0, 500):
+        ids = np.arange(start, start + 500)
+        collector.add(
+            pa.table(
+                {
+                    "id": ids,
+                    "text": pa.array(["x" * (i % 10) if i % 4 else None for i in ids]),
+                    "label": pa.array(["a", "b"] * 250).dictionary_encode(),
+                    "embedding": pa.FixedSizeListArray.from_arrays(
+                        pa.array(np.tile([3.0, 4.0], 500)), 2
+                    ),
+                    "nested": [{"a": 1}] * 500,
+                }
+            )
+        )
+    stats = collector.result()
+
+    assert stats["id"].count == 1000
+    assert stats["id"].null_count == 0
+    assert (stats["id"].min, stats["id"].max) == (0, 999)
+    assert abs(stats["id"].distinct_count - 1000) < 20
+    assert stats["id"].quantiles is not None
+    assert abs(stats["id"].quantiles[3] - 499.5) < 5
+
+    assert stats["text"].null_count == 250
+    assert (stats["text"].min, stats["text"].max) == ("", "x" * 9)
+    assert stats["text"].distinct_count == 10
+    assert stats["text"].length_quantiles is not None
+    assert stats["text"].length_quantiles[0] == 0
+    assert stats["text"].length_quantiles[-1] == 9
+
+    assert stats["label"].distinct_count == 2
+    assert stats["embedding"].norm_quantiles == [5.0] * len(QUANTILES)
+    assert stats["nested"].count == 1000
+    assert stats["nested"].distinct_count is None
+
+    content = stats["text"].to_json()
+    assert content["nullCount"] == 250
+    assert "quantiles" not in content
+    assert type(stats["text"]).from_json(content) == stats["text"]
+
+
+def test_stats_of_temporal_and_half_float_columns():
+    days = [datetime.date(2024, 1, 1), datetime.date(2024, 1, 3), None] * 10
+    table = pa.table(
+        {
+            "day": pa.array(days, pa.date32()),
+            "time": pa.array(
+                [datetime.time(1, 2), datetime.time(3, 4)] * 15, pa.time32("s")
+            ),
+            "duration": pa.array([datetime.timedelta(seconds=i) for i in range(30)]),
+            "half": pa.array(np.arange(30, dtype=np.float16)),
+            "big": pa.array([2**64 - 1, 0] * 15, pa.uint64()),
+        }
+    )
+    collector = _StatsCollector()
+    collector.add(table)
+    stats = collector.result()
+
+    assert stats["day"].null_count == 10
+    assert stats["day"].min == datetime.date(2024, 1, 1)
+    assert stats["day"].max == datetime.date(2024, 1, 3)
+    assert stats["day"].distinct_count == 2
+    assert stats["time"].max == datetime.time(3, 4)
+    assert stats["time"].distinct_count == 2
+    # Durations have no min and max kernel, but are still counted.
+    assert stats["duration"].min is None
+    assert stats["duration"].distinct_count == 30
+    assert (stats["half"].min, stats["half"].max) == (0.0, 29.0)
+    assert stats["half"].quantiles is not None
+    assert stats["half"].quantiles[-1] == 29.0
+    assert stats["big"].distinct_count == 2
+    assert stats["day"].to_json()["min"] == "2024-01-01"
+
+
+def test_stats_of_non_finite_floats():
+    values = [1.0, 2.0, float("inf"), float("nan"), None] * 10
+    collector = _StatsCollector()
+    collector.add(pa.table({"x": pa.array(values, pa.float64())}))
+    stats = collector.result()
+
+    assert stats["x"].max == float("inf")
+    assert stats["x"].quantiles is not None
+    assert stats["x"].quantiles[-1] == 2.0
+    content = stats["x"].to_json()
+    # JSON has no infinity or NaN.
+    json.dumps(content, allow_nan=False)
+    assert content["min"] == 1.0
+    assert "max" not in content
+    stats["x"].quantiles = [float("-inf"), 1.0, float("nan")]
+    assert stats["x"].to_json()["quantiles"] == [None, 1.0, None]
+
+
+def test_stats_never_fail(monkeypatch):
+    def fail(values):
+        raise RuntimeError("Failed")
+
+    monkeypatch.setattr("airtrain.stats._hash_values", fail)
+    collector = _StatsCollector()
+    collector.add(pa.table({"id": [1, 2, 3]}))
+    stats = collector.result()
+    assert stats["id"].count == 3
+    assert stats["id"].distinct_count is None
@@ -0,0 +1,100 @@
+import io
+import time
+
+import httpx
+import pyarrow as pa
+import pytest
+
+from airtrain.client import (
+    RateLimitError,
+    RetryPolicy,
+    ServiceUnavailableError,
+    record_attempts,
+)
+from airtrain.core import upload_from_arrow_tables
+from airtrain.testing import Fault, LocalAirtrainApi
+
+
+def _no_wait_policy(tries=3) -> RetryPolicy:
+    return RetryPolicy(tries=tries, delay=0, jitter=(0, 0))
+
+
+def test_fault_validation():
+    with pytest.raises(ValueError):
+        Fault("GET nothing", status_code=503)
+    with pytest.raises(ValueError):
+        Fault("PUT storage", status_code=200)
+
+
+def test_status_faults_are_retried():
+    faults = [
+        Fault("POST dataset", status_code=429, retry_after=0, on_requests=[1]),
+        Fault("PUT storage", status_code=503, on_requests=[1, 2]),
+    ]
+    with LocalAirtrainApi(faults=faults) as api:
+        c = api.client(retry_policy=_no_wait_policy())
+        table = pa.table({"foo": [1, 2, 3]})
+        with record_attempts() as attempts:
+            result = upload_from_arrow_tables([table], client=c)
+
+        assert api.dataset(result.id).table() == table
+        assert api.request_counts["POST dataset"] == 2
+        assert api.request_counts["PUT storage"] == 3
+        assert len(api.injected_faults) == 3
+        assert [a.status_code for a in attempts if not a.succeeded] == [429, 503, 503]
+
+
+def test_retries_exhausted():
+    with LocalAirtrainApi(faults=[Fault("*", status_code=503)]) as api:
+        c = api.client(retry_policy=_no_wait_policy(tries=2))
+        with pytest.raises(ServiceUnavailableError):
+            c.create_dataset("foo", None)
+        assert api.request_counts["POST dataset"] == 2
+
+    with LocalAirtrainApi(faults=[Fault("POST dataset", status_code=429)]) as api:
+        c = api.client(retry_policy=_no_wait_policy(tries=1))
+        with pytest.raises(RateLimitError):
+            c.create_dataset("foo", None)
+
+
+def test_dropped_connections():
+    faults = [Fault("PUT storage", drop_connection=True, max_times=1)]
+    with LocalAirtrainApi(faults=faults) as api:
+        c = api.client(retry_policy=_no_wait_policy())
+        dataset_id = c.create_dataset("foo", None).dataset_id
+        c.upload_dataset_data(dataset_id, io.BytesIO(b"part"))
+        assert list(api.dataset(dataset_id).parts.values()) == [b"part"]
+        assert api.request_counts["PUT storage"] == 2
+
+    # Creating datasets is not idempotent, so it isn't retried.
+    faults = [Fault("POST dataset", drop_connection=True)]
+    with LocalAirtrainApi(faults=faults) as api:
+        c = api.client(retry_policy=_no_wait_policy())
+        with pytest.raises(httpx.TransportError):
+            c.create_dataset("foo", None)
+        assert api.request_counts["POST dataset"] == 1
+
+
+def test_slow_upload_targets():
+    faults = [Fault("PUT storage", delay_seconds=0.2, bytes_per_second=100_000)]
+    with LocalAirtrainApi(faults=faults) as api:
+        c = api.client()
+        dataset_id = c.create_dataset("foo", None).dataset_id
+        started = time.monotonic()
+        c.upload_dataset_data(dataset_id, io.BytesIO(b"x" * 50_000))
+        assert time.monotonic() - started >= 0.2 + 0.5
+
+
+def test_probabilistic_faults():
+    fault = Fault("PUT dataset/source", status_code=503, probability=0.5)
+    with LocalAirtrainApi(faults=[fault], seed=0) as api:
+        c = api.client(retry_policy=_no_wait_policy(tries=20), upload_target_prefetch=0)
+        dataset_id = c.create_dataset("foo", None).dataset_id
+        for i in range(0, 10):
+            c.upload_dataset_data(dataset_id, io.BytesIO(b"part"))
+        assert len(api.dataset(dataset_id).parts) == 10
+        assert 0 < fault.times_applied < api.request_counts["PUT dataset/source"]
+
+        api.clear_faults()
+        c.upload_dataset_data(dataset_id, io.BytesIO(b"part"))
+        assert len(api.injected_faults) == fault.times_applied